@@ -0,0 +1,151 @@
+#!/usr/bin/python
+
+# This script builds the lookup grid of the latency model (see
+# latency_grid.py) for the timing constants of a machine, and reports the
+# interpolation error of the grid against compute_memory_latency for random
+# HMC ratios, issue times, thread counts and write ratios. Building the grid
+# requires numpy; querying it does not.
+#
+
+import random
+from optparse import OptionParser
+import latency_model
+import latency_grid
+
+parser = OptionParser()
+parser.add_option("-t", "--thr_cnt", dest="max_thread_cnt", help="Maximum " +
+                  "number of threads in the grid", metavar="THREAD_COUNT",
+                  type="int")
+parser.add_option("-n", "--size", dest="size", help="Number of grid points " +
+                  "of the hit and the miss ratios; default 101",
+                  metavar="SIZE", type="int", default=101)
+parser.add_option("-o", "--output", dest="output", help="Path to the grid " +
+                  "file", metavar="GRID")
+parser.add_option("--samples", dest="sample_cnt", help="Number of random " +
+                  "queries to check the error; default 10000",
+                  metavar="SAMPLES", type="int", default=10000)
+parser.add_option("--max_issue", dest="max_issue_time", help="Maximum issue " +
+                  "time of the random queries, in nanoseconds; default 100",
+                  metavar="MAX_ISSUE_TIME", type="float", default=100.0)
+# constants of the machine, same as gen_latencies.py
+latency_model.add_machine_options(parser)
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+# Compute the latencies of the grid points, on both sides of the 70% misses
+# and conflicts condition. The issue time and the minimum issue time are 0, so
+# that the read latency is not limited by them.
+# Return:
+#       list of the latencies of every grid point, in the order of the grid
+#       file
+def gen_grid_values(options):
+    numpy = latency_model.numpy
+    ratios = numpy.linspace(0.0, 1.0, options.size)
+    # all grid points at once: thread count, hit, miss
+    thread_cnt = numpy.arange(1, options.max_thread_cnt + 1,
+                              dtype=float).reshape(-1, 1, 1)
+    hit = ratios.reshape(1, -1, 1)
+    miss = ratios.reshape(1, 1, -1)
+    conf = numpy.maximum(1 - hit - miss, 0.0)
+
+    values = numpy.empty((options.max_thread_cnt, options.size, options.size,
+                          4))
+    for (idx, few_mc) in ((0, True), (2, False)):
+        result = latency_model.compute_memory_latency_batch(
+            hit, miss, conf, 0.0, thread_cnt, 0.0, options.max_hit,
+            options.max_miss, options.max_conf, options.cycle_time,
+            options.trans_cyc, 0.0, options.tRCD, options.rank_cnt, False,
+            few_mc)
+        values[..., idx] = result["rd_lat"]
+        values[..., idx + 1] = result["wr_lat"]
+
+    return values.ravel().tolist()
+
+# Compare the grid with compute_memory_latency for random queries.
+# Inputs:
+#       grid: latency_grid object
+#       options: the command line options
+# Return:
+#       (maximum absolute error, mean absolute error, maximum relative error)
+#       of the final latency
+def check_grid(grid, options):
+    rand = random.Random(0)
+    max_err = 0.0
+    sum_err = 0.0
+    max_rel_err = 0.0
+    for i in range(options.sample_cnt):
+        # uniform in the triangle hit + miss <= 1
+        hit = rand.random()
+        miss = rand.random()
+        if hit + miss > 1:
+            (hit, miss) = (1 - hit, 1 - miss)
+        conf = 1 - hit - miss
+        thread_cnt = rand.randint(1, options.max_thread_cnt)
+        issue_time = rand.uniform(0, options.max_issue_time)
+        wr_ratio = rand.uniform(0, 0.5)
+
+        exact = latency_model.compute_memory_latency(
+            hit, miss, conf, issue_time, thread_cnt, wr_ratio,
+            options.max_hit, options.max_miss, options.max_conf,
+            options.cycle_time, options.trans_cyc, options.min_issue_time,
+            options.tRCD, options.rank_cnt, False, False)["final_lat"]
+        approx = grid.query(hit, miss, conf, issue_time, thread_cnt,
+                            wr_ratio)["final_lat"]
+        err = abs(approx - exact)
+        max_err = max(max_err, err)
+        sum_err += err
+        if exact != 0:
+            max_rel_err = max(max_rel_err, err / abs(exact))
+        if options.debug and (err > 0.1):
+            print "Large error:", hit, miss, conf, thread_cnt, issue_time,
+            print wr_ratio, ", exact", exact, ", grid", approx
+
+    return (max_err, sum_err / max(options.sample_cnt, 1), max_rel_err)
+
+if __name__ == "__main__":
+    (options, args) = latency_model.parse_machine_options(parser)
+
+    if options.max_thread_cnt is None:
+        print "Please specify the maximum number of threads"
+        parser.print_help()
+        exit(-1)
+
+    if options.output is None:
+        print "Please specify the grid file"
+        parser.print_help()
+        exit(-1)
+
+    if options.size < 2:
+        print "The grid needs at least two points per ratio"
+        exit(-1)
+
+    if latency_model.numpy is None:
+        print "numpy is required for building the grid"
+        exit(2)
+
+    if options.debug is True:
+        print "Options are:"
+        print "    Max thread count:", options.max_thread_cnt
+        print "    Grid size:", options.size
+        print "    Output:", options.output
+        print "    Samples:", options.sample_cnt
+        print "    MAX HIT/MISS/CONFLICT cycles:", options.max_hit, ",",
+        print options.max_miss, ",", options.max_conf
+        print "    Data transport cycles:", options.trans_cyc
+        print "    Memory cycle time:", options.cycle_time
+        print "    Min issue time:", options.min_issue_time
+        print "    Rank Count:", options.rank_cnt
+
+    values = gen_grid_values(options)
+    latency_grid.write_latency_grid(options.output, options.max_thread_cnt,
+                                    options.size, options.min_issue_time,
+                                    values)
+
+    grid = latency_grid.latency_grid(options.output)
+    (max_err, mean_err, max_rel_err) = check_grid(grid, options)
+    grid.close()
+
+    print "Grid points:", len(values) / 4
+    print "Final latency error of", options.sample_cnt, "random queries:",
+    print "max", max_err, "ns, mean", mean_err, "ns, max relative",
+    print max_rel_err
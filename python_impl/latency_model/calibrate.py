@@ -0,0 +1,345 @@
+#!/usr/bin/python
+
+# This script calibrates the timing constants of the latency model for a
+# machine, from measured latencies. The measurements are read from a CSV file
+# with a header line, and one measurement per line with the columns:
+#     threads, hit, miss, conflict, writes, latency
+# and optionally issue_time (otherwise "-i" is used for every line), where
+# latency is the measured final latency in nanoseconds.
+#
+# The constants listed by "--fit" are fitted by least squares with grid
+# refinement. In each pass, the integer constants (in memory cycles) are set
+# jointly to the best combination of the values within "--span" cycles of
+# their current values, since they compensate each other and do not improve
+# one at a time; then each float constant in turn is set to the best value of
+# a grid of "--span" steps on each side of its current value. The passes are
+# repeated, so the integer constants can move further than "--span", and the
+# grid of the float constants is refined (its step halved) whenever a pass
+# does not reduce the error any more. The grid of a float constant that has no
+# effect within it (e.g., min_issue_time below every read latency) is widened
+# (its step doubled) instead. The model is evaluated for a whole grid and all
+# measurements at once with latency_model.compute_memory_latency_batch, so
+# numpy is required.
+#
+# With "--check", the measurements are generated by the model with known
+# values (CHECK_CONSTS) of the fitted constants instead of read from "-f",
+# and the fit, starting from the given constants, should recover them.
+#
+# The fitted constants are written as a machine profile, which can be given to
+# gen_latencies.py with "--machine".
+#
+# Note that max_hit and tRCD are not used by the current latency model, so
+# fitting them has no effect; and cycle_time scales all cycle counts, so it
+# should only be fitted if the cycle counts are known.
+#
+
+import csv
+import itertools
+from optparse import OptionParser
+import latency_model
+
+parser = OptionParser()
+parser.add_option("-f", "--file", dest="filename", help="Path to the CSV " +
+                  "file of measurements", metavar="MEASUREMENTS")
+parser.add_option("-i", "--issue_time", dest="issue_time", help="Memory " +
+                  "issue time for a single thread, in nanoseconds, for " +
+                  "measurements without an issue_time column",
+                  metavar="ISSUE_TIME", type="float")
+parser.add_option("--fit", dest="fit", help="Constants to fit; comma " +
+                  "separated list of names in the machine profile; default " +
+                  "max_miss,max_conf,trans_cyc,min_issue_time",
+                  metavar="NAMES", type="string",
+                  default="max_miss,max_conf,trans_cyc,min_issue_time")
+parser.add_option("--span", dest="span", help="Number of grid points on " +
+                  "each side of the current value; default 4",
+                  metavar="SPAN", type="int", default=4)
+parser.add_option("--tol", dest="tolerance", help="Smallest grid step of " +
+                  "the float constants; default 0.01", metavar="TOLERANCE",
+                  type="float", default=0.01)
+parser.add_option("--iters", dest="max_iters", help="Maximum number of " +
+                  "passes over the constants; default 100",
+                  metavar="ITERATIONS", type="int", default=100)
+parser.add_option("-o", "--output", dest="output", help="Path to the " +
+                  "machine profile to write", metavar="PROFILE")
+# starting values of the constants, same as gen_latencies.py
+latency_model.add_machine_options(parser)
+parser.add_option("--check", dest="check", help="Fit synthetic " +
+                  "measurements of known constants instead of -f, and check " +
+                  "that they are recovered", action="store_true",
+                  default=False)
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+# Columns of the measurements
+COLUMNS = ["threads", "hit", "miss", "conflict", "writes", "latency"]
+
+# Largest number of candidates times measurements evaluated at once
+GRID_ELEMS = 1 << 20
+
+# Constants and number of the synthetic measurements of "--check"
+CHECK_CONSTS = {"max_miss": 26, "max_conf": 36, "trans_cyc": 5,
+                "min_issue_time": 8.0}
+CHECK_CNT = 1000
+
+# Read the measurements.
+# Inputs:
+#       filename: path to the CSV file
+#       issue_time: issue time of the lines without one, or None
+# Return:
+#       a dict: column name (including issue_time) ==> numpy array
+def read_measurements(filename, issue_time):
+    numpy = latency_model.numpy
+    columns = dict()
+    for name in COLUMNS + ["issue_time"]:
+        columns[name] = []
+
+    f = open(filename, "r")
+    for row in csv.DictReader(f):
+        for name in COLUMNS:
+            if row.get(name) in (None, ""):
+                print "Measurement without", name + ":", row
+                exit(2)
+            columns[name].append(float(row[name]))
+        if row.get("issue_time") not in (None, ""):
+            columns["issue_time"].append(float(row["issue_time"]))
+        elif issue_time is not None:
+            columns["issue_time"].append(issue_time)
+        else:
+            print "Measurement without issue time, please specify -i:", row
+            exit(2)
+    f.close()
+
+    for name in columns:
+        columns[name] = numpy.array(columns[name])
+    return columns
+
+# Compute the squared errors of the model for the measurements, for a list of
+# candidate values of some constants.
+# Inputs:
+#       meas: the measurements returned by read_measurements
+#       consts: a dict: name ==> value, of all constants in
+#               latency_model.MACHINE_PARAMS
+#       grid: a dict: name ==> list of values, one for each candidate, of the
+#             constants to vary (all lists have the same length); or None to
+#             use consts only
+# Return:
+#       numpy array of the sum of squared errors, one for each candidate
+def eval_grid(meas, consts, grid):
+    numpy = latency_model.numpy
+    if grid is None:
+        cand_cnt = 1
+    else:
+        cand_cnt = len(grid.values()[0])
+    # evaluate the candidates in chunks, to bound the size of the arrays
+    chunk = max(GRID_ELEMS / len(meas["latency"]), 1)
+    errs = []
+    for start in range(0, cand_cnt, chunk):
+        args = dict(consts)
+        if grid is not None:
+            # one row per candidate, one column per measurement
+            for name in grid:
+                args[name] = numpy.array(grid[name][start:start + chunk],
+                                         dtype=float).reshape(-1, 1)
+        result = latency_model.compute_memory_latency_batch(
+            meas["hit"], meas["miss"], meas["conflict"], meas["issue_time"],
+            meas["threads"], meas["writes"], args["max_hit"],
+            args["max_miss"], args["max_conf"], args["cycle_time"],
+            args["trans_cyc"], args["min_issue_time"], args["tRCD"],
+            args["rank_cnt"], False)
+        errors = result["final_lat"] - meas["latency"]
+        errs.append(numpy.atleast_2d(errors * errors).sum(axis=1))
+
+    return numpy.concatenate(errs)
+
+# Get the best candidate of a grid: the one with the smallest error, and of
+# equal errors, the one closest to the current constants. Equal errors happen
+# where a constant has no effect (e.g., min_issue_time below every read
+# latency); staying close keeps the fit out of such flat regions.
+# Inputs:
+#       errs: numpy array of the errors of the candidates
+#       dists: list of the distances of the candidates to the current constants
+# Return:
+#       the index of the best candidate
+def pick_best(errs, dists):
+    numpy = latency_model.numpy
+    ties = numpy.nonzero(errs == errs.min())[0]
+    return ties[numpy.argmin(numpy.array(dists)[ties])]
+
+# Fit the constants by grid refinement (see the beginning of this file).
+# Inputs:
+#       meas: the measurements returned by read_measurements
+#       consts: a dict of the starting constants; the fitted constants are
+#               updated in place
+#       names: names of the constants to fit
+#       options: the command line options
+# Return:
+#       the sum of squared errors of the fitted constants
+def fit_consts(meas, consts, names, options):
+    types = dict(latency_model.MACHINE_PARAMS)
+    int_names = [name for name in names if types[name] is int]
+    # grid steps of the float constants
+    steps = dict()
+    for name in names:
+        if types[name] is float:
+            steps[name] = max(abs(consts[name]), 1.0) / 8
+
+    cur_err = eval_grid(meas, consts, None)[0]
+    for i in range(options.max_iters):
+        improved = False
+
+        # the integer constants jointly, every combination of their values
+        if len(int_names) != 0:
+            ranges = [[v for v in range(consts[name] - options.span,
+                                        consts[name] + options.span + 1)
+                       if v >= 1] for name in int_names]
+            combos = list(itertools.product(*ranges))
+            grid = dict()
+            for (idx, name) in enumerate(int_names):
+                grid[name] = [combo[idx] for combo in combos]
+            errs = eval_grid(meas, consts, grid)
+            best = pick_best(errs, [sum([abs(v - consts[name]) for (v, name)
+                                         in zip(combo, int_names)])
+                                    for combo in combos])
+            if errs[best] < cur_err * (1 - 1e-12):
+                for (idx, name) in enumerate(int_names):
+                    consts[name] = combos[best][idx]
+                cur_err = errs[best]
+                improved = True
+
+        # then each float constant in turn
+        for name in steps:
+            values = [consts[name] + k * steps[name] for k in
+                      range(-options.span, options.span + 1)
+                      if consts[name] + k * steps[name] > 0]
+            errs = eval_grid(meas, consts, {name: values})
+            if errs.min() == errs.max():
+                # no effect within the grid, widen it
+                steps[name] *= 2
+                improved = True
+                continue
+            best = pick_best(errs, [abs(v - consts[name]) for v in values])
+            if errs[best] < cur_err * (1 - 1e-12):
+                consts[name] = values[best]
+                cur_err = errs[best]
+                improved = True
+
+        if options.debug:
+            print "Pass", i, "squared error", cur_err, "constants", consts
+
+        if not improved:
+            # refine the grids of the float constants, or stop
+            refinable = [n for n in steps if steps[n] > options.tolerance]
+            if len(refinable) == 0:
+                break
+            for n in refinable:
+                steps[n] /= 2
+
+    return cur_err
+
+# Generate synthetic measurements with the model itself, for "--check".
+# Inputs:
+#       consts: a dict of all constants, used to compute the latencies
+#       cnt: number of measurements
+# Return:
+#       the measurements, same as read_measurements
+def gen_synthetic(consts, cnt):
+    numpy = latency_model.numpy
+    rand = numpy.random.RandomState(0)
+    # uniform in the triangle hit + miss <= 1
+    hit = rand.uniform(size=cnt)
+    miss = rand.uniform(size=cnt)
+    flip = hit + miss > 1
+    hit[flip] = 1 - hit[flip]
+    miss[flip] = 1 - miss[flip]
+    # a quarter of them are mostly hits, where the read latency can be
+    # limited by min_issue_time
+    mostly_hits = rand.uniform(size=cnt) < 0.25
+    hit[mostly_hits] = 1 - (1 - hit[mostly_hits]) * 0.1
+    miss[mostly_hits] *= 0.1
+    meas = {"threads": rand.randint(1, 17, cnt).astype(float),
+            "hit": hit,
+            "miss": miss,
+            "conflict": 1 - hit - miss,
+            "writes": rand.uniform(0, 0.5, cnt),
+            "issue_time": rand.uniform(1, 100, cnt)}
+    result = latency_model.compute_memory_latency_batch(
+        meas["hit"], meas["miss"], meas["conflict"], meas["issue_time"],
+        meas["threads"], meas["writes"], consts["max_hit"],
+        consts["max_miss"], consts["max_conf"], consts["cycle_time"],
+        consts["trans_cyc"], consts["min_issue_time"], consts["tRCD"],
+        consts["rank_cnt"], False)
+    meas["latency"] = result["final_lat"]
+
+    return meas
+
+if __name__ == "__main__":
+    (options, args) = latency_model.parse_machine_options(parser)
+
+    if (options.filename is None) and (not options.check):
+        print "Please specify the measurement file"
+        parser.print_help()
+        exit(-1)
+
+    if latency_model.numpy is None:
+        print "numpy is required for calibration"
+        exit(2)
+
+    names = options.fit.split(",")
+    for name in names:
+        if name not in dict(latency_model.MACHINE_PARAMS):
+            print "Unknown constant to fit:", name
+            parser.print_help()
+            exit(-1)
+
+    if options.debug is True:
+        print "Options are:"
+        print "    measurement file: ", options.filename
+        print "    issue time: ", options.issue_time
+        print "    constants to fit: ", names
+        print "    grid span: ", options.span
+        print "    grid tolerance: ", options.tolerance
+        print "    maximum passes: ", options.max_iters
+        print "    output: ", options.output
+        print "    check: ", options.check
+
+    consts = dict()
+    for (name, t) in latency_model.MACHINE_PARAMS:
+        consts[name] = getattr(options, name)
+
+    if options.check:
+        truth = dict(consts)
+        for name in names:
+            truth[name] = CHECK_CONSTS.get(name, consts[name])
+        meas = gen_synthetic(truth, CHECK_CNT)
+        options.filename = "synthetic data"
+    else:
+        meas = read_measurements(options.filename, options.issue_time)
+    meas_cnt = len(meas["latency"])
+    if meas_cnt == 0:
+        print "No measurements in", options.filename
+        exit(2)
+
+    start_err = eval_grid(meas, consts, None)[0]
+    err = fit_consts(meas, consts, names, options)
+
+    print "Measurements:", meas_cnt
+    print "RMS error before:", (start_err / meas_cnt) ** 0.5, "ns,",
+    print "after:", (err / meas_cnt) ** 0.5, "ns"
+    print "Fitted constants:"
+    for (name, t) in latency_model.MACHINE_PARAMS:
+        print "    " + name + ":", consts[name]
+
+    if options.check:
+        wrong = [name for name in names if abs(consts[name] - truth[name]) >
+                 max(options.tolerance, 1e-9) * 2]
+        if len(wrong) != 0:
+            print "Constants not recovered:", ", ".join(
+                [name + " (expected " + str(truth[name]) + ")"
+                 for name in wrong])
+            exit(4)
+        print "All fitted constants are recovered"
+
+    if options.output is not None:
+        comment = ("Calibrated from " + str(meas_cnt) + " measurements of " +
+                   options.filename)
+        latency_model.write_machine_profile(options.output, consts, comment)
@@ -4,8 +4,10 @@
 # HIT/MISS/CONFLICT ratios as inputs and compute the memory latency, i.e., the
 # memory bandwidth.
 
+import sys
 from optparse import OptionParser
 import latency_model
+import latency_batch
 
 
 parser = OptionParser()
@@ -47,6 +49,23 @@ parser.add_option("--min_time", dest="min_issue_time", help="Miminum issue " +
 parser.add_option("--rank", dest="rank_cnt", help="Number of ranks"+
                   "simultaneously accessed",
                   metavar="RANK_CNT", type="int", default=1)
+parser.add_option("--machine", dest="machine", help="Machine profile with " +
+                  "the timing constants, e.g., written by calibrate.py; the " +
+                  "options above override it", metavar="PROFILE")
+parser.add_option("--batch", dest="batch", help="Compute the latencies of " +
+                  "the rows of this file, or of the standard input if it is " +
+                  "\"-\", instead of -t -r -m -c -i; see latency_batch.py",
+                  metavar="INPUT")
+parser.add_option("--format", dest="format", help="Format of the batch " +
+                  "input and output: csv or json (one object per line); " +
+                  "default csv", metavar="FORMAT", type="string",
+                  default="csv")
+parser.add_option("--chunk", dest="chunk_size", help="Number of batch rows " +
+                  "computed at once; default 65536", metavar="CHUNK_SIZE",
+                  type="int", default=65536)
+parser.add_option("--output", dest="output", help="Path to the batch " +
+                  "output file; default is the standard output",
+                  metavar="OUTPUT")
 parser.add_option("-d", "--debug", action="store_true", dest="debug",
                   default=False, help="Enable debug output")
 parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
@@ -54,6 +73,35 @@ parser.add_option("-v", "--verbose", action="store_true", dest="verbose",
 
 (options, args) = parser.parse_args()
 
+# the constants of the machine profile replace the defaults, and are parsed
+# again so that the options given on the command line still take precedence
+if options.machine is not None:
+    parser.set_defaults(**latency_model.read_machine_profile(options.machine))
+    (options, args) = parser.parse_args()
+
+if options.batch is not None:
+    if options.format not in ("csv", "json"):
+        print "Unknown batch format:", options.format
+        parser.print_help()
+        exit(-1)
+    if options.chunk_size < 1:
+        print "The chunk size should be at least 1"
+        parser.print_help()
+        exit(-1)
+    if options.batch == "-":
+        fin = sys.stdin
+    else:
+        fin = open(options.batch, "r")
+    if options.output is None:
+        fout = sys.stdout
+    else:
+        fout = open(options.output, "w")
+    latency_batch.run_batch(fin, fout, options.format, options.chunk_size,
+                            options)
+    if fout is not sys.stdout:
+        fout.close()
+    exit(0)
+
 if options.thread_cnt is None:
     print "Please specify the number of threads to model"
     parser.print_help()
@@ -0,0 +1,157 @@
+# This file contains the batch mode of gen_latencies.py: the inputs are read
+# as rows from a file (or the standard input), in chunks, and every chunk is
+# computed at once with compute_memory_latency_batch, so any number of rows is
+# processed with constant memory. Without numpy, the rows are computed one by
+# one with compute_memory_latency, with the same results.
+#
+# Input formats:
+#     csv: a header line, then one row per line, with the columns
+#          threads, hit, miss, conflict, issue_time, and optionally writes
+#          (otherwise "-w" of gen_latencies.py is used)
+#     json: one JSON object per line, with the same fields
+# The output has one row for every input row, in the same format: the input
+# columns followed by rd_lat, wr_lat and final_lat. The timing constants are
+# the options of gen_latencies.py. An empty or missing writes value also
+# falls back to "-w". Errors in the input are reported on the standard error,
+# with the line number of the offending row.
+#
+
+import sys
+import csv
+import json
+import itertools
+import latency_model
+
+# Columns of the input rows, and the output columns added to them
+INPUT_COLUMNS = ["threads", "hit", "miss", "conflict", "issue_time"]
+OUTPUT_COLUMNS = ["rd_lat", "wr_lat", "final_lat"]
+
+# Report an error of an input row and exit.
+# Inputs:
+#       line_num: line number of the row
+#       msg: the error message
+def input_error(line_num, msg):
+    sys.stderr.write("Line " + str(line_num) + " of the input: " + msg + "\n")
+    exit(-1)
+
+# Read the input rows of the json format.
+# Inputs:
+#       f: the input file object
+# Return:
+#       a generator of (line number, row), each row a dict: column name ==>
+#       value
+def read_json_rows(f):
+    for (line_num, line) in enumerate(f, 1):
+        if line.isspace():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            input_error(line_num, "invalid JSON")
+        if not isinstance(row, dict):
+            input_error(line_num, "not a JSON object")
+        yield (line_num, row)
+
+# Get a value of an input row as a float.
+# Inputs:
+#       row: the row, a dict: column name ==> string (csv) or value (json)
+#       name: the column name
+#       line_num: line number of the row
+#       default: the value of an empty or missing column, or None if the
+#                column is required
+# Return:
+#       the value
+def get_value(row, name, line_num, default):
+    value = row.get(name)
+    if value in (None, ""):
+        if default is None:
+            input_error(line_num, "row without " + name)
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        input_error(line_num, "invalid " + name + ": " + repr(value))
+
+# Compute the latencies of a chunk of rows.
+# Inputs:
+#       rows: list of (line number, row), each row a dict: column name ==>
+#             string (csv) or value (json)
+#       options: the options of gen_latencies.py
+# Return:
+#       a list of (rd_lat, wr_lat, final_lat), one for each row
+def compute_chunk(rows, options):
+    cols = dict()
+    for name in INPUT_COLUMNS:
+        cols[name] = [get_value(row, name, line_num, None)
+                      for (line_num, row) in rows]
+    cols["writes"] = [get_value(row, "writes", line_num, options.wr_ratio)
+                      for (line_num, row) in rows]
+    for ((line_num, row), thread_cnt) in zip(rows, cols["threads"]):
+        if thread_cnt <= 0:
+            input_error(line_num, "threads should be positive: " +
+                        repr(row["threads"]))
+
+    numpy = latency_model.numpy
+    if numpy is None:
+        lats = []
+        for i in range(len(rows)):
+            result = latency_model.compute_memory_latency(
+                cols["hit"][i], cols["miss"][i], cols["conflict"][i],
+                cols["issue_time"][i], cols["threads"][i], cols["writes"][i],
+                options.max_hit, options.max_miss, options.max_conf,
+                options.cycle_time, options.trans_cyc, options.min_issue_time,
+                options.tRCD, options.rank_cnt, options.debug, False)
+            lats.append((result["rd_lat"], result["wr_lat"],
+                         result["final_lat"]))
+        return lats
+
+    result = latency_model.compute_memory_latency_batch(
+        numpy.array(cols["hit"]), numpy.array(cols["miss"]),
+        numpy.array(cols["conflict"]), numpy.array(cols["issue_time"]),
+        numpy.array(cols["threads"]), numpy.array(cols["writes"]),
+        options.max_hit, options.max_miss, options.max_conf,
+        options.cycle_time, options.trans_cyc, options.min_issue_time,
+        options.tRCD, options.rank_cnt, options.debug)
+    return zip(result["rd_lat"].tolist(), result["wr_lat"].tolist(),
+               result["final_lat"].tolist())
+
+# Compute the latencies of all input rows, and write the output rows.
+# Inputs:
+#       fin, fout: the input and output file objects
+#       fmt: "csv" or "json"
+#       chunk_size: number of rows computed at once
+#       options: the options of gen_latencies.py
+# Return:
+#       number of rows
+def run_batch(fin, fout, fmt, chunk_size, options):
+    if fmt == "csv":
+        reader = csv.DictReader(fin)
+        # the input columns are copied to the output in their order
+        in_fields = reader.fieldnames
+        if in_fields is None:
+            return 0
+        writer = csv.writer(fout, lineterminator="\n")
+        writer.writerow(in_fields + OUTPUT_COLUMNS)
+        # line_num is the last line of the row just read
+        rows = ((reader.line_num, row) for row in reader)
+    else:
+        rows = read_json_rows(fin)
+
+    row_cnt = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if len(chunk) == 0:
+            break
+        lats = compute_chunk(chunk, options)
+        row_cnt += len(chunk)
+
+        if fmt == "csv":
+            for ((line_num, row), lat) in zip(chunk, lats):
+                writer.writerow([row[name] for name in in_fields] +
+                                [repr(v) for v in lat])
+        else:
+            for ((line_num, row), lat) in zip(chunk, lats):
+                row.update(zip(OUTPUT_COLUMNS, lat))
+                fout.write(json.dumps(row, sort_keys=True) + "\n")
+
+    return row_cnt
@@ -0,0 +1,175 @@
+# This file contains the lookup grid of the latency model, for programs that
+# query latencies without loading numpy and the model. The grid is built
+# by build_latency_grid.py for one machine profile, and saved as a binary file
+# which is memory-mapped when loaded; this file does not need the latency
+# model (or numpy) to query the grid.
+#
+# The read latency before the issue-time limit, and the write latency, do not
+# depend on the issue time of the threads. They are stored for every thread
+# count from 1 to the maximum thread count, and for an n x n grid of the hit
+# and miss ratios (the conflict ratio is 1 - hit - miss). The latencies jump
+# where the misses and conflicts reach 70% (see compute_memory_latency), so
+# both sides of this condition are stored for every grid point. A query
+# chooses the side with its own ratios, interpolates the two latencies of that
+# side bilinearly over the hit and miss ratios of its thread count, and then
+# applies the issue-time limit and the write ratio the same way as
+# compute_memory_latency, so only the interpolation is approximate.
+#
+# The latencies of a thread count are decoded from the file into an array on
+# its first query, and the following queries only index the array. In CPython,
+# a query still costs about as much as compute_memory_latency (both are a few
+# dozen float operations, dominated by the interpreter); the grid saves the
+# time to load numpy and the model (about 1.5 ms instead of about 67 ms), and
+# fits callers that only have the grid file of a machine.
+#
+# File format (little endian):
+#     header: magic "DRAMONLG", version (uint32), max thread count (uint32),
+#             grid size n (uint32), min_issue_time (float64)
+#     data: for every thread count, hit index and miss index (in this order),
+#           the read latency and the write latency with few misses and
+#           conflicts, then with many misses and conflicts (four float64)
+#
+
+import sys
+import mmap
+import array
+import struct
+
+GRID_MAGIC = "DRAMONLG"
+GRID_VERSION = 1
+GRID_HEADER = struct.Struct("<8sIIId")
+GRID_POINT = struct.Struct("<4d")
+
+# A memory-mapped latency grid
+class latency_grid:
+    # Inputs:
+    #       filename: path to the grid file written by write_latency_grid
+    def __init__(self, filename):
+        self.f = open(filename, "rb")
+        self.data = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.max_thread_cnt, self.size,
+         self.min_issue_time) = GRID_HEADER.unpack_from(self.data, 0)
+        if (magic != GRID_MAGIC) or (version != GRID_VERSION):
+            print "Not a latency grid file:", filename
+            exit(2)
+        # thread count ==> latencies of its grid points, see get_slice
+        self.slices = dict()
+        # constants of query
+        self.last = self.size - 1
+        self.row_len = self.size * 4 # floats of the points of a hit index
+
+    def close(self):
+        self.data.close()
+        self.f.close()
+
+    # Get the latencies of all grid points of a thread count, decoded from the
+    # file on the first query of that thread count.
+    # Inputs:
+    #       thread_cnt: the thread count; can be a float with an integral
+    #                   value, e.g., 4.0
+    # Return:
+    #       an array of floats, four for each hit and miss index (see the
+    #       beginning of this file)
+    def get_slice(self, thread_cnt):
+        # the grid only has integral thread counts
+        try:
+            thr_idx = int(thread_cnt)
+        except (TypeError, ValueError, OverflowError):
+            thr_idx = None
+        if (thr_idx is None) or (thr_idx != thread_cnt):
+            print "Thread count", thread_cnt, "is not an integer"
+            exit(2)
+        if (thr_idx < 1) or (thr_idx > self.max_thread_cnt):
+            print "Thread count", thread_cnt, "is not in the latency grid"
+            exit(2)
+
+        if thr_idx not in self.slices:
+            length = GRID_POINT.size * self.size * self.size
+            offset = GRID_HEADER.size + length * (thr_idx - 1)
+            data = array.array("d")
+            data.fromstring(self.data[offset:offset + length])
+            if sys.byteorder != "little":
+                data.byteswap()
+            self.slices[thr_idx] = data
+
+        return self.slices[thr_idx]
+
+    # Interpolate the latencies of HMC ratios.
+    # Inputs:
+    #       hit_ratio, miss_ratio, conf_ratio: HIT/MISS/CONF ratios, which
+    #                                          should add up to 1
+    #       issue_time, thread_cnt, wr_ratio: see compute_memory_latency;
+    #                                         thread_cnt can be a float with
+    #                                         an integral value, e.g., 4.0
+    # Return:
+    #       a dictionary with the same fields as compute_memory_latency
+    def query(self, hit_ratio, miss_ratio, conf_ratio, issue_time, thread_cnt,
+              wr_ratio):
+        # a float thread count finds the slice of the same integer, since
+        # they have the same hash and compare equal
+        grid = self.slices.get(thread_cnt)
+        if grid is None:
+            grid = self.get_slice(thread_cnt)
+
+        # the cell of the ratios, and the position in the cell
+        last = self.last
+        x = hit_ratio * last
+        y = miss_ratio * last
+        i = int(x)
+        if i < 0:
+            i = 0
+        elif i >= last:
+            i = last - 1
+        j = int(y)
+        if j < 0:
+            j = 0
+        elif j >= last:
+            j = last - 1
+        fx = x - i
+        fy = y - j
+        # index of the latencies of the grid point (i, j), on the side of the
+        # 70% condition
+        n = i * self.row_len + j * 4
+        if (miss_ratio + conf_ratio) >= 0.7:
+            n += 2
+        m = n + self.row_len # the grid point (i + 1, j)
+
+        # bilinear interpolation, first over the miss ratio
+        rd0 = grid[n] + (grid[n + 4] - grid[n]) * fy
+        wr0 = grid[n + 1] + (grid[n + 5] - grid[n + 1]) * fy
+        rd1 = grid[m] + (grid[m + 4] - grid[m]) * fy
+        wr1 = grid[m + 1] + (grid[m + 5] - grid[m + 1]) * fy
+        rd_lat = rd0 + (rd1 - rd0) * fx
+        wr_lat = wr0 + (wr1 - wr0) * fx
+
+        # same as compute_memory_latency
+        ideal_issue_time = issue_time / thread_cnt
+        min_issue_time = self.min_issue_time
+        if ideal_issue_time < min_issue_time:
+            ideal_issue_time = min_issue_time
+        if rd_lat < ideal_issue_time:
+            rd_lat = ideal_issue_time
+        final_lat = rd_lat * (1 - wr_ratio) + wr_lat * wr_ratio
+
+        return {"wr_lat": wr_lat,
+                "rd_lat": rd_lat,
+                "final_lat": final_lat}
+
+# Write a latency grid file.
+# Inputs:
+#       filename: path to the grid file
+#       max_thread_cnt: the maximum thread count
+#       size: the grid size n
+#       min_issue_time: see compute_memory_latency
+#       values: list of floats, the data of the file in order (see the
+#               beginning of this file)
+def write_latency_grid(filename, max_thread_cnt, size, min_issue_time, values):
+    data = array.array("d", values)
+    if sys.byteorder != "little":
+        data.byteswap()
+
+    f = open(filename, "wb")
+    f.write(GRID_HEADER.pack(GRID_MAGIC, GRID_VERSION, max_thread_cnt, size,
+                             min_issue_time))
+    data.tofile(f)
+    f.close()
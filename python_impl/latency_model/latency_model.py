@@ -4,6 +4,12 @@
 # HIT/MISS/CONFLICT ratios as inputs and compute the memory latency, i.e., the 
 # memory bandwidth.
 
+# numpy is only needed by compute_memory_latency_batch
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # Input parameters:
 # hit_ratio, miss_ratio, conf_ratio: HIT/MISS/CONF ratios in float
 # issue_time: memory latency or issue time of a single thread, in float and in
@@ -61,12 +67,19 @@ def compute_memory_latency(hit_ratio,
     thr_overlap = thread_cnt - 1 # overlap-able writes from other threads
     rank_overlap = rank_cnt * 4 -1 # overlap-able DRAM requests limited by FAW
 
-    # overlapped hits with a miss
-    h_2_miss_overlap = min(rank_overlap, hit_ratio/miss_ratio)
+    # overlapped hits with a miss; with no misses (or conflicts below), the 
+    # overlap does not matter, and the hits can overlap as much as allowed
+    if miss_ratio != 0:
+        h_2_miss_overlap = min(rank_overlap, hit_ratio/miss_ratio)
+    else:
+        h_2_miss_overlap = rank_overlap
     # overlapped misses and conflicts with a miss
     mc_2_miss_overlap = min(rank_overlap, thread_cnt *(miss_ratio+conf_ratio) - 1) 
     # overlapped hits with a conflict
-    h_2_conf_overlap = min(rank_overlap, hit_ratio/conf_ratio)
+    if conf_ratio != 0:
+        h_2_conf_overlap = min(rank_overlap, hit_ratio/conf_ratio)
+    else:
+        h_2_conf_overlap = rank_overlap
     # overlapped misses and conflicts with a conflict
     mc_2_conf_overlap = min(rank_overlap, thread_cnt *(miss_ratio+conf_ratio) - 1) 
 
@@ -161,3 +174,239 @@ def compute_memory_latency(hit_ratio,
               "rd_lat": read_latency,
               "final_lat": final_latency}
     return result
+
+# Array version of compute_memory_latency, e.g., for evaluating the model over
+# a grid of thread counts and HMC ratios. All inputs except debug are numpy 
+# arrays or scalars, and are broadcast against each other. The result of each
+# element is the same as compute_memory_latency on the corresponding scalars.
+#
+# Input parameters: same as compute_memory_latency, and
+# few_mc: if given, a boolean (or boolean array) that replaces the condition
+#         "misses and conflicts are less than 70%", e.g., to evaluate the
+#         latencies of one side of that condition for any HMC ratios
+#
+# Return value:
+# A dictionary with the same fields as compute_memory_latency, each field is an
+# array of the broadcast shape.
+def compute_memory_latency_batch(hit_ratio,
+                                 miss_ratio,
+                                 conf_ratio,
+                                 issue_time,
+                                 thread_cnt,
+                                 wr_ratio,
+                                 max_hit,
+                                 max_miss,
+                                 max_conf,
+                                 cycle_time,
+                                 trans_cyc,
+                                 min_issue_time,
+                                 tRCD,
+                                 rank_cnt,
+                                 debug,
+                                 few_mc=None):
+    if numpy is None:
+        print "numpy is required for computing latencies in batches"
+        exit(2)
+
+    (hit_ratio, miss_ratio, conf_ratio, issue_time, thread_cnt, wr_ratio,
+     max_hit, max_miss, max_conf, cycle_time, trans_cyc, min_issue_time,
+     rank_cnt) = numpy.broadcast_arrays(*[numpy.asarray(v, dtype=float) for v
+                                          in (hit_ratio, miss_ratio,
+                                              conf_ratio, issue_time,
+                                              thread_cnt, wr_ratio, max_hit,
+                                              max_miss, max_conf, cycle_time,
+                                              trans_cyc, min_issue_time,
+                                              rank_cnt)])
+    if debug:
+        print "Computing latencies of", hit_ratio.size, "inputs"
+
+    ideal_issue_time = numpy.maximum(issue_time / thread_cnt, min_issue_time)
+    # Step 1: Compute the overlaps between hits, misses and conflicts, same as
+    # compute_memory_latency; they are the same for reads and writes
+    rank_overlap = rank_cnt * 4 - 1
+    # without misses (or conflicts), the hits overlap as much as allowed
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        h_2_miss_overlap = numpy.where(miss_ratio != 0,
+                                       numpy.minimum(rank_overlap,
+                                                     hit_ratio/miss_ratio),
+                                       rank_overlap)
+        h_2_conf_overlap = numpy.where(conf_ratio != 0,
+                                       numpy.minimum(rank_overlap,
+                                                     hit_ratio/conf_ratio),
+                                       rank_overlap)
+    mc_overlap = numpy.minimum(rank_overlap,
+                               thread_cnt * (miss_ratio + conf_ratio) - 1)
+    # few misses and conflicts, they rarely overlap each other
+    if few_mc is None:
+        few_mc = (miss_ratio + conf_ratio) < 0.7
+
+    # Steps 2 to 4, for reads and then writes; writes are one cycle longer
+    rd_lat = compute_hmc_latency_batch(hit_ratio, miss_ratio, conf_ratio,
+                                       max_miss, max_conf, trans_cyc,
+                                       cycle_time, h_2_miss_overlap,
+                                       h_2_conf_overlap, mc_overlap, few_mc)
+    rd_lat = numpy.maximum(rd_lat, ideal_issue_time)
+    wr_lat = compute_hmc_latency_batch(hit_ratio, miss_ratio, conf_ratio,
+                                       max_miss + 1, max_conf + 1,
+                                       trans_cyc + 1, cycle_time,
+                                       h_2_miss_overlap, h_2_conf_overlap,
+                                       mc_overlap, few_mc)
+
+    # combine the reads and writes and get the final latency
+    read_ratio = 1 - wr_ratio
+    final_lat = rd_lat * read_ratio + wr_lat * wr_ratio
+
+    result = {"wr_lat": wr_lat,
+              "rd_lat": rd_lat,
+              "final_lat": final_lat}
+    return result
+
+# Compute the overlapped latencies of hits, misses and conflicts, and combine
+# them with the HMC ratios (steps 2 to 4 of compute_memory_latency, for either
+# reads or writes). Inputs are arrays of the same shape; the overlaps and
+# few_mc are computed by compute_memory_latency_batch.
+def compute_hmc_latency_batch(hit_ratio, miss_ratio, conf_ratio, max_miss,
+                              max_conf, trans_cyc, cycle_time, 
+                              h_2_miss_overlap, h_2_conf_overlap, mc_overlap,
+                              few_mc):
+    hit_overlap_cyc = trans_cyc
+    miss_overlap_cyc = numpy.where(few_mc,
+                                   max_miss - h_2_miss_overlap * trans_cyc,
+                                   max_miss - (h_2_miss_overlap + mc_overlap) *
+                                   trans_cyc)
+    conf_overlap_cyc = numpy.where(few_mc,
+                                   max_conf - h_2_conf_overlap * trans_cyc,
+                                   max_conf - (h_2_conf_overlap + mc_overlap) *
+                                   trans_cyc)
+
+    hit_latency = hit_overlap_cyc * cycle_time
+    miss_latency = miss_overlap_cyc * cycle_time
+    conf_latency = conf_overlap_cyc * cycle_time
+
+    return (hit_ratio * hit_latency +
+            miss_ratio * miss_latency +
+            conf_ratio * conf_latency)
+
+# Convert a final latency into the bandwidth of the channel. The final latency
+# is the average time between two requests served by the channel, since it is
+# at least the issue time of a single thread divided by the number of threads.
+# Therefore the channel transfers one memory access of "line_size" bytes per
+# final latency.
+# Inputs:
+#       final_lat: final latency in nanoseconds, a float or a numpy array
+#       line_size: bytes transferred by one memory access
+# Return:
+#       bandwidth in bytes per nanosecond, i.e., GB/s
+def latency_to_bandwidth(final_lat, line_size):
+    return line_size / final_lat
+
+# Timing constants of a machine, as (name, type) in a machine profile. The
+# names are the same as the parameters of compute_memory_latency.
+MACHINE_PARAMS = [("max_hit", int), ("max_miss", int), ("max_conf", int),
+                  ("trans_cyc", int), ("tRCD", int), ("cycle_time", float),
+                  ("min_issue_time", float), ("rank_cnt", int)]
+
+# Read a machine profile, e.g., written by calibrate.py. Each line of the file
+# is "<name> <value>", with a name in MACHINE_PARAMS; lines started with "#"
+# are comments. Constants not in the file are left out of the result.
+# Inputs:
+#       filename: path to the profile
+# Return:
+#       a dict: name ==> value
+def read_machine_profile(filename):
+    types = dict(MACHINE_PARAMS)
+    profile = dict()
+    f = open(filename, "r")
+    for line in f:
+        line = line.strip()
+        if (len(line) == 0) or line.startswith("#"):
+            continue
+        (name, value) = line.split()
+        if name not in types:
+            print "Unknown constant in machine profile:", name
+            exit(3)
+        profile[name] = types[name](value)
+    f.close()
+
+    return profile
+
+# Write a machine profile that can be read by read_machine_profile.
+# Inputs:
+#       filename: path to the profile
+#       profile: a dict: name ==> value, with names in MACHINE_PARAMS
+#       comment: a line of comment written at the beginning of the file
+def write_machine_profile(filename, profile, comment):
+    f = open(filename, "w")
+    f.write("# " + comment + "\n")
+    for (name, t) in MACHINE_PARAMS:
+        if name in profile:
+            f.write(name + " " + repr(t(profile[name])) + "\n")
+    f.close()
+
+# Add the options of the timing constants of a machine to an OptionParser, with
+# the same defaults as gen_latencies.py, and the "--machine" option to read
+# them from a machine profile. The options are parsed by parse_machine_options.
+# Inputs:
+#       parser: the OptionParser object
+def add_machine_options(parser):
+    parser.add_option("--max_hit", dest="max_hit", help="Maximum memory " +
+                      "cycles to serve a row buffer hit; default 13",
+                      metavar="MAX_HIT_TIME", type="int", default=13)
+    parser.add_option("--max_miss", dest="max_miss", help="Maximum memory " +
+                      "cycles to serve a row buffer miss; default 22",
+                      metavar="MAX_MISS_TIME", type="int", default=22)
+    parser.add_option("--max_conf", dest="max_conf", help="Maximum memory " +
+                      "cycles to serve a row buffer conflict; default 31",
+                      metavar="MAX_CONF_TIME", type="int", default=31)
+    parser.add_option("--trans", dest="trans_cyc", help="Data " +
+                      "transportation time (in memory cycles) for one " +
+                      "memory read; default 4", metavar="TRANS_CYCLES",
+                      type="int", default=4)
+    parser.add_option("--tRCD", dest="tRCD", help="tRCD, row to column " +
+                      "delay, in memory cycles; default 9",
+                      metavar="TRCD_CYCLES", type="int", default=9)
+    parser.add_option("--cycle_time", dest="cycle_time", help="The memory " +
+                      "cycle time in nanoseconds; default 1.5ns",
+                      metavar="CYCLE_TIME", type="float", default=1.5)
+    parser.add_option("--min_time", dest="min_issue_time", help="Miminum " +
+                      "issue time due to L3 cache access; default 6.5ns",
+                      metavar="MIN_ISSUE_TIME", type="float", default=6.5)
+    parser.add_option("--rank", dest="rank_cnt", help="Number of ranks " +
+                      "simultaneously accessed; default 1",
+                      metavar="RANK_CNT", type="int", default=1)
+    parser.add_option("--machine", dest="machine", help="Machine profile " +
+                      "with the timing constants, e.g., written by " +
+                      "calibrate.py; the options of the constants override it",
+                      metavar="PROFILE")
+
+# Parse the command line of a parser with the options of add_machine_options.
+# The constants of the machine profile replace the defaults, and the command
+# line is parsed again so that the options given on it still take precedence.
+# Inputs:
+#       parser: the OptionParser object
+# Return:
+#       (options, args), same as parser.parse_args
+def parse_machine_options(parser):
+    (options, args) = parser.parse_args()
+    if options.machine is not None:
+        parser.set_defaults(**read_machine_profile(options.machine))
+        (options, args) = parser.parse_args()
+
+    return (options, args)
+
+# compute_memory_latency with the timing constants of the options of
+# add_machine_options.
+# Inputs:
+#       hit_ratio ... wr_ratio: see compute_memory_latency
+#       options: the parsed options
+#       debug: enable debug output
+# Return:
+#       same as compute_memory_latency
+def compute_machine_latency(hit_ratio, miss_ratio, conf_ratio, issue_time,
+                            thread_cnt, wr_ratio, options, debug):
+    return compute_memory_latency(hit_ratio, miss_ratio, conf_ratio,
+                                  issue_time, thread_cnt, wr_ratio,
+                                  options.max_hit, options.max_miss,
+                                  options.max_conf, options.cycle_time,
+                                  options.trans_cyc, options.min_issue_time,
+                                  options.tRCD, options.rank_cnt, debug, False)
@@ -18,10 +18,17 @@
 #
 
 import itertools
-import Queue
+import collections
 import copy
 import math
 
+# numpy is only used to price access sequences in batches; without it (e.g., 
+# when running with pypy) every sequence is priced one by one
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from mem_model_types import *
 import inter_pat_gen
 import hmc_ratios_gen
@@ -29,7 +36,7 @@ import hmc_ratios_gen
 # Fully generate the sequence of middle accesses. Keep track of every single 
 # access. No simplification is made
 # Inputs:
-#       thr_info: see thread_info class
+#       ctx: see model_context class
 #       con_acc_probs: see consecutive_acc_probs class
 #       con_noacc_probs: see consecutive_noacc_probs class
 #       thread_cnt: how many threads to process
@@ -38,7 +45,7 @@ import hmc_ratios_gen
 #       debug: whether enable debug output or not
 # Return:
 #       full_inter_pats[]: see full_interference_pattern class
-def gen_acc_seq_v1(thr_info, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_v1(ctx, con_acc_probs, con_noacc_probs, 
                      thread_cnt, min_con_acc, min_con_noacc, debug):
 
     full_inter_pat_groups = [] # all patterns for all channel reuse distance
@@ -46,8 +53,8 @@ def gen_acc_seq_v1(thr_info, con_acc_probs, con_noacc_probs,
     
     # for each channel reuse distance, generate the access sequence for one 
     # thread
-    for ch_dist in thr_info.chnl_reuse_dists:
-        acc_seqs = gen_full_acc_seq_1thr(thr_info, ch_dist, 
+    for ch_dist in ctx.chnl_reuse_dists:
+        acc_seqs = gen_full_acc_seq_1thr(ctx, ch_dist, 
                                          con_acc_probs,
                                          con_noacc_probs, min_con_acc, 
                                          min_con_noacc, debug)
@@ -89,19 +96,13 @@ def gen_acc_seq_v1(thr_info, con_acc_probs, con_noacc_probs,
 
 # check whether a particular channel reuse distance is valid
 # Inputs:
-#       thr_info: thread_info class object, has all valid channel reuse 
-#                 distances
+#       ctx: model_context object, has all valid channel reuse distances
 #       reuse_dist: the channel reuse distance for check
 # Return:
 #       True: valid
 #       False: invalid
-def check_resue_dist(thr_info, reuse_dist):
-    valid = False
-    for ch_dist in thr_info.chnl_reuse_dists:
-        if reuse_dist == ch_dist.acc_dist: # compare the input distance with
-            valid = True                   # all valid reuse distances
-    
-    return valid
+def check_resue_dist(ctx, reuse_dist):
+    return reuse_dist in ctx.reuse_dist_index
 
 # Return a string for logging an accs_one_thread object (acc_seq)
 def log_acc_sequence(acc_seq):
@@ -130,72 +131,17 @@ def log_acc_sequence(acc_seq):
 # Return an array of access sequences. Each sequence is an object of class
 # accs_one_thread.
 #
-# This is essentially a breath first search of the access tree (see my notes).
-# Each time a node is visited, do the following:
-#   1. generate two children, one access target channel, one not.
-#   2. check each child see if it is valid
-#   3. generate probability for each child
-#   4. push valid children into search queue
-#   5. stop generate children if current node has enough accesses
-def gen_full_acc_seq_1thr(thr_info, ch_dist, con_acc_probs, con_noacc_probs, 
+# The sequences are generated by search_acc_seqs_1thr, and then priced in one
+# batch.
+def gen_full_acc_seq_1thr(ctx, ch_dist, con_acc_probs, con_noacc_probs, 
                           min_con_acc, min_con_noacc, debug):
 
-    search_q = Queue.Queue()
-    root = accs_one_thread() # create root node
-    root.accesses = [] # root has no accesses
-    search_q.put(root) # add root to the search queue
-    acc_seqs = [] # this is the array that has all valid access sequences
-    
-    # now start breath first search
-    while not search_q.empty(): #{
-        node = search_q.get()
-                
-        # generate left child: access target channel
-        left = copy.deepcopy(node)
-        acc_l = access_status()
-        acc_l.same_chnl = True
-        left.accesses.append(acc_l)
-        
-        # generate right child: access other channels
-        right = copy.deepcopy(node)
-        acc_r = access_status()
-        acc_r.same_chnl = False
-        right.accesses.append(acc_r)
-
-        # check if left child valid
-        left_valid = is_acc_seq_valid(left, thr_info, 
-                                      min_con_acc, min_con_noacc)
-        # check if right child valid
-        right_valid = is_acc_seq_valid(right, thr_info,
-                                       min_con_acc, min_con_noacc)
-        
-        # update the probility of the new access of left child when 
-        # right child is not valid
-        if left_valid and (not right_valid): 
-            acc_l.prob = 1
-       
-        # update the probility of the new access of right child when
-        # left child is not valid
-        if right_valid and (not left_valid): 
-            acc_r.prob = 1
-                   
-
-        if left_valid and len(left.accesses) == ch_dist.acc_dist: 
-            # all accesses generate for this sequence
-            left = generate_acc_probs(left, thr_info, 
-                                      con_acc_probs, con_noacc_probs)
-            acc_seqs.append(left)
-        elif left_valid:
-            search_q.put(left)
-
-        if right_valid and len(right.accesses) == ch_dist.acc_dist: 
-            # all accesses generate for this sequence
-            right = generate_acc_probs(right, thr_info,
-                                       con_acc_probs, con_noacc_probs)
-            acc_seqs.append(right)
-        elif right_valid: 
-            search_q.put(right)
-    #}
+    acc_seqs = search_acc_seqs_1thr(ctx, ch_dist, min_con_acc, min_con_noacc,
+                                    True)
+
+    # compute the probabilities of all generated sequences
+    acc_seqs = price_acc_seqs(acc_seqs, ctx, con_acc_probs, con_noacc_probs,
+                              False)
 
     if debug:
         for acc_seq in acc_seqs:
@@ -205,12 +151,158 @@ def gen_full_acc_seq_1thr(thr_info, ch_dist, con_acc_probs, con_noacc_probs,
     return acc_seqs
         
     
+# Generate all valid access sequences of one thread for one channel reuse 
+# distance, without their probabilities.
+#
+# This is essentially a breath first search of the access tree (see my notes).
+# Each time a node is visited, do the following:
+#   1. generate two children, one access target channel, one not.
+#   2. check each child see if it is valid
+#   3. mark the only valid child, if there is one, as forced (probability 1)
+#   4. push valid children into search queue
+#   5. stop generate children if current node has enough accesses
+# The nodes are acc_search_node objects, so each child is checked in constant
+# time with the state kept in its parent, and no node is copied. The complete
+# sequences are turned into accs_one_thread objects at the end.
+# Inputs:
+#       ctx: see model_context class
+#       ch_dist: the chnl_reuse_dist_info object to generate sequences for
+#       min_con_acc: minimum number of consecutive accesses to target channel
+#       min_con_noacc: minimum number of consecutive accesses to other channels
+#       check_runs: whether to check min_con_acc and min_con_noacc; version 4
+#                   only checks the channel reuse distances
+# Return:
+#       a list of accs_one_thread objects, in the order of the search
+def search_acc_seqs_1thr(ctx, ch_dist, min_con_acc, min_con_noacc, 
+                         check_runs):
+    # the result only depends on the valid channel reuse distances and the 
+    # minimum numbers of consecutive accesses, so it is shared by all target
+    # channels with the same ones
+    key = (tuple(sorted(ctx.reuse_dist_index)), ch_dist.acc_dist, min_con_acc,
+           min_con_noacc, check_runs)
+    if key not in seq_shape_cache:
+        seq_shape_cache[key] = search_acc_seq_shapes(ctx, ch_dist, min_con_acc,
+                                                     min_con_noacc, check_runs)
+
+    return [build_acc_seq(shape) for shape in seq_shape_cache[key]]
+
+# Cache of the results of search_acc_seq_shapes
+seq_shape_cache = dict()
+
+# The search of search_acc_seqs_1thr. 
+# Inputs are the same as search_acc_seqs_1thr.
+# Return:
+#       a list of shapes of access sequences. Each shape is a tuple of 
+#       (same_chnl, forced) tuples, one for each access
+def search_acc_seq_shapes(ctx, ch_dist, min_con_acc, min_con_noacc, 
+                          check_runs):
+    search_q = collections.deque()
+    search_q.append(acc_search_node(None, None, 0, -1, None, 0))
+    leaves = [] # all valid complete sequences
+
+    # now start breath first search
+    while len(search_q) != 0: #{
+        node = search_q.popleft()
+
+        # generate and check the left child (access target channel) and the
+        # right child (access other channels)
+        left = gen_child_node(node, True, ctx, min_con_acc, min_con_noacc,
+                              check_runs)
+        right = gen_child_node(node, False, ctx, min_con_acc, min_con_noacc,
+                               check_runs)
+
+        # the access of the only valid child has probability 1
+        if (left is not None) and (right is None):
+            left.forced = True
+        if (right is not None) and (left is None):
+            right.forced = True
+
+        for child in (left, right):
+            if child is None:
+                continue
+            if child.depth == ch_dist.acc_dist:
+                # all accesses generate for this sequence
+                leaves.append(child)
+            else:
+                search_q.append(child)
+    #}
+
+    return [get_node_shape(leaf) for leaf in leaves]
+
+# Generate a child of a search node, and check whether it is valid. The checks
+# are the same as is_acc_seq_valid (or is_acc_seq_valid_v4 if check_runs is 
+# False), but only the new access is checked, since the parent is valid.
+# Inputs:
+#       node: the parent, an acc_search_node object
+#       same_chnl: whether the new access is to the target channel
+#       ctx, min_con_acc, min_con_noacc, check_runs: see search_acc_seqs_1thr
+# Return:
+#       the child acc_search_node object, or None if the child is invalid
+def gen_child_node(node, same_chnl, ctx, min_con_acc, min_con_noacc, 
+                   check_runs):
+    pos = node.depth
+    last_acc_pos = node.last_acc_pos
+
+    # check the channel reuse distance
+    if same_chnl:
+        if (last_acc_pos != -1) and (not check_resue_dist(ctx, 
+                                                          pos - last_acc_pos)):
+            return None
+        last_acc_pos = pos
+
+    # check the length of the run that ends here, if the new access starts a
+    # new run
+    run_len = node.run_len
+    if node.run_type is None: 
+        # assume there are enough accesses of the same type ahead of this 
+        # sequence
+        if same_chnl:
+            run_len = min_con_acc + 1
+        else:
+            run_len = min_con_noacc + 1
+    elif node.run_type == same_chnl:
+        run_len += 1
+    else:
+        if node.run_type:
+            min_len = min_con_acc
+        else:
+            min_len = min_con_noacc
+        if check_runs and (run_len < min_len):
+            return None
+        run_len = 1
+
+    return acc_search_node(node, same_chnl, pos + 1, last_acc_pos, same_chnl,
+                           run_len)
+
+# Get the shape of the access sequence from the root to a search node: a tuple
+# of (same_chnl, forced) tuples, one for each access
+def get_node_shape(node):
+    shape = [None] * node.depth
+    while node.parent is not None:
+        shape[node.depth - 1] = (node.same_chnl, node.forced)
+        node = node.parent
+
+    return tuple(shape)
+
+# Convert the shape of an access sequence into an accs_one_thread object.
+# Forced accesses have probability 1, like the ones generated by the old
+# search; all other probabilities are left to be computed.
+def build_acc_seq(shape):
+    acc_seq = accs_one_thread()
+    for (same_chnl, forced) in shape:
+        acc = access_status()
+        acc.same_chnl = same_chnl
+        if forced:
+            acc.prob = 1
+        acc_seq.accesses.append(acc)
+
+    return acc_seq
+
 # Based on the minimum consecutive access/non-accesses distance, and channel
 # reuse distance, check whether an access sequence is valid.
-# The check can be done by keeping track of previous accesses, which can 
-# save some time. But I am too tired to re-implement the check, copy is the
-# best for me at this minute.
-def is_acc_seq_valid(acc_seq, thr_info, min_con_acc, min_con_noacc):
+# This check scans the whole sequence; the search of step 1 uses the 
+# incremental check in gen_child_node instead.
+def is_acc_seq_valid(acc_seq, ctx, min_con_acc, min_con_noacc):
 
     valid = True
     # check the channel reuse distance in this permutation, make sure the
@@ -224,7 +316,7 @@ def is_acc_seq_valid(acc_seq, thr_info, min_con_acc, min_con_noacc):
             last_acc_position = i   # acc_seq, update last position only
             continue
         reuse_dist = i - last_acc_position
-        valid = check_resue_dist(thr_info, reuse_dist)
+        valid = check_resue_dist(ctx, reuse_dist)
         if valid == False: # invalid acc_seq, no need to check any more
             break
         last_acc_position = i # valid reuse distance, update last position
@@ -268,8 +360,9 @@ def is_acc_seq_valid(acc_seq, thr_info, min_con_acc, min_con_noacc):
 
 
 # generate the probabilities for all accesses in an accesses sequence as well as
-# the probability of whole sequence
-def generate_acc_probs(acc_seq, thr_info, con_acc_probs, con_noacc_probs):
+# the probability of whole sequence. The transition probabilities are taken from
+# the float tables of the model context.
+def generate_acc_probs(acc_seq, ctx, con_acc_probs, con_noacc_probs):
     # make a copy the access sequence
     acc_seq2 = copy.deepcopy(acc_seq)
     acc_seq2.prob = 1.0
@@ -287,18 +380,18 @@ def generate_acc_probs(acc_seq, thr_info, con_acc_probs, con_noacc_probs):
         # compute the probability of this access
         if i == 0: # the first access
             if acc_stat.same_chnl == True:
-                acc_stat.prob = thr_info.chnl_prob
+                acc_stat.prob = ctx.chnl_prob
             else:
-                acc_stat.prob = 1 - thr_info.chnl_prob
+                acc_stat.prob = 1 - ctx.chnl_prob
         else:
             if (con_acc_len != 0) and chnl == True: # 1 ==> 1 switching 
-                acc_stat.prob = con_acc_probs.acc_prob[con_acc_len]
+                acc_stat.prob = ctx.acc_prob[con_acc_len]
             elif (con_acc_len != 0) and chnl == False: # 1 ==> 0 switching
-                acc_stat.prob = 1- con_acc_probs.acc_prob[con_acc_len]
+                acc_stat.prob = ctx.acc_switch_prob[con_acc_len]
             elif (con_noacc_len != 0) and chnl == False: # 0 ==> 0 switching
-                acc_stat.prob = con_noacc_probs.noacc_prob[con_noacc_len]
+                acc_stat.prob = ctx.noacc_prob[con_noacc_len]
             elif (con_noacc_len != 0) and chnl == True: # 0 ==> 1 switching
-                acc_stat.prob = 1- con_noacc_probs.noacc_prob[con_noacc_len]
+                acc_stat.prob = ctx.noacc_switch_prob[con_noacc_len]
             
         # update the length of consecutive 1s and 0s
         if acc_stat.same_chnl == True: 
@@ -314,11 +407,128 @@ def generate_acc_probs(acc_seq, thr_info, con_acc_probs, con_noacc_probs):
 
     return acc_seq2        
                 
+# Compute the probabilities of a list of generated access sequences (of the 
+# same length), as well as the probabilities of their accesses. 
+# When numpy is available and the model context is not in exact mode, all
+# sequences are priced at once by generate_acc_probs_batch, and the 
+# sequences are updated in place. Otherwise, every sequence is priced by 
+# generate_acc_probs (or generate_acc_probs_v4), which work on copies.
+# Inputs:
+#       acc_seqs: list of accs_one_thread objects
+#       ctx: see model_context class
+#       con_acc_probs: see consecutive_acc_probs class
+#       con_noacc_probs: see consecutive_noacc_probs class
+#       independent: price every access independently (version 4)
+# Return:
+#       the list of priced accs_one_thread objects
+def price_acc_seqs(acc_seqs, ctx, con_acc_probs, con_noacc_probs, 
+                   independent):
+    if ctx.exact or (numpy is None) or (len(acc_seqs) == 0):
+        if independent:
+            gen_probs = generate_acc_probs_v4
+        else:
+            gen_probs = generate_acc_probs
+        return [gen_probs(acc_seq, ctx, con_acc_probs, con_noacc_probs) 
+                for acc_seq in acc_seqs]
+
+    chnl = numpy.array([[acc.same_chnl for acc in acc_seq.accesses]
+                        for acc_seq in acc_seqs], dtype=bool)
+    forced = numpy.array([[acc.prob == 1 for acc in acc_seq.accesses]
+                          for acc_seq in acc_seqs], dtype=bool)
+    acc_probs, seq_probs = generate_acc_probs_batch(chnl, forced, ctx, 
+                                                    independent)
+    total_accs = chnl.sum(axis=1).tolist()
+    acc_probs = acc_probs.tolist()
+    seq_probs = seq_probs.tolist()
+    for idx, acc_seq in enumerate(acc_seqs):
+        acc_seq.prob = seq_probs[idx]
+        acc_seq.total_accs = total_accs[idx]
+        for acc, prob in itertools.izip(acc_seq.accesses, acc_probs[idx]):
+            acc.prob = prob
+
+    return acc_seqs
+
+# Vectorized version of generate_acc_probs and generate_acc_probs_v4: price a
+# batch of access sequences in one pass.
+# For every position, the lengths of the consecutive 1s and 0s before it (the 
+# run-length indices) are derived first, then the probabilities are gathered
+# from the float transition tables of the model context. Like the per-sequence
+# functions, a forced access (probability already set to 1 because the other
+# choice is invalid) does not change the run lengths.
+# Inputs:
+#       chnl: n x l boolean matrix, chnl[i][j] is True if the "j"th access of
+#             the "i"th sequence accesses the target channel
+#       forced: n x l boolean matrix, True for accesses whose probability is 
+#               forced to be 1; can be None
+#       ctx: see model_context class
+#       independent: price every access independently (version 4)
+# Return:
+#       (acc_probs, seq_probs): n x l matrix of the probabilities of the 
+#       accesses, and vector of the probabilities of the n sequences
+def generate_acc_probs_batch(chnl, forced, ctx, independent):
+    chnl = numpy.asarray(chnl, dtype=bool)
+    (seq_cnt, leng) = chnl.shape
+    if forced is None:
+        forced = numpy.zeros((seq_cnt, leng), dtype=bool)
+
+    if independent:
+        acc_probs = numpy.where(chnl, ctx.chnl_prob, 1 - ctx.chnl_prob)
+    else:
+        # run-length indices: lengths of consecutive 1s and 0s before each
+        # access
+        acc_lens = numpy.zeros((seq_cnt, leng), dtype=numpy.intp)
+        noacc_lens = numpy.zeros((seq_cnt, leng), dtype=numpy.intp)
+        acc_len = numpy.zeros(seq_cnt, dtype=numpy.intp)
+        noacc_len = numpy.zeros(seq_cnt, dtype=numpy.intp)
+        for i in range(leng):
+            acc_lens[:, i] = acc_len
+            noacc_lens[:, i] = noacc_len
+            col = chnl[:, i]
+            free = ~forced[:, i]
+            acc_len = numpy.where(free, numpy.where(col, acc_len + 1, 0), 
+                                  acc_len)
+            noacc_len = numpy.where(free, numpy.where(col, 0, noacc_len + 1), 
+                                    noacc_len)
+
+        # gather from the transition tables; an access with no run before it
+        # (only possible after forced accesses) has probability 0, just like 
+        # in generate_acc_probs
+        acc_prob = numpy.array(ctx.acc_prob, dtype=float)
+        acc_switch_prob = numpy.array(ctx.acc_switch_prob, dtype=float)
+        noacc_prob = numpy.array(ctx.noacc_prob, dtype=float)
+        noacc_switch_prob = numpy.array(ctx.noacc_switch_prob, dtype=float)
+        after_acc = acc_lens != 0
+        after_noacc = (~after_acc) & (noacc_lens != 0)
+        acc_idx = numpy.where(after_acc, acc_lens, 0)
+        noacc_idx = numpy.where(after_noacc, noacc_lens, 0)
+        acc_probs = numpy.zeros((seq_cnt, leng))
+        acc_probs = numpy.where(after_acc & chnl, acc_prob[acc_idx], 
+                                acc_probs)
+        acc_probs = numpy.where(after_acc & ~chnl, acc_switch_prob[acc_idx], 
+                                acc_probs)
+        acc_probs = numpy.where(after_noacc & ~chnl, noacc_prob[noacc_idx],
+                                acc_probs)
+        acc_probs = numpy.where(after_noacc & chnl, 
+                                noacc_switch_prob[noacc_idx], acc_probs)
+        # the first access
+        acc_probs[:, 0] = numpy.where(chnl[:, 0], ctx.chnl_prob, 
+                                      1 - ctx.chnl_prob)
+
+    acc_probs = numpy.where(forced, 1.0, acc_probs)
+
+    # multiply the accesses in order, so the sequence probabilities are
+    # exactly those of the per-sequence functions
+    seq_probs = numpy.ones(seq_cnt)
+    for i in range(leng):
+        seq_probs *= acc_probs[:, i]
+
+    return (acc_probs, seq_probs)
+
 # V2 version as mentioned in the beginning comments. 
 # Also check out the comments of function gen_acc_seq_v1
 # A key difference between this one the the full version (V1) is that
 # I am not going to do deepcopy, rather a link tot the sequnce     
-def gen_acc_seq_v2_full_comb(thr_info, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_v2_full_comb(ctx, con_acc_probs, con_noacc_probs, 
                              thread_cnt, min_con_acc, min_con_noacc, debug):
 
     full_inter_pat_groups = [] # all patterns for all channel reuse distance
@@ -326,16 +536,15 @@ def gen_acc_seq_v2_full_comb(thr_info, con_acc_probs, con_noacc_probs,
     
     # for each channel reuse distance, generate the access sequence for one 
     # thread
-    for ch_dist in thr_info.chnl_reuse_dists:
+    for ch_dist in ctx.chnl_reuse_dists:
         acc_seqs = ch_dist.acc_seqs
         
         # generate the combinations of different types of access sequence
-        combs = list(combinations_with_replacement(range(len(acc_seqs)), 
-                                                   thread_cnt-1))
+        (combs, comb_counts) = get_seq_combs(len(acc_seqs), thread_cnt-1)
 
         full_inter_pats = [] # all patterns for one channel reuse distance
         full_inter_pat_groups.append(full_inter_pats)
-        for comb in combs:
+        for (comb, comb_count) in itertools.izip(combs, comb_counts):
             inter_pat = full_interference_pattern()
             inter_pat.chnl_reuse_dist = ch_dist.acc_dist
             inter_pat.prob = ch_dist.prob
@@ -349,7 +558,7 @@ def gen_acc_seq_v2_full_comb(thr_info, con_acc_probs, con_noacc_probs,
                 #print inter_pat_gen.log_full_inter_pat(inter_pat)
             # this pattern is actually corresponding to multiple sequence,
             # count in those sequence
-            inter_pat.prob *= compute_comb_count_in_product(comb)
+            inter_pat.prob *= comb_count
 
         output = ("Channel-reuse-distance " + str(ch_dist.acc_dist) + 
                   " has interference patterns: " + str(len(full_inter_pats)))
@@ -386,6 +595,25 @@ def combinations_with_replacement(iterable, r):
         indices[i:] = [indices[i] + 1] * (r - i)
         yield  tuple(pool[i] for i in indices)
 
+# Cache of the results of get_seq_combs. The combinations only depend on the
+# number of access sequences and the number of middle threads, so they are 
+# shared by all channel reuse distances and target channels.
+seq_comb_cache = dict()
+
+# Get all combinations (with replacement) of "thr_cnt" access sequences out of
+# "seq_cnt" sequences, and for each combination, the number of products 
+# corresponding to it (see compute_comb_count_in_product).
+# Return:
+#       (list of combinations, list of counts)
+def get_seq_combs(seq_cnt, thr_cnt):
+    key = (seq_cnt, thr_cnt)
+    if key not in seq_comb_cache:
+        combs = list(combinations_with_replacement(range(seq_cnt), thr_cnt))
+        counts = [compute_comb_count_in_product(comb) for comb in combs]
+        seq_comb_cache[key] = (combs, counts)
+
+    return seq_comb_cache[key]
+
 # This function works on the result of combinations_with_replacement. 
 # In function combinations_with_replacement, a result R is a "r"-length 
 # combination of elements from the sequence "iterable" with one element can be
@@ -431,11 +659,11 @@ def cal_combination(n, k):
 # Generate all possible access sequences for one thread for each channel reuse
 # distance.
 # Also check out the comments of function gen_acc_seq_v1
-def gen_full_acc_seq_1thr_all(thr_info, con_acc_probs, con_noacc_probs, 
+def gen_full_acc_seq_1thr_all(ctx, con_acc_probs, con_noacc_probs, 
                              thread_cnt, min_con_acc, min_con_noacc, debug):
 
-    for ch_dist in thr_info.chnl_reuse_dists:
-        acc_seqs = gen_full_acc_seq_1thr(thr_info, ch_dist, 
+    for ch_dist in ctx.chnl_reuse_dists:
+        acc_seqs = gen_full_acc_seq_1thr(ctx, ch_dist, 
                                          con_acc_probs,
                                          con_noacc_probs, min_con_acc, 
                                          min_con_noacc, debug)
@@ -451,11 +679,11 @@ def gen_full_acc_seq_1thr_all(thr_info, con_acc_probs, con_noacc_probs,
 # Generate all possible access sequences for one thread for each channel reuse
 # distance using version 3. Check the comments at the beginning of this file.
 # Also check out the comments of function gen_acc_seq_v1
-def gen_acc_seq_1thr_all_v3(thr_info, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_1thr_all_v3(ctx, con_acc_probs, con_noacc_probs, 
                              thread_cnt, min_con_acc, min_con_noacc, debug):
 
-    for ch_dist in thr_info.chnl_reuse_dists:
-        acc_seqs = gen_acc_seq_1thr_v3(thr_info, ch_dist, 
+    for ch_dist in ctx.chnl_reuse_dists:
+        acc_seqs = gen_acc_seq_1thr_v3(ctx, ch_dist, 
                                        con_acc_probs,
                                        con_noacc_probs, min_con_acc, 
                                        min_con_noacc, debug)
@@ -477,7 +705,7 @@ def gen_acc_seq_1thr_all_v3(thr_info, con_acc_probs, con_noacc_probs,
 # Return an array of access sequences. Each sequence is an object of class
 # accs_one_thread.
 #
-def gen_acc_seq_1thr_v3(thr_info, ch_dist, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_1thr_v3(ctx, ch_dist, con_acc_probs, con_noacc_probs, 
                         min_con_acc, min_con_noacc, debug):
 
     acc_seqs = [] # this is the array that has all valid access sequences
@@ -494,12 +722,12 @@ def gen_acc_seq_1thr_v3(thr_info, ch_dist, con_acc_probs, con_noacc_probs,
             acc = access_status()
             acc_seq.accesses.append(acc)
             acc.same_chnl = True
-            acc.prob = thr_info.chnl_prob
+            acc.prob = ctx.chnl_prob
         for j in range(i, ch_dist.acc_dist):
             acc = access_status()
             acc_seq.accesses.append(acc)
             acc.same_chnl = False
-            acc.prob = 1 - thr_info.chnl_prob
+            acc.prob = 1 - ctx.chnl_prob
         # sanity check
         if len(acc_seq.accesses) != ch_dist.acc_dist:
             print "There should be", ch_dist.acc_dist, "accesses"
@@ -507,8 +735,8 @@ def gen_acc_seq_1thr_v3(thr_info, ch_dist, con_acc_probs, con_noacc_probs,
             exit(15)
         
         acc_seq.prob = (cal_combination(ch_dist.acc_dist, i) *
-                        (thr_info.chnl_prob ** i) *
-                        ((1 - thr_info.chnl_prob)**(ch_dist.acc_dist-i)))
+                        (ctx.chnl_prob ** i) *
+                        ((1 - ctx.chnl_prob)**(ch_dist.acc_dist-i)))
         acc_seq.total_accs = i
         sum_prob += acc_seq.prob
         acc_seqs.append(acc_seq)
@@ -529,7 +757,7 @@ def gen_acc_seq_1thr_v3(thr_info, ch_dist, con_acc_probs, con_noacc_probs,
 # Also check out the comments of function gen_acc_seq_v1
 # A key difference between this one the the full version (V1) is that
 # I am not going to do deepcopy, rather a link to the sequnce     
-def gen_acc_seq_v3_full_comb(thr_info, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_v3_full_comb(ctx, con_acc_probs, con_noacc_probs, 
                              thread_cnt, min_con_acc, min_con_noacc, debug):
 
     full_inter_pat_groups = [] # all patterns for all channel reuse distance
@@ -537,16 +765,15 @@ def gen_acc_seq_v3_full_comb(thr_info, con_acc_probs, con_noacc_probs,
     
     # for each channel reuse distance, generate the access sequence for one 
     # thread. Each inter_pat group represents one reduce distance.
-    for ch_dist in thr_info.chnl_reuse_dists:
+    for ch_dist in ctx.chnl_reuse_dists:
         acc_seqs = ch_dist.acc_seqs
         
         # generate the combinations of different types of access sequence
-        combs = list(combinations_with_replacement(range(len(acc_seqs)), 
-                                                   thread_cnt-1))
+        (combs, comb_counts) = get_seq_combs(len(acc_seqs), thread_cnt-1)
 
         full_inter_pats = [] # all patterns for one channel reuse distance
         full_inter_pat_groups.append(full_inter_pats)
-        for comb in combs:
+        for (comb, comb_count) in itertools.izip(combs, comb_counts):
             inter_pat = full_interference_pattern()
             inter_pat.chnl_reuse_dist = ch_dist.acc_dist
             inter_pat.prob = ch_dist.prob
@@ -561,7 +788,7 @@ def gen_acc_seq_v3_full_comb(thr_info, con_acc_probs, con_noacc_probs,
                     print inter_pat_gen.log_full_inter_pat(inter_pat)
             # this pattern is actually corresponding to multiple sequence,
             # count in those sequence
-            inter_pat.prob *= compute_comb_count_in_product(comb)
+            inter_pat.prob *= comb_count
 
         output = ("Channel-reuse-distance " + str(ch_dist.acc_dist) + 
                   " has interference patterns: " + str(len(full_inter_pats)))
@@ -581,11 +808,11 @@ def gen_acc_seq_v3_full_comb(thr_info, con_acc_probs, con_noacc_probs,
 # Generate all possible access sequences for one thread for each channel reuse
 # distance. Version 4
 # Also check out the comments of function gen_acc_seq_v1
-def gen_acc_seq_1thr_all_v4(thr_info, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_1thr_all_v4(ctx, con_acc_probs, con_noacc_probs, 
                             thread_cnt, min_con_acc, min_con_noacc, debug):
 
-    for ch_dist in thr_info.chnl_reuse_dists:
-        acc_seqs = gen_acc_seq_1thr_v4(thr_info, ch_dist, 
+    for ch_dist in ctx.chnl_reuse_dists:
+        acc_seqs = gen_acc_seq_1thr_v4(ctx, ch_dist, 
                                          con_acc_probs,
                                          con_noacc_probs, min_con_acc, 
                                          min_con_noacc, debug)
@@ -607,68 +834,18 @@ def gen_acc_seq_1thr_all_v4(thr_info, con_acc_probs, con_noacc_probs,
 # accs_one_thread.
 #
 # This is the same algorithm as the gen_full_acc_seq_1thr
-def gen_acc_seq_1thr_v4(thr_info, ch_dist, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_1thr_v4(ctx, ch_dist, con_acc_probs, con_noacc_probs, 
                           min_con_acc, min_con_noacc, debug):
 
-    search_q = Queue.Queue()
-    root = accs_one_thread() # create root node
-    root.accesses = [] # root has no accesses
-    search_q.put(root) # add root to the search queue
-    acc_seqs = [] # this is the array that has all valid access sequences
-    
-    # now start breath first search
+    acc_seqs = search_acc_seqs_1thr(ctx, ch_dist, min_con_acc, min_con_noacc,
+                                    False)
     sum_prob = 0.0
-    while not search_q.empty(): #{
-        node = search_q.get()
-                
-        # generate left child: access target channel
-        left = copy.deepcopy(node)
-        acc_l = access_status()
-        acc_l.same_chnl = True
-        left.accesses.append(acc_l)
-        
-        # generate right child: access other channels
-        right = copy.deepcopy(node)
-        acc_r = access_status()
-        acc_r.same_chnl = False
-        right.accesses.append(acc_r)
-
-        # check if left child valid
-        left_valid = is_acc_seq_valid_v4(left, thr_info, 
-                                      min_con_acc, min_con_noacc)
-        # check if right child valid
-        right_valid = is_acc_seq_valid_v4(right, thr_info,
-                                       min_con_acc, min_con_noacc)
-        
-        # update the probility of the new access of left child when 
-        # right child is not valid
-        if left_valid and (not right_valid): 
-            acc_l.prob = 1
-       
-        # update the probility of the new access of right child when
-        # left child is not valid
-        if right_valid and (not left_valid): 
-            acc_r.prob = 1
-                   
-
-        if left_valid and len(left.accesses) == ch_dist.acc_dist: 
-            # all accesses generate for this sequence
-            left = generate_acc_probs_v4(left, thr_info, 
-                                      con_acc_probs, con_noacc_probs)
-            sum_prob += left.prob
-            acc_seqs.append(left)
-        elif left_valid:
-            search_q.put(left)
-
-        if right_valid and len(right.accesses) == ch_dist.acc_dist: 
-            # all accesses generate for this sequence
-            right = generate_acc_probs_v4(right, thr_info,
-                                       con_acc_probs, con_noacc_probs)
-            sum_prob += right.prob
-            acc_seqs.append(right)
-        elif right_valid: 
-            search_q.put(right)
-    #}
+
+    # compute the probabilities of all generated sequences
+    acc_seqs = price_acc_seqs(acc_seqs, ctx, con_acc_probs, con_noacc_probs,
+                              True)
+    for acc_seq in acc_seqs:
+        sum_prob += acc_seq.prob
 
     if sum_prob != 1.0:
         print "Error in access sequence generate version 4:"
@@ -685,10 +862,9 @@ def gen_acc_seq_1thr_v4(thr_info, ch_dist, con_acc_probs, con_noacc_probs,
 # Based on the channel reuse distance, check whether an access sequence is 
 # valid. This is similar to function "is_acc_seq_valid", except that the
 # min-consecutive-(non)accesses is no checked.
-# The check can be done by keeping track of previous accesses, which can 
-# save some time. But I am too tired to re-implement the check, copy is the
-# best for me at this minute.
-def is_acc_seq_valid_v4(acc_seq, thr_info, min_con_acc, min_con_noacc):
+# This check scans the whole sequence; the search of step 1 uses the 
+# incremental check in gen_child_node instead.
+def is_acc_seq_valid_v4(acc_seq, ctx, min_con_acc, min_con_noacc):
 
     valid = True
     # check the channel reuse distance in this permutation, make sure the
@@ -702,7 +878,7 @@ def is_acc_seq_valid_v4(acc_seq, thr_info, min_con_acc, min_con_noacc):
             last_acc_position = i   # acc_seq, update last position only
             continue
         reuse_dist = i - last_acc_position
-        valid = check_resue_dist(thr_info, reuse_dist)
+        valid = check_resue_dist(ctx, reuse_dist)
         if valid == False: # invalid acc_seq, no need to check any more
             break
         last_acc_position = i # valid reuse distance, update last position
@@ -716,7 +892,7 @@ def is_acc_seq_valid_v4(acc_seq, thr_info, min_con_acc, min_con_noacc):
 # the probability of whole sequence.
 # Here, each access is considered individually and independent of previous 
 # accesses.
-def generate_acc_probs_v4(acc_seq, thr_info, con_acc_probs, con_noacc_probs):
+def generate_acc_probs_v4(acc_seq, ctx, con_acc_probs, con_noacc_probs):
     # make a copy the access sequence
     acc_seq2 = copy.deepcopy(acc_seq)
     acc_seq2.prob = 1.0
@@ -733,9 +909,9 @@ def generate_acc_probs_v4(acc_seq, thr_info, con_acc_probs, con_noacc_probs):
             continue;
         # compute the probability of this access
         if acc_stat.same_chnl == True:
-            acc_stat.prob = thr_info.chnl_prob
+            acc_stat.prob = ctx.chnl_prob
         else:
-            acc_stat.prob = 1 - thr_info.chnl_prob
+            acc_stat.prob = 1 - ctx.chnl_prob
             
         # update the length of consecutive 1s and 0s
         if acc_stat.same_chnl == True: 
@@ -755,7 +931,7 @@ def generate_acc_probs_v4(acc_seq, thr_info, con_acc_probs, con_noacc_probs):
 # access. No simplification is made. Version 1 as stated in the beginning
 # of this file
 # Inputs:
-#       thr_info: see thread_info class
+#       ctx: see model_context class
 #       con_acc_probs: see consecutive_acc_probs class
 #       con_noacc_probs: see consecutive_noacc_probs class
 #       thread_cnt: how many threads to process
@@ -764,7 +940,7 @@ def generate_acc_probs_v4(acc_seq, thr_info, con_acc_probs, con_noacc_probs):
 #       debug: whether enable debug output or not
 # Return:
 #       full_inter_pats[]: see full_interference_pattern class
-def gen_acc_seq_v1_full(thr_info, con_acc_probs, con_noacc_probs, 
+def gen_acc_seq_v1_full(ctx, con_acc_probs, con_noacc_probs, 
                      thread_cnt, min_con_acc, min_con_noacc, debug):
 
     full_inter_pat_groups = [] # all patterns for all channel reuse distance
@@ -772,7 +948,7 @@ def gen_acc_seq_v1_full(thr_info, con_acc_probs, con_noacc_probs,
     
     # for each channel reuse distance, generate the access sequence for one 
     # thread
-    for ch_dist in thr_info.chnl_reuse_dists:
+    for ch_dist in ctx.chnl_reuse_dists:
         acc_seqs = ch_dist.acc_seqs
         
         # generate the interfere patterns for this channel resue distance
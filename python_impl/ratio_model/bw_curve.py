@@ -0,0 +1,398 @@
+#!/usr/bin/python
+
+# This script runs the whole DraMon model in one process: it predicts the
+# hit/miss/conflict ratios of every channel of a parameter file (see
+# run_model.py) for a list of thread counts, feeds the ratios to the latency
+# model (see ../latency_model), and converts the latencies into bandwidth.
+#
+# Step 1 and 2 of the ratio model do not depend on the number of threads, so
+# they are run only once for each channel; the caches of the ratio model are
+# also shared by all thread counts.
+#
+# The results are written as CSV (one line per channel and thread count) or as
+# JSON (a list with one object per channel and thread count), with the fields:
+#     channel, threads, hit, miss, conflict, rd_lat, wr_lat, final_lat,
+#     bandwidth, thread_bandwidth
+# where thread_lat is the latency seen by one thread (final_lat is the interval
+# between two requests of the channel, so one thread waits "threads" of them).
+# Latencies are in nanoseconds, and bandwidths are in GB/s.
+#
+# With "--search", only the saturation point of each channel is written, i.e.,
+# the smallest thread count of "-t" that
+#   knee: reaches the peak bandwidth of the thread counts, within the
+#         tolerance "--tol", or
+#   latency: has a thread latency of at least "--threshold" nanoseconds.
+# The thread latency does not decrease with more threads, so the latency
+# saturation point is found by bisection over the thread counts. The bandwidth
+# may drop after its peak (e.g., more conflicts with more threads), so it is
+# assumed to have a single peak: the peak is found by a ternary search, and
+# the knee by bisection over the thread counts up to the peak. Every thread
+# count is predicted at most once, so only a logarithmic number of the thread
+# counts are predicted, instead of all of them.
+#
+
+import os
+import sys
+import json
+from optparse import OptionParser
+
+import model_runner
+import dist_bucket
+import corun_gen
+
+from mem_model_types import *
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                             "latency_model"))
+import latency_model
+
+parser = OptionParser()
+# options of the ratio model, see run_model.py
+parser.add_option("-f", "--file", dest="filename", help="Path to the parameter "
+                  + "file", metavar="parameterfile")
+parser.add_option("-t", "--threads", dest="threads", help="Numbers of " +
+                  "threads to predict; comma separated list of numbers or " +
+                  "ranges, e.g., 1,2,4-8", metavar="THREAD_COUNTS",
+                  type="string")
+parser.add_option("-o", "--timeout", dest="timeout", help="Time in nanoseconds "
+                  + "before a bank auto-close; 0 means no auto-close",
+                  metavar="TIEMOUT", type="float", default=0.0)
+parser.add_option("-r", "--reorder", dest="reorder", help="Maximum timespan " +
+                  "allowed for reordering: 0 means no reordering",
+                  metavar="REORDER", type="float", default=0.0)
+parser.add_option("-e", "--esttime", dest="est_serv_time", help="Estimated " +
+                  "service time for memory request, in nanoseconds",
+                  metavar="EST_TIME", type="float", default=0.0)
+parser.add_option("--half", dest="half_reorder", help="Whether " +
+                  "half reordered misses/conflicts remains misses/conflicts ",
+                  action="store_true", default=False)
+parser.add_option("-s", "--steps", dest="steps", help="The version of " +
+                  "each of the four steps; comma separate list of four integers"
+                  , metavar="V,V,V,V", type="string")
+parser.add_option("-b", "--buckets", dest="buckets", help="Merge the " +
+                  "channel reuse distances into at most BUCKETS groups",
+                  metavar="BUCKETS", type="int")
+parser.add_option("--bucket_mode", dest="bucket_mode", help="How to merge " +
+                  "the channel reuse distances: log or error; default error",
+                  metavar="MODE", type="string", default="error")
+parser.add_option("--exact", dest="exact", help="Price the access " +
+                  "sequences one at a time with the Fraction tables, as the " +
+                  "original implementation does, instead of in batches; " +
+                  "slow, for double checking only", action="store_true",
+                  default=False)
+# options of the latency model, see gen_latencies.py
+parser.add_option("-i", "--issue_time", dest="issue_time", help="Memory " +
+                  "issue time for a single thread; in nanoseconds",
+                  metavar="ISSUE_TIME", type="float")
+parser.add_option("-w", "--writes", dest="wr_ratio", help="Ratio of " +
+                  "DRAM writes; default 0", metavar="WR_RATIO", type="float",
+                  default=0.0)
+latency_model.add_machine_options(parser)
+# options of this script
+parser.add_option("--line", dest="line_size", help="Bytes transferred by " +
+                  "one memory access; default 64", metavar="LINE_SIZE",
+                  type="int", default=64)
+parser.add_option("--format", dest="format", help="Output format: csv or " +
+                  "json; default csv", metavar="FORMAT", type="string",
+                  default="csv")
+parser.add_option("--output", dest="output", help="Path to the output file; " +
+                  "default is the standard output", metavar="OUTPUT")
+parser.add_option("--search", dest="search", help="Only find the " +
+                  "saturation point of each channel: knee or latency",
+                  metavar="MODE", type="string")
+parser.add_option("--tol", dest="tolerance", help="Tolerance of the " +
+                  "bandwidth for the knee search; default 0.05",
+                  metavar="TOLERANCE", type="float", default=0.05)
+parser.add_option("--threshold", dest="threshold", help="Thread latency, in " +
+                  "nanoseconds, for the latency search", metavar="THRESHOLD",
+                  type="float")
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+# Output fields, in the order of the CSV columns
+FIELDS = ["channel", "threads", "hit", "miss", "conflict", "rd_lat", "wr_lat",
+          "final_lat", "thread_lat", "bandwidth", "thread_bandwidth"]
+
+# Parse a list of thread counts, e.g., "1,2,4-8"
+# Return:
+#       a list of integers
+def parse_thread_cnts(threads):
+    thread_cnts = []
+    for item in threads.split(","):
+        if "-" in item:
+            (first, last) = item.split("-")
+            thread_cnts += range(int(first), int(last) + 1)
+        else:
+            thread_cnts.append(int(item))
+
+    return thread_cnts
+
+# Compute the latencies and bandwidth of one channel and one thread count.
+# Inputs:
+#       chnl_id: id of the channel
+#       thread_cnt: number of threads
+#       hmc: hmc_ratios object predicted for this channel and thread count
+#       options: the command line options
+# Return:
+#       a dict with all fields in FIELDS
+def gen_curve_point(chnl_id, thread_cnt, hmc, options):
+    result = latency_model.compute_machine_latency(hmc.hit, hmc.miss,
+                                                   hmc.conflict,
+                                                   options.issue_time,
+                                                   thread_cnt,
+                                                   options.wr_ratio, options,
+                                                   options.debug)
+    bandwidth = latency_model.latency_to_bandwidth(result["final_lat"],
+                                                   options.line_size)
+
+    point = {"channel": chnl_id,
+             "threads": thread_cnt,
+             "hit": hmc.hit,
+             "miss": hmc.miss,
+             "conflict": hmc.conflict,
+             "rd_lat": result["rd_lat"],
+             "wr_lat": result["wr_lat"],
+             "final_lat": result["final_lat"],
+             "thread_lat": result["final_lat"] * thread_cnt,
+             "bandwidth": bandwidth,
+             "thread_bandwidth": bandwidth / thread_cnt}
+    return point
+
+# Predict one channel for one thread count, or get the prediction from "memo"
+# if the thread count was already predicted.
+# Inputs:
+#       memo: dict of the channel, thread count ==> dict returned by
+#             gen_curve_point
+#       ctx: model_context object of the channel; run_steps_1_2 has been run
+#       chnl: chnl_params object of the channel
+#       thread_cnt: number of threads
+#       steps: the version of each of the four steps
+#       options: the command line options
+# Return:
+#       a dict returned by gen_curve_point
+def eval_curve_point(memo, ctx, chnl, thread_cnt, steps, options):
+    if thread_cnt not in memo:
+        hmc = model_runner.run_steps_3_4(ctx, chnl, thread_cnt, steps,
+                                         options.debug)
+        memo[thread_cnt] = gen_curve_point(chnl.chnl_id, thread_cnt, hmc,
+                                           options)
+
+    return memo[thread_cnt]
+
+# Find the first thread count that satisfies a condition, by bisection. The
+# condition should hold for all thread counts after the first one.
+# Inputs:
+#       thread_cnts: sorted list of thread counts
+#       cond: function that takes a thread count and returns True or False
+# Return:
+#       the first thread count that satisfies cond, or None if the largest one
+#       does not satisfy it
+def search_first(thread_cnts, cond):
+    if not cond(thread_cnts[-1]):
+        return None
+
+    low = 0
+    high = len(thread_cnts) - 1
+    while low < high:
+        mid = (low + high) / 2
+        if cond(thread_cnts[mid]):
+            high = mid
+        else:
+            low = mid + 1
+
+    return thread_cnts[low]
+
+# Find the thread count with the highest bandwidth, by ternary search. The
+# bandwidth should increase up to this thread count, and should not increase
+# after it.
+# Inputs:
+#       thread_cnts: sorted list of thread counts
+#       bandwidth: function that takes a thread count and returns its bandwidth
+# Return:
+#       the index of the thread count with the highest bandwidth
+def search_peak(thread_cnts, bandwidth):
+    low = 0
+    high = len(thread_cnts) - 1
+    while high - low > 2:
+        mid1 = low + (high - low) / 3
+        mid2 = high - (high - low) / 3
+        if bandwidth(thread_cnts[mid1]) < bandwidth(thread_cnts[mid2]):
+            low = mid1 + 1
+        else:
+            high = mid2 - 1
+
+    peak = low
+    for i in range(low + 1, high + 1):
+        if bandwidth(thread_cnts[i]) > bandwidth(thread_cnts[peak]):
+            peak = i
+
+    return peak
+
+# Find the saturation point of one channel (see the "--search" option).
+# Inputs:
+#       chnl: chnl_params object of the channel
+#       thread_cnts: sorted list of thread counts
+#       steps: the version of each of the four steps
+#       options: the command line options
+# Return:
+#       (dict returned by gen_curve_point for the saturation point, or None if
+#        the channel does not saturate, number of predicted thread counts)
+def search_saturation(chnl, thread_cnts, steps, options):
+    ctx = model_context(chnl.thr_info, chnl.con_acc_probs,
+                        chnl.con_noacc_probs, options.exact)
+    if len(chnl.corun_classes) != 0:
+        corun_gen.get_own_thread_cnt(chnl, thread_cnts[-1])
+    model_runner.run_steps_1_2(ctx, chnl, steps, options.debug)
+
+    memo = dict()
+    def point(thread_cnt):
+        return eval_curve_point(memo, ctx, chnl, thread_cnt, steps, options)
+
+    if options.search == "knee":
+        bandwidth = lambda t: point(t)["bandwidth"]
+        peak = search_peak(thread_cnts, bandwidth)
+        max_bw = bandwidth(thread_cnts[peak])
+        thread_cnts = thread_cnts[:peak + 1]
+        cond = lambda t: bandwidth(t) >= (1.0 - options.tolerance) * max_bw
+    else:
+        cond = lambda t: point(t)["thread_lat"] >= options.threshold
+
+    thread_cnt = search_first(thread_cnts, cond)
+    if thread_cnt is None:
+        return (None, len(memo))
+    return (memo[thread_cnt], len(memo))
+
+# Write the curve in CSV or JSON
+# Inputs:
+#       points: list of dicts returned by gen_curve_point
+#       fmt: "csv" or "json"
+#       f: the output file object
+def write_curve(points, fmt, f):
+    if fmt == "json":
+        json.dump(points, f, indent=1, sort_keys=True)
+        f.write("\n")
+        return
+
+    f.write(",".join(FIELDS) + "\n")
+    for point in points:
+        f.write(",".join([repr(point[field]) for field in FIELDS]) + "\n")
+
+if __name__ == "__main__":
+    (options, args) = latency_model.parse_machine_options(parser)
+
+    if options.filename is None:
+        print "Please specify the input file"
+        parser.print_help()
+        exit(-1)
+
+    if options.threads is None:
+        print "Please specify the numbers of threads to model"
+        parser.print_help()
+        exit(-1)
+
+    if options.steps is None:
+        print "Please specify the function version of each step"
+        parser.print_help()
+        exit(-1)
+
+    if options.issue_time is None:
+        print "Please specify the issue time of a single thread."
+        parser.print_help()
+        exit(-1)
+
+    if options.format not in ("csv", "json"):
+        print "Unknown output format:", options.format
+        parser.print_help()
+        exit(-1)
+
+    if (options.search is not None) and (options.search not in ("knee",
+                                                                 "latency")):
+        print "Unknown search mode:", options.search
+        parser.print_help()
+        exit(-1)
+
+    if (options.search == "latency") and (options.threshold is None):
+        print "Please specify the thread latency threshold"
+        parser.print_help()
+        exit(-1)
+
+    # parse the function versions
+    steps = [int(n) for n in options.steps.split(',')]
+    if len(steps) != 4:
+        print "Only four function versions are allowed"
+        parser.print_help()
+        exit(-1)
+
+    thread_cnts = parse_thread_cnts(options.threads)
+    if options.search is not None:
+        thread_cnts = sorted(set(thread_cnts))
+
+    if options.debug is True:
+        print "Options are:"
+        print "    input file: ", options.filename
+        print "    thread counts: ", thread_cnts
+        print "    reorder time: ", options.reorder
+        print "    auto-close time: ", options.timeout
+        print "    estimate service time: ", options.est_serv_time
+        print "    half conflict reordering: ", options.half_reorder
+        print "    per-sequence pricing: ", options.exact
+        print "    reuse distance buckets: ", options.buckets
+        print "    bucket mode: ", options.bucket_mode
+        print "    function versions: ", steps
+        print "    issue time: ", options.issue_time
+        print "    machine profile: ", options.machine
+        print "    line size: ", options.line_size
+        print "    output format: ", options.format
+        print "    search mode: ", options.search
+        print "    knee tolerance: ", options.tolerance
+        print "    latency threshold: ", options.threshold
+        print "    debug: ", options.debug
+
+    thr_info = thread_info()
+    thr_info.autoclose_time = options.timeout
+    thr_info.reorder_time = options.reorder
+    thr_info.est_serv_time = options.est_serv_time
+    thr_info.half_reorder = options.half_reorder
+
+    model_runner.parse_param_file(options.filename, thr_info)
+
+    # the model prints its progress; keep it only for debugging, or when the
+    # results go to a file
+    quiet = (options.output is None) and (not options.debug)
+    if options.buckets is not None:
+        for chnl in thr_info.chnls:
+            model_runner.run_quiet(quiet, dist_bucket.bucket_reuse_dists,
+                                   chnl.thr_info, options.buckets,
+                                   options.bucket_mode, options.debug)
+
+    points = []
+    if options.search is not None:
+        for chnl in thr_info.chnls:
+            (point, eval_cnt) = model_runner.run_quiet(quiet,
+                                                       search_saturation,
+                                                       chnl, thread_cnts,
+                                                       steps, options)
+            output = ("Channel " + str(chnl.chnl_id) + ": " + str(eval_cnt) +
+                      " of " + str(len(thread_cnts)) + " thread counts " +
+                      "predicted")
+            if point is None:
+                output += ", no saturation point found"
+            else:
+                points.append(point)
+            sys.stderr.write(output + "\n")
+    else:
+        results = model_runner.run_quiet(quiet,
+                                         model_runner.run_all_chnls_threads,
+                                         thr_info, thread_cnts, steps,
+                                         options.exact, options.debug)
+        for (chnl_id, hmcs) in results:
+            for (thread_cnt, hmc) in zip(thread_cnts, hmcs):
+                points.append(gen_curve_point(chnl_id, thread_cnt, hmc,
+                                              options))
+
+    if options.output is None:
+        write_curve(points, options.format, sys.stdout)
+    else:
+        f = open(options.output, "w")
+        write_curve(points, options.format, f)
+        f.close()
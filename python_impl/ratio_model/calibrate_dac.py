@@ -0,0 +1,328 @@
+#!/usr/bin/python
+
+# This script calibrates the timing options of the ratio model (the auto-close
+# time "-o", the reorder time "-r" and "--half") against measured
+# hit/miss/conflict ratios.
+#
+# The applications are described by parameter files in a profile directory
+# (see corun_matrix.py). The measurements are read from a CSV file with a
+# header line, and one measurement per line with the columns:
+#     program, threads, hit, miss, conflict
+# where program is the name of an application in the profile directory.
+#
+# Steps 1 to 3 do not depend on the timing options. They are run only once
+# for each application (steps 1 and 2) and each measured thread count (step
+# 3), and the interference patterns are reduced to a table of the inputs of
+# step 4 (see hmc_ratios_gen.gen_count_table). Only step 4 is re-evaluated for
+# each candidate, from the tables.
+#
+# Step 4 (versions 2 and 3) compares the number of accesses of a case with
+# the auto-close and reorder times divided by the estimated service time
+# "-e", so only the two frames floor(timeout / est) and floor(reorder / est)
+# matter, and the service time itself can not be calibrated from the ratios.
+# Every pair of frames between 0 and the largest number of accesses in the
+# tables, with and without "--half", is evaluated, so the result is the exact
+# minimum of the squared errors of the three ratios over all measurements.
+# For version 3 of step 4, all pairs are evaluated at once with numpy, if it
+# is available.
+#
+
+import csv
+from optparse import OptionParser
+
+import model_runner
+import hmc_ratios_gen
+
+from mem_model_types import *
+
+# numpy is only needed to evaluate version 3 of step 4 in batches
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+parser = OptionParser()
+parser.add_option("-p", "--profiles", dest="profile_dir", help="Directory of "
+                  + "the parameter files of the applications",
+                  metavar="PROFILE_DIR")
+parser.add_option("-f", "--file", dest="filename", help="Path to the CSV " +
+                  "file of measured ratios", metavar="MEASUREMENTS")
+parser.add_option("-e", "--esttime", dest="est_serv_time", help="Estimated " +
+                  "service time for memory request, in nanoseconds",
+                  metavar="EST_TIME", type="float")
+parser.add_option("-s", "--steps", dest="steps", help="The version of " +
+                  "each of the four steps; comma separate list of four " +
+                  "integers; step 4 should be version 2 or 3; " +
+                  "default 3,3,3,3", metavar="V,V,V,V", type="string",
+                  default="3,3,3,3")
+parser.add_option("--exact", dest="exact", help="Price the access " +
+                  "sequences one at a time with the Fraction tables, as the " +
+                  "original implementation does, instead of in batches; " +
+                  "slow, for double checking only", action="store_true",
+                  default=False)
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+# Read the measurements.
+# Inputs:
+#       filename: path to the CSV file
+#       names: dict: application name ==> application index
+# Return:
+#       a list of (application index, thread count, hit, miss, conflict)
+def read_measurements(filename, names):
+    meas = []
+    f = open(filename, "r")
+    for row in csv.DictReader(f):
+        if row["program"] not in names:
+            print "Unknown application in measurements:", row["program"]
+            exit(-1)
+        meas.append((names[row["program"]], int(row["threads"]),
+                     float(row["hit"]), float(row["miss"]),
+                     float(row["conflict"])))
+    f.close()
+
+    return meas
+
+# Build the model context of an application for a pair of frames. The times
+# are put in the middle of the frames, so that floor(time / est) is the frame
+# despite rounding.
+# Inputs:
+#       chnl: chnl_params object of the application
+#       close_frame, reorder_frame: the frames
+#       half: whether half reordered misses/conflicts remain
+#       exact: see model_context class
+# Return:
+#       a model_context object
+def gen_frame_ctx(chnl, close_frame, reorder_frame, half, exact):
+    chnl.thr_info.autoclose_time = (close_frame + 0.5) * options.est_serv_time
+    chnl.thr_info.reorder_time = (reorder_frame + 0.5) * options.est_serv_time
+    chnl.thr_info.half_reorder = half
+    return model_context(chnl.thr_info, chnl.con_acc_probs,
+                         chnl.con_noacc_probs, exact)
+
+# Get the squared errors of every pair of frames, by evaluating step 4 from
+# the tables one pair at a time.
+# Inputs:
+#       tables: list of the count tables, one for each measurement
+#       max_frame: the largest frame to evaluate
+#       half: whether half reordered misses/conflicts remain
+# Return:
+#       a dict: (close frame, reorder frame) ==> sum of squared errors
+def eval_frames(tables, max_frame, half):
+    errs = dict()
+    for close_frame in range(max_frame + 1):
+        for reorder_frame in range(max_frame + 1):
+            err = 0.0
+            ctxs = dict()
+            for ((app, thr_cnt, hit, miss, conf), table) in zip(meas, tables):
+                if app not in ctxs:
+                    ctxs[app] = gen_frame_ctx(profiles[app][1], close_frame,
+                                              reorder_frame, half,
+                                              options.exact)
+                ctx = ctxs[app]
+                hmc = hmc_ratios_gen.gen_hmc_count_table(table, ctx, steps[3],
+                                                         False)
+                err += ((hmc.hit - hit) ** 2 + (hmc.miss - miss) ** 2 +
+                        (hmc.conflict - conf) ** 2)
+            errs[(close_frame, reorder_frame)] = err
+
+    return errs
+
+# Same as eval_frames, for version 3 of step 4, with all pairs of frames
+# evaluated at once. The rules are the same as
+# hmc_ratios_gen.gen_hmc_v3_by_existence.
+def eval_frames_v3_batch(tables, max_frame, half):
+    # one column per entry of all tables
+    cols = [[], [], [], [], [], []]
+    for (idx, table) in enumerate(tables):
+        for ((accs, sr, sb, org), prob) in table.iteritems():
+            for (col, v) in zip(cols, (accs, sr, sb, org, prob, idx)):
+                col.append(v)
+    (accs, sr, sb, org, prob, idx) = [numpy.array(col) for col in cols]
+    sr = sr != 0
+    sb = sb != 0
+
+    # one row per pair of frames
+    (close_frame, reorder_frame) = numpy.meshgrid(range(max_frame + 1),
+                                                  range(max_frame + 1),
+                                                  indexing="ij")
+    close_frame = close_frame.reshape(-1, 1)
+    reorder_frame = reorder_frame.reshape(-1, 1)
+    closed = accs > close_frame
+    reordered = accs <= reorder_frame
+
+    shape = (close_frame.size, accs.size)
+    hit = numpy.zeros(shape)
+    miss = numpy.zeros(shape)
+    conf = numpy.zeros(shape)
+    none = (~sr) & (~sb)
+    sr_only = sr & (~sb)
+    sb_only = (~sr) & sb
+    both = sr & sb
+    if half:
+        reorder_hit = 0.5
+    else:
+        reorder_hit = 1.0
+
+    # originally a hit
+    o1 = org == 1
+    hit += o1 & none & ((~closed) | reordered)
+    miss += o1 & none & closed & (~reordered)
+    hit += (o1 & (sb_only | both) & reordered) * reorder_hit
+    conf += (o1 & (sb_only | both) & reordered) * (1 - reorder_hit)
+    conf += (o1 & sb_only & (~reordered)) * 0.5
+    miss += (o1 & sb_only & (~reordered)) * 0.5
+    hit += (o1 & both & (~reordered)) * 0.5
+    conf += (o1 & both & (~reordered)) * 0.5
+    # originally a miss or a conflict
+    o23 = (org == 2) | (org == 3)
+    miss += (org == 3) & none
+    miss += (org == 2) & none & closed
+    conf += (org == 2) & none & (~closed)
+    if half:
+        conf += (o23 & sb_only) * 0.5
+        miss += (o23 & sb_only) * 0.5
+    else:
+        conf += o23 & sb_only
+    hit += (o23 & both) * 0.5
+    conf += (o23 & both) * 0.5
+    # only same row accesses, always a hit
+    hit += sr_only
+
+    # sum the entries of each measurement
+    select = numpy.zeros((accs.size, len(tables)))
+    select[numpy.arange(accs.size), idx] = 1.0
+    measured = numpy.array([m[2:] for m in meas])
+    err = numpy.zeros(close_frame.size)
+    for (i, ratio) in enumerate((hit, miss, conf)):
+        diff = (ratio * prob).dot(select) - measured[:, i]
+        err += (diff * diff).sum(axis=1)
+
+    errs = dict()
+    for (i, e) in enumerate(err):
+        errs[(int(close_frame[i, 0]), int(reorder_frame[i, 0]))] = float(e)
+    return errs
+
+# Run steps 1 to 3 once for each application and each measured thread count,
+# and reduce the interference patterns to count tables.
+# Return:
+#       (list of the count tables, one for each measurement, number of step 3
+#        runs)
+def gen_tables():
+    ctxs = dict()
+    table_cache = dict()
+    tables = []
+    for (app, thr_cnt, hit, miss, conf) in meas:
+        chnl = profiles[app][1]
+        if app not in ctxs:
+            ctxs[app] = model_context(chnl.thr_info, chnl.con_acc_probs,
+                                      chnl.con_noacc_probs, options.exact)
+            model_runner.run_steps_1_2(ctxs[app], chnl, steps, options.debug)
+        if (app, thr_cnt) not in table_cache:
+            groups = model_runner.run_step_3(ctxs[app], chnl, thr_cnt, steps,
+                                             options.debug)
+            table_cache[(app, thr_cnt)] = hmc_ratios_gen.gen_count_table(
+                groups, ctxs[app], steps[3] == 3)
+        tables.append(table_cache[(app, thr_cnt)])
+
+    return (tables, len(table_cache))
+
+# Find the pair of frames, with and without "--half", with the smallest
+# squared error.
+# Inputs:
+#       tables: list of the count tables, one for each measurement
+#       max_frame: the largest frame to evaluate
+# Return:
+#       (sum of squared errors, (close frame, reorder frame), half)
+def search_frames(tables, max_frame):
+    best = None
+    for half in (False, True):
+        if (steps[3] == 3) and (numpy is not None):
+            errs = eval_frames_v3_batch(tables, max_frame, half)
+        else:
+            errs = eval_frames(tables, max_frame, half)
+        for (frames, err) in sorted(errs.iteritems()):
+            if (best is None) or (err < best[0]):
+                best = (err, frames, half)
+
+    return best
+
+if __name__ == "__main__":
+    (options, args) = parser.parse_args()
+
+    if options.profile_dir is None:
+        print "Please specify the profile directory"
+        parser.print_help()
+        exit(-1)
+
+    if options.filename is None:
+        print "Please specify the measurement file"
+        parser.print_help()
+        exit(-1)
+
+    if (options.est_serv_time is None) or (options.est_serv_time <= 0):
+        print "Please specify a positive estimated service time"
+        parser.print_help()
+        exit(-1)
+
+    # parse the function versions
+    steps = [int(n) for n in options.steps.split(',')]
+    if len(steps) != 4:
+        print "Only four function versions are allowed"
+        parser.print_help()
+        exit(-1)
+    if steps[3] not in (2, 3):
+        print "Only version 2 and 3 of step 4 are supported"
+        exit(62)
+
+    if options.debug is True:
+        print "Options are:"
+        print "    profile directory: ", options.profile_dir
+        print "    measurement file: ", options.filename
+        print "    estimate service time: ", options.est_serv_time
+        print "    per-sequence pricing: ", options.exact
+        print "    function versions: ", steps
+        print "    debug: ", options.debug
+
+    thr_info = thread_info()
+    thr_info.est_serv_time = options.est_serv_time
+
+    profiles = model_runner.load_profiles(options.profile_dir, thr_info)
+    names = dict()
+    for (idx, (name, chnl)) in enumerate(profiles):
+        names[name] = idx
+    meas = read_measurements(options.filename, names)
+    if len(meas) == 0:
+        print "No measurements in", options.filename
+        exit(-1)
+
+    # the model prints its progress; keep it only for debugging
+    (tables, step3_cnt) = model_runner.run_quiet(not options.debug,
+                                                 gen_tables)
+
+    # frames beyond the largest number of accesses give the same results
+    max_frame = max([key[0] for table in tables for key in table])
+
+    best = model_runner.run_quiet(not options.debug, search_frames, tables,
+                                  max_frame)
+
+    (err, (close_frame, reorder_frame), half) = best
+    est = options.est_serv_time
+    print "Measurements:", len(meas), ", step 3 runs:", step3_cnt
+    print "RMS error of the ratios:", (err / (3 * len(meas))) ** 0.5
+    print "Auto-close frame:", close_frame, ", timeout in [",
+    print close_frame * est, ",", (close_frame + 1) * est, ")"
+    print "Reorder frame:", reorder_frame, ", reorder time in [",
+    print reorder_frame * est, ",", (reorder_frame + 1) * est, ")"
+    print "Half reordering:", half
+    if close_frame == max_frame:
+        print "(auto-close never happens for the measured thread counts;",
+        print "any longer timeout gives the same ratios)"
+    if reorder_frame == max_frame:
+        print "(every access is reorderable for the measured thread counts;",
+        print "any longer reorder time gives the same ratios)"
+    output = ("Options: -o " + repr((close_frame + 0.5) * est) + " -r " +
+              repr((reorder_frame + 0.5) * est) + " -e " + repr(est))
+    if half:
+        output += " --half"
+    print output
@@ -0,0 +1,256 @@
+# This file contains functions for modelling middle threads that belong to
+# different classes of co-runners, e.g., when the target thread shares the
+# channel with threads of other services. Each class has its own parameters
+# (see corun_class), and the middle threads that are not in any class are the
+# same as the target thread.
+#
+# Steps 1 and 2 are run for one thread of every class, with the parameters of
+# that class. Versions 2 and 3 of step 4 only use the total number of accesses
+# to the target channel, to the target row and to the target bank (but
+# different rows) of all middle threads. Therefore, instead of combining the
+# access sequences of all threads (step 3), the access sequences and cases of
+# one thread are reduced to a distribution of these three numbers. The
+# distribution of all middle threads is the convolution of the distributions
+# of every class, each convolved with itself as many times as there are
+# threads in that class. The size of the result grows with the total number of
+# accesses, instead of exponentially with the number of threads.
+# Version 3 of step 4 only checks whether any access to the target row or to 
+# the target bank exists, so for it, the two numbers are kept as 0 or 1, and
+# the size of the result is linear to the total number of accesses.
+#
+
+from mem_model_types import *
+import acc_gen
+import inter_pat_gen
+
+# Get the number of middle threads that are the same as the target thread.
+# Inputs:
+#       chnl: chnl_params object of the target channel
+#       thread_cnt: total number of threads, including the target thread
+# Return:
+#       the number of middle threads not in any co-runner class
+def get_own_thread_cnt(chnl, thread_cnt):
+    own_cnt = thread_cnt - 1
+    for cls in chnl.corun_classes:
+        own_cnt -= cls.thr_cnt
+
+    if own_cnt < 0:
+        print "Co-runner classes have more threads than", thread_cnt - 1,
+        print "middle threads"
+        exit(18)
+
+    return own_cnt
+
+# Generate the access sequences of one thread for a list of channel reuse
+# distances of the target thread (step 1).
+# Inputs:
+#       ch_dists: chnl_reuse_dist_info objects of the target thread
+#       params: chnl_params object of the thread, e.g., of a co-runner class
+#       thr_ctx: model_context object of the thread
+#       version: version of step 1
+#       debug: whether enable debug output or not
+# Return:
+#       a dict: channel reuse distance ==> list of accs_one_thread objects
+def gen_thread_acc_seqs(ch_dists, params, thr_ctx, version, debug):
+    if (version == 1) or (version == 2):
+        gen_func = acc_gen.gen_full_acc_seq_1thr
+    elif version == 3:
+        gen_func = acc_gen.gen_acc_seq_1thr_v3
+    elif version == 4:
+        gen_func = acc_gen.gen_acc_seq_1thr_v4
+    else:
+        print "Unknown step 1 function version:", version
+        exit(61)
+
+    acc_seqs = dict()
+    for ch_dist in ch_dists:
+        acc_seqs[ch_dist.acc_dist] = gen_func(thr_ctx, ch_dist,
+                                              params.con_acc_probs,
+                                              params.con_noacc_probs,
+                                              params.min_con_acc,
+                                              params.min_con_noacc, debug)
+        output = ("Total number of access sequences of channel reuse " +
+                  "distance " + str(ch_dist.acc_dist) + " of co-runner " +
+                  "is " + str(len(acc_seqs[ch_dist.acc_dist])))
+        print output
+
+    return acc_seqs
+
+# Generate the cases of access states of every access sequence generated by
+# gen_thread_acc_seqs (step 2).
+# Inputs:
+#       acc_seqs: the dict returned by gen_thread_acc_seqs
+#       thr_ctx: model_context object of the thread
+#       version: version of step 2
+#       debug: whether enable debug output or not
+def gen_thread_acc_seq_stats(acc_seqs, thr_ctx, version, debug):
+    if (version == 1) or (version == 2):
+        stats_func = inter_pat_gen.gen_acc_seq_stats
+    elif version == 3:
+        stats_func = inter_pat_gen.gen_acc_seq_stats_v3
+    else:
+        print "Unknown step 2 function version:", version
+        exit(61)
+
+    for seqs in acc_seqs.itervalues():
+        for acc_seq in seqs:
+            acc_seq.cases = stats_func(acc_seq, thr_ctx, debug)
+
+            # sanity check
+            sum_prob = 0.0
+            for c in acc_seq.cases:
+                sum_prob += c.prob
+            if sum_prob > 1.1 or sum_prob < 0.9:
+                print "3 Cases sum probability is not 1, but", str(sum_prob)
+                exit(5)
+
+    return
+
+# Generate the interference patterns of all channel reuse distances from the
+# distributions of the co-runner classes (replaces step 3). 
+# Inputs:
+#       ctx: model_context object of the target thread; the access sequences
+#            of the target thread have their cases generated
+#       chnl: chnl_params object of the target channel; the access sequences
+#             of every co-runner class have their cases generated
+#       thread_cnt: total number of threads, including the target thread
+#       by_existence: only keep whether target row and target bank accesses
+#                     exist (for version 3 of step 4)
+#       debug: whether enable debug output or not
+# Return:
+#       groups of interference patterns, one group for each channel reuse
+#       distance, same as gen_acc_seq_v3_full_comb
+def gen_inter_pat_groups(ctx, chnl, thread_cnt, by_existence, debug):
+    own_cnt = get_own_thread_cnt(chnl, thread_cnt)
+
+    group_dists = []
+    for ch_dist in ctx.chnl_reuse_dists:
+        dists = [(gen_acc_dist(ch_dist.acc_seqs, by_existence), own_cnt)]
+        for cls in chnl.corun_classes:
+            dists.append((gen_acc_dist(cls.acc_seqs[ch_dist.acc_dist],
+                                       by_existence), cls.thr_cnt))
+        group_dists.append(dists)
+
+    return conv_inter_pat_groups(ctx, group_dists, thread_cnt, by_existence,
+                                 debug)
+
+# Convolve the distributions of the middle threads into interference patterns.
+# Each pattern represents one value of (total_accs, total_sr, total_sb), and 
+# has only one access sequence with one case, which hold these totals. The 
+# patterns can be processed by version 2 and 3 of step 4.
+# Inputs:
+#       ctx: model_context object of the target thread
+#       group_dists: one element for each channel reuse distance of ctx; each
+#                    element is a list of (distribution, thread count) tuples,
+#                    the distribution is for one thread (see gen_acc_dist)
+#       thread_cnt, by_existence, debug: see gen_inter_pat_groups
+# Return:
+#       see gen_inter_pat_groups
+def conv_inter_pat_groups(ctx, group_dists, thread_cnt, by_existence, debug):
+    inter_pat_groups = []
+    sum_prob = 0.0
+    for (ch_dist, dists) in zip(ctx.chnl_reuse_dists, group_dists):
+        # distribution of all middle threads
+        all_dist = {(0, 0, 0): 1.0}
+        for (dist, thr_cnt) in dists:
+            all_dist = conv_acc_dists(all_dist,
+                                      pow_acc_dist(dist, thr_cnt, 
+                                                   by_existence),
+                                      by_existence)
+
+        inter_pats = []
+        for counts in sorted(all_dist):
+            inter_pat = gen_total_inter_pat(ch_dist, thread_cnt, counts,
+                                            all_dist[counts])
+            inter_pats.append(inter_pat)
+            if debug:
+                print inter_pat_gen.log_full_inter_pat(inter_pat)
+        inter_pat_groups.append(inter_pats)
+
+        output = ("Channel-reuse-distance " + str(ch_dist.acc_dist) +
+                  " has interference patterns: " + str(len(inter_pats)))
+        print output
+        # sanity check
+        sum_prob += inter_pat_gen.check_full_patterns_sum(inter_pats)
+
+    # sanity check
+    if sum_prob > 1.1 or sum_prob < 0.9:
+        output = ("4 Error: probability sum of all patterns is not 1.0, " +
+                  "but," + str(sum_prob))
+        print output
+        exit(1)
+
+    return inter_pat_groups
+
+# Reduce the access sequences (and their cases) of one thread to a
+# distribution.
+# Inputs:
+#       acc_seqs: a list of accs_one_thread objects with cases generated
+#       by_existence: see gen_inter_pat_groups
+# Return:
+#       a dict: (total_accs, total_sr, total_sb) ==> probability. Values with
+#       0 probability are left out.
+def gen_acc_dist(acc_seqs, by_existence):
+    dist = dict()
+    for acc_seq in acc_seqs:
+        for case in acc_seq.cases:
+            prob = acc_seq.prob * case.prob
+            if prob == 0:
+                continue
+            counts = (case.total_accs, case.total_sr, case.total_sb)
+            if by_existence:
+                counts = (counts[0], min(counts[1], 1), min(counts[2], 1))
+            dist[counts] = dist.get(counts, 0.0) + prob
+
+    return dist
+
+# Convolve two distributions generated by gen_acc_dist, i.e., get the
+# distribution of the totals of two independent groups of threads.
+def conv_acc_dists(dist1, dist2, by_existence):
+    dist = dict()
+    for ((accs1, sr1, sb1), prob1) in dist1.iteritems():
+        for ((accs2, sr2, sb2), prob2) in dist2.iteritems():
+            if by_existence:
+                counts = (accs1 + accs2, sr1 | sr2, sb1 | sb2)
+            else:
+                counts = (accs1 + accs2, sr1 + sr2, sb1 + sb2)
+            dist[counts] = dist.get(counts, 0.0) + prob1 * prob2
+
+    return dist
+
+# Get the distribution of the totals of "thr_cnt" independent threads with the
+# same distribution "dist". The threads are added one by one, since "dist" is
+# much smaller than the result.
+def pow_acc_dist(dist, thr_cnt, by_existence):
+    result = {(0, 0, 0): 1.0}
+    for i in range(thr_cnt):
+        result = conv_acc_dists(result, dist, by_existence)
+
+    return result
+
+# Generate the interference pattern of one value of the totals
+# Inputs:
+#       ch_dist: the chnl_reuse_dist_info object of the target thread
+#       thread_cnt: total number of threads, including the target thread
+#       counts: (total_accs, total_sr, total_sb)
+#       prob: the probability of these totals
+# Return:
+#       a full_interference_pattern object
+def gen_total_inter_pat(ch_dist, thread_cnt, counts, prob):
+    case = acc_seq_case()
+    (case.total_accs, case.total_sr, case.total_sb) = counts
+    case.prob = 1.0
+
+    acc_seq = accs_one_thread()
+    acc_seq.total_accs = case.total_accs
+    acc_seq.prob = prob
+    acc_seq.cases = [case]
+
+    inter_pat = full_interference_pattern()
+    inter_pat.chnl_reuse_dist = ch_dist.acc_dist
+    inter_pat.prob = ch_dist.prob * prob
+    inter_pat.thread_cnt = thread_cnt
+    inter_pat.threads = [acc_seq]
+    inter_pat.total_accs = case.total_accs
+
+    return inter_pat
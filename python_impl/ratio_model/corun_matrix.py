@@ -0,0 +1,195 @@
+#!/usr/bin/python
+
+# This script predicts the hit/miss/conflict ratios, and optionally the memory
+# latencies, of every combination of co-running applications. Each application
+# is described by one parameter file (see run_model.py) in a profile directory;
+# the name of the application is the name of the file without its extension.
+#
+# For a combination, every application runs the same number of threads, and
+# each application of the combination is predicted as the target thread, with
+# the threads of the other applications as co-runner classes (see
+# corun_gen.py). The access sequences of one thread of every application are
+# generated (steps 1 and 2) and reduced to distributions only once, for the
+# channel reuse distances of all applications. Each combination then only runs
+# the convolution and step 4, in parallel.
+#
+# The results are written as comma separated lines:
+#     target,co-runners,threads,hit,miss,conflict[,rd_lat,wr_lat,final_lat]
+# where co-runners are all applications of the combination joined by "+".
+#
+# Only the first channel of each parameter file is used.
+#
+
+import os
+import sys
+import itertools
+import multiprocessing
+from optparse import OptionParser
+
+import model_runner
+
+from mem_model_types import *
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                             "latency_model"))
+import latency_model
+
+parser = OptionParser()
+parser.add_option("-p", "--profiles", dest="profile_dir", help="Directory of "
+                  + "the parameter files of the applications",
+                  metavar="PROFILE_DIR")
+parser.add_option("-t", "--t", dest="thread_cnt", help="Number of threads of "
+                  + "each application; default 1", metavar="THREAD_COUNT",
+                  type="int", default=1)
+parser.add_option("-n", "--apps", dest="app_cnt", help="Number of " +
+                  "applications in a combination; default 2",
+                  metavar="APP_COUNT", type="int", default=2)
+parser.add_option("-o", "--timeout", dest="timeout", help="Time in nanoseconds "
+                  + "before a bank auto-close; 0 means no auto-close",
+                  metavar="TIEMOUT", type="float", default=0.0)
+parser.add_option("-r", "--reorder", dest="reorder", help="Maximum timespan " +
+                  "allowed for reordering: 0 means no reordering",
+                  metavar="REORDER", type="float", default=0.0)
+parser.add_option("-e", "--esttime", dest="est_serv_time", help="Estimated " +
+                  "service time for memory request, in nanoseconds",
+                  metavar="EST_TIME", type="float", default=0.0)
+parser.add_option("--half", dest="half_reorder", help="Whether " +
+                  "half reordered misses/conflicts remains misses/conflicts ",
+                  action="store_true", default=False)
+parser.add_option("-s", "--steps", dest="steps", help="The version of " +
+                  "each of the four steps; comma separate list of four " +
+                  "integers; step 3 and 4 should be version 2 or 3; " +
+                  "default 3,3,3,3", metavar="V,V,V,V", type="string",
+                  default="3,3,3,3")
+parser.add_option("--exact", dest="exact", help="Price the access " +
+                  "sequences one at a time with the Fraction tables, as the " +
+                  "original implementation does, instead of in batches; " +
+                  "slow, for double checking only", action="store_true",
+                  default=False)
+parser.add_option("-i", "--issue_time", dest="issue_time", help="Memory " +
+                  "issue time for a single thread, in nanoseconds; if given, "
+                  + "the latencies are also computed with the timing " +
+                  "constants below", metavar="ISSUE_TIME", type="float")
+# timing constants of the latency model, same as gen_latencies.py
+latency_model.add_machine_options(parser)
+parser.add_option("-j", "--jobs", dest="jobs", help="Number of processes; " +
+                  "default is the number of CPUs", metavar="JOBS", type="int",
+                  default=multiprocessing.cpu_count())
+parser.add_option("-w", "--output", dest="output", help="Path to the output " +
+                  "file; default is the standard output", metavar="OUTPUT")
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+# Predict the target application of one combination. The profiles, contexts
+# and distributions are read from the global variables of this script, which
+# are shared with the worker processes.
+# Input:
+#       job: (index of the target application, tuple of the indices of all
+#            applications of the combination)
+# Return:
+#       a line of the results
+def eval_corun(job):
+    (target, combo) = job
+    thread_cnt = len(combo) * options.thread_cnt
+
+    thr_cnts = dict()
+    for app in combo:
+        thr_cnts[app] = thr_cnts.get(app, 0) + options.thread_cnt
+    # the model prints its progress; keep it only for debugging, since the
+    # workers would interleave it with the results
+    hmc = model_runner.run_quiet(not options.debug, model_runner.run_corun,
+                                 target, thr_cnts, profile_ctxs, profile_dists,
+                                 steps, options.debug)
+
+    fields = [profiles[target][0],
+              "+".join([profiles[app][0] for app in combo]),
+              str(thread_cnt), repr(hmc.hit), repr(hmc.miss),
+              repr(hmc.conflict)]
+    if options.issue_time is not None:
+        result = latency_model.compute_machine_latency(hmc.hit, hmc.miss,
+                                                       hmc.conflict,
+                                                       options.issue_time,
+                                                       thread_cnt, 0.0,
+                                                       options, options.debug)
+        fields += [repr(result["rd_lat"]), repr(result["wr_lat"]),
+                   repr(result["final_lat"])]
+
+    return ",".join(fields)
+
+if __name__ == "__main__":
+    (options, args) = latency_model.parse_machine_options(parser)
+
+    if options.profile_dir is None:
+        print "Please specify the profile directory"
+        parser.print_help()
+        exit(-1)
+
+    # parse the function versions
+    steps = [int(n) for n in options.steps.split(',')]
+    if len(steps) != 4:
+        print "Only four function versions are allowed"
+        parser.print_help()
+        exit(-1)
+    if (steps[2] not in (2, 3)) or (steps[3] not in (2, 3)):
+        print "Only version 2 and 3 of step 3 and 4 are supported"
+        exit(62)
+
+    if options.debug is True:
+        print "Options are:"
+        print "    profile directory: ", options.profile_dir
+        print "    threads per application: ", options.thread_cnt
+        print "    applications per combination: ", options.app_cnt
+        print "    reorder time: ", options.reorder
+        print "    auto-close time: ", options.timeout
+        print "    estimate service time: ", options.est_serv_time
+        print "    half conflict reordering: ", options.half_reorder
+        print "    per-sequence pricing: ", options.exact
+        print "    issue time: ", options.issue_time
+        print "    machine profile: ", options.machine
+        print "    processes: ", options.jobs
+        print "    function versions: ", steps
+        print "    debug: ", options.debug
+
+    thr_info = thread_info()
+    thr_info.autoclose_time = options.timeout
+    thr_info.reorder_time = options.reorder
+    thr_info.est_serv_time = options.est_serv_time
+    thr_info.half_reorder = options.half_reorder
+
+    profiles = model_runner.load_profiles(options.profile_dir, thr_info)
+    if len(profiles) == 0:
+        print "No parameter files in", options.profile_dir
+        exit(-1)
+    (profile_ctxs, profile_dists) = model_runner.run_quiet(
+        not options.debug, model_runner.gen_profile_dists, profiles, steps,
+        options.exact, options.debug)
+
+    # every application of every combination is a target once
+    jobs = []
+    for combo in itertools.combinations_with_replacement(range(len(profiles)),
+                                                         options.app_cnt):
+        for target in sorted(set(combo)):
+            jobs.append((target, combo))
+
+    # the worker processes are forked after the distributions are generated
+    if options.jobs > 1:
+        pool = multiprocessing.Pool(options.jobs)
+        lines = pool.map(eval_corun, jobs)
+        pool.close()
+        pool.join()
+    else:
+        lines = [eval_corun(job) for job in jobs]
+
+    header = "target,co-runners,threads,hit,miss,conflict"
+    if options.issue_time is not None:
+        header += ",rd_lat,wr_lat,final_lat"
+    if options.output is None:
+        print header
+        for line in lines:
+            print line
+    else:
+        f = open(options.output, "w")
+        f.write(header + "\n")
+        for line in lines:
+            f.write(line + "\n")
+        f.close()
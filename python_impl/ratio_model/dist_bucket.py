@@ -0,0 +1,180 @@
+# This file contains functions for merging the channel reuse distances of a
+# thread into a smaller number of buckets before running the model. Every
+# channel reuse distance (every "a:" line) is processed as one group by all
+# four steps, so large profiles with hundreds of distances are slow. After
+# merging, the number of groups is the number of buckets chosen by the user.
+#
+# Each bucket is represented by its most probable distance. The probability of
+# a bucket is the sum of the probabilities of its distances, and its
+# hit/miss/conflict probabilities are the probability-weighted averages of
+# those of its distances.
+#
+# There are two ways to choose the buckets:
+# 1. log: the distances are split into buckets of geometrically growing
+#    widths, i.e., equal widths in log scale.
+# 2. error: the (sorted) distances are split into contiguous buckets that
+#    minimize the error bound below.
+#
+# Error bound: for a given distance, the HMC ratios of a group are linear in
+# its hit/miss/conflict probabilities, and each ratio is between 0 and 1.
+# Therefore, moving the probability of a distance to the representative of
+# its bucket changes each of the final hit, miss and conflict ratios by at
+# most that probability. The sum of the probabilities of all non-
+# representative distances is a bound on the error of each final ratio. This
+# bound is exact for version 3 of step 1. The other versions also use the set
+# of distances to generate the accesses of the middle threads, which is not
+# covered by the bound.
+#
+
+import math
+
+from mem_model_types import *
+
+# Merge the channel reuse distances of a thread into buckets.
+# Inputs:
+#       thr_info: see thread_info class; its chnl_reuse_dists are replaced by
+#                 one chnl_reuse_dist_info object per bucket
+#       bucket_cnt: the maximum number of buckets (groups) to keep
+#       mode: "log" or "error", see the comments at the beginning of this file
+#       debug: whether enable debug output or not
+# Return:
+#       the error bound of each of the final hit, miss and conflict ratios
+def bucket_reuse_dists(thr_info, bucket_cnt, mode, debug):
+    if bucket_cnt < 1:
+        print "Number of buckets should be at least 1, but is", bucket_cnt
+        exit(17)
+
+    dists = sorted(thr_info.chnl_reuse_dists, key=lambda d: d.acc_dist)
+    if len(dists) <= bucket_cnt: # nothing to merge
+        return 0.0
+
+    if mode == "log":
+        buckets = gen_log_buckets(dists, bucket_cnt)
+    elif mode == "error":
+        buckets = gen_error_buckets(dists, bucket_cnt)
+    else:
+        print "Unknown bucket mode:", mode
+        exit(17)
+
+    thr_info.chnl_reuse_dists = [merge_bucket(b) for b in buckets]
+    bound = bucket_error_bound(buckets)
+
+    if debug:
+        for b in buckets:
+            print "Bucket", [d.acc_dist for d in b], "==>",
+            print merge_bucket(b).acc_dist
+
+    return bound
+
+# Split sorted distances into at most "bucket_cnt" buckets of equal widths in
+# log scale. Empty buckets are dropped.
+# Inputs:
+#       dists: chnl_reuse_dist_info objects sorted by distance
+#       bucket_cnt: number of buckets
+# Return:
+#       a list of buckets, each bucket is a list of chnl_reuse_dist_info
+def gen_log_buckets(dists, bucket_cnt):
+    min_dist = dists[0].acc_dist
+    max_dist = dists[-1].acc_dist
+    span = math.log(float(max_dist) / min_dist)
+    if span == 0.0: # only one distance
+        return [dists]
+
+    buckets = [[] for i in range(bucket_cnt)]
+    for d in dists:
+        idx = int(bucket_cnt * math.log(float(d.acc_dist) / min_dist) / span)
+        buckets[min(idx, bucket_cnt - 1)].append(d)
+
+    return [b for b in buckets if len(b) != 0]
+
+# Split sorted distances into at most "bucket_cnt" contiguous buckets that
+# minimize the error bound (see bucket_error_bound), by dynamic programming.
+# Inputs and return value are the same as gen_log_buckets.
+def gen_error_buckets(dists, bucket_cnt):
+    n = len(dists)
+
+    # cost[i][j]: error bound of a bucket with distances i to j
+    cost = [[0.0] * n for i in range(n)]
+    for i in range(n):
+        sum_prob = 0.0
+        max_prob = 0.0
+        for j in range(i, n):
+            sum_prob += dists[j].prob
+            max_prob = max(max_prob, dists[j].prob)
+            cost[i][j] = sum_prob - max_prob
+
+    # best[k][j]: minimum error bound of putting distances 0 to j into k+1
+    # buckets; start[k][j]: first distance of the last of these buckets
+    best = [[0.0] * n for k in range(bucket_cnt)]
+    start = [[0] * n for k in range(bucket_cnt)]
+    for j in range(n):
+        best[0][j] = cost[0][j]
+    for k in range(1, bucket_cnt):
+        for j in range(k, n):
+            best[k][j] = best[k-1][j-1] + cost[j][j]
+            start[k][j] = j
+            for i in range(k, j):
+                c = best[k-1][i-1] + cost[i][j]
+                if c < best[k][j]:
+                    best[k][j] = c
+                    start[k][j] = i
+
+    # walk back through the chosen buckets
+    buckets = []
+    j = n - 1
+    for k in range(bucket_cnt - 1, -1, -1):
+        i = start[k][j]
+        buckets.append(dists[i:j+1])
+        j = i - 1
+    buckets.reverse()
+
+    return buckets
+
+# Merge a bucket of channel reuse distances into one channel reuse distance.
+# Input:
+#       bucket: a list of chnl_reuse_dist_info objects
+# Return:
+#       a chnl_reuse_dist_info object
+def merge_bucket(bucket):
+    merged = chnl_reuse_dist_info()
+    merged.acc_dist = get_bucket_rep(bucket).acc_dist
+    for d in bucket:
+        merged.prob += d.prob
+    if merged.prob == 0.0:
+        return merged
+
+    for d in bucket:
+        merged.hit_prob += d.prob * d.hit_prob
+        merged.miss_prob += d.prob * d.miss_prob
+        merged.conf_prob += d.prob * d.conf_prob
+    merged.hit_prob /= merged.prob
+    merged.miss_prob /= merged.prob
+    merged.conf_prob /= merged.prob
+
+    return merged
+
+# The representative of a bucket: its most probable distance
+def get_bucket_rep(bucket):
+    rep = bucket[0]
+    for d in bucket:
+        if d.prob > rep.prob:
+            rep = d
+    return rep
+
+# Compute the error bound of the final hit, miss and conflict ratios after
+# merging. See the comments at the beginning of this file.
+# Input:
+#       buckets: a list of buckets, each a list of chnl_reuse_dist_info
+# Return:
+#       the error bound
+def bucket_error_bound(buckets):
+    bound = 0.0
+    for b in buckets:
+        rep = get_bucket_rep(b)
+        for d in b:
+            if d is not rep:
+                # hit/miss/conflict probabilities should sum up to 1, but
+                # do not trust the input
+                bound += d.prob * max(1.0, d.hit_prob + d.miss_prob +
+                                      d.conf_prob)
+    return bound
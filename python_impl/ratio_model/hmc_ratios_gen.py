@@ -27,49 +27,46 @@ import inter_pat_gen
 # accesses reordering are consider
 # Inputs:
 #       full_inter_pat: a full interference pattern
-#       thr_info: see thread_info class for information
+#       ctx: see model_context class for information
 # Return:
 #       an object of class hmc_ratios
-def gen_hmc_full_inter_pat(inter_pat, thr_info):
+def gen_hmc_full_inter_pat(inter_pat, ctx):
 
     hmc = hmc_ratios()
     prob = inter_pat.prob
 
     # find the corresponding channel reuse distance information
-    found = False
-    for chnl_dist in thr_info.chnl_reuse_dists:
-        if chnl_dist.acc_dist == inter_pat.chnl_reuse_dist:
-            found = True
-            break
-    if not found:
+    if inter_pat.chnl_reuse_dist not in ctx.reuse_dist_index:
         print "Weired: reuse distance not found"
         exit(3)
+    (dist_prob, hit_prob, miss_prob, conf_prob) = \
+        ctx.reuse_dist_index[inter_pat.chnl_reuse_dist]
     # here I treat the previous access from the target thread as the 
     # same as any middle threads. Now lets generate the cases and 
     # probabilities for the three new cases
     # previous access is to the same row
     org_acc_type = 1 # same row, a hit originally
-    inter_pat.prob = prob * chnl_dist.hit_prob;
+    inter_pat.prob = prob * hit_prob;
     if inter_pat.prob != 0:
-        hmc1 = gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info,
+        hmc1 = gen_hmc_full_inter_pat_w_org_acc(inter_pat, ctx,
                                                         org_acc_type)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to the same bank but different row
     org_acc_type = 2 # same row different bank, a conflict originally
-    inter_pat.prob = prob * chnl_dist.conf_prob;
+    inter_pat.prob = prob * conf_prob;
     if inter_pat.prob != 0:
-        hmc1 = gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info,
+        hmc1 = gen_hmc_full_inter_pat_w_org_acc(inter_pat, ctx,
                                                 org_acc_type)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to a different bank
     org_acc_type = 3 # different bank, a miss originally
-    inter_pat.prob = prob * chnl_dist.miss_prob;
+    inter_pat.prob = prob * miss_prob;
     if inter_pat.prob != 0:
-        hmc1 = gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info,
+        hmc1 = gen_hmc_full_inter_pat_w_org_acc(inter_pat, ctx,
                                                 org_acc_type)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
@@ -87,7 +84,7 @@ def gen_hmc_full_inter_pat(inter_pat, thr_info):
 #                     different row 3) different bank
 # Return:
 #       an object of class hmc_ratios
-def gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info, org_acc_type):
+def gen_hmc_full_inter_pat_w_org_acc(inter_pat, ctx, org_acc_type):
 
     #output = inter_pat_gen.log_full_inter_pat(inter_pat)
     #print "Processing: org_type", org_acc_type, ",",  output
@@ -136,8 +133,8 @@ def gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info, org_acc_type):
         if (last_same_row < last_same_bank): # last access is same row
             case = 1 # similar to the process of case 1
         else: # last access is same bank
-            if (last_same_row * thr_info.est_serv_time <= 
-                thr_info.reorder_time):
+            if (last_same_row * ctx.est_serv_time <= 
+                ctx.reorder_time):
                 # same row access and the target access are reorder-able
                 acc = 1 # hit
                 reordered = True
@@ -156,10 +153,10 @@ def gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info, org_acc_type):
         acc = 2 # miss
     
     if case == 1: # process for case 1
-        if (last_same_row * thr_info.est_serv_time > 
-            thr_info.autoclose_time): #auto-closed
-            if (last_same_row * thr_info.est_serv_time <= 
-                thr_info.reorder_time): #reordered
+        if (last_same_row * ctx.est_serv_time > 
+            ctx.autoclose_time): #auto-closed
+            if (last_same_row * ctx.est_serv_time <= 
+                ctx.reorder_time): #reordered
                 reordered = True
                 acc = 1 # hit
             else:
@@ -167,8 +164,8 @@ def gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info, org_acc_type):
         else: #not auto-closed
             acc = 1 # hit
     elif case == 3: # process for case 3
-        if (last_same_row * thr_info.est_serv_time > 
-            thr_info.autoclose_time): #auto-closed
+        if (last_same_row * ctx.est_serv_time > 
+            ctx.autoclose_time): #auto-closed
             acc = 2 # miss
         else:
             acc = 3 # conflict
@@ -186,7 +183,7 @@ def gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info, org_acc_type):
         hmc.conflict = inter_pat.prob
 
     # if half reordered 
-    if thr_info.half_reorder and reordered:
+    if ctx.half_reorder and reordered:
         hmc.conflict += hmc.hit / 2
         hmc.hit /= 2
 
@@ -199,11 +196,11 @@ def gen_hmc_full_inter_pat_w_org_acc(inter_pat, thr_info, org_acc_type):
 #      inter_pat_groups: Essentially a two-D array for interference patterns.
 #                        Each group has the interference pattern for one 
 #                        channel reuse distance.
-#      thr_info: thread_info object
+#      ctx: model_context object
 #      debug: debug output control
 # Return:
 #      hmc_ratios object
-def gen_hmc_v2_all_inter_pat_group(inter_pat_groups, thr_info, debug):
+def gen_hmc_v2_all_inter_pat_group(inter_pat_groups, ctx, debug):
     hmc = hmc_ratios()
     hmc.hit = 0.0
     hmc.miss = 0.0
@@ -212,10 +209,10 @@ def gen_hmc_v2_all_inter_pat_group(inter_pat_groups, thr_info, debug):
     for inter_pats in inter_pat_groups:
         for inter_pat in inter_pats:
             # process this interference pattern
-            cases = gen_cases_inter_pat(inter_pat, thr_info, debug)
+            cases = gen_cases_inter_pat(inter_pat, ctx, debug)
             # generate HMC ratio for each case
             for case in cases:
-                hmc1 = gen_hmc_v2_inter_pat(inter_pat, thr_info, case, debug)
+                hmc1 = gen_hmc_v2_inter_pat(inter_pat, ctx, case, debug)
                 hmc.hit += hmc1.hit
                 hmc.miss += hmc1.miss
                 hmc.conflict += hmc1.conflict
@@ -235,13 +232,13 @@ def gen_hmc_v2_all_inter_pat_group(inter_pat_groups, thr_info, debug):
 # several access states cases of (thread1_cases X thread2_cases X ... ).
 # Inputs:
 #       inter_pat: the interference pattern to process
-#       thr_info: thread_info object
+#       ctx: model_context object
 #       debug: debug output control
 # Return:
 #       a list of of possible cases. Each case is an array too. The "i"th 
 #       element is the case of the "i"th thread. The value of this element is 
 #       case number of this thread's access sequence.
-def gen_cases_inter_pat(inter_pat, thr_info, debug):
+def gen_cases_inter_pat(inter_pat, ctx, debug):
     # count the total number of cases for each thread's access sequence 
     counts = [] 
     for thr in inter_pat.threads:
@@ -261,14 +258,14 @@ def gen_cases_inter_pat(inter_pat, thr_info, debug):
 # Generate the hit/miss/conflict ratio for one case of interference pattern
 # Inputs:
 #       inter_pat: the interference pattern to process
-#       thr_info: thread_info object
+#       ctx: model_context object
 #       debug: debug output control
 #       case: a list of of possible cases. Each case is an array too. The "i"th 
 #             element is the case of the "i"th thread. The value of this 
 #             element is case number of this thread's access sequence.
 # Output:
 #       a hmc_ratios object
-def gen_hmc_v2_inter_pat(inter_pat, thr_info, case, debug):
+def gen_hmc_v2_inter_pat(inter_pat, ctx, case, debug):
     hmc = hmc_ratios()
     hmc.hit = 0.0
     hmc.miss = 0.0
@@ -286,40 +283,37 @@ def gen_hmc_v2_inter_pat(inter_pat, thr_info, case, debug):
         
     # generate the hit/miss/ratio for this inter_pat
         # find the corresponding channel reuse distance information
-    found = False
-    for chnl_dist in thr_info.chnl_reuse_dists:
-        if chnl_dist.acc_dist == inter_pat.chnl_reuse_dist:
-            found = True
-            break
-    if not found:
+    if inter_pat.chnl_reuse_dist not in ctx.reuse_dist_index:
         print "Weired: reuse distance not found"
         exit(3)
+    (dist_prob, hit_prob, miss_prob, conf_prob) = \
+        ctx.reuse_dist_index[inter_pat.chnl_reuse_dist]
     # here I treat the previous access from the target thread as the 
     # same as any middle threads. Now lets generate the cases and 
     # probabilities for the three new cases
     # previous access is to the same row
     org_acc_type = 1 # same row, a hit originally
-    base_prob = prob * chnl_dist.hit_prob;
+    base_prob = prob * hit_prob;
     if base_prob != 0:
-        hmc1 = gen_hmc_v2_by_counts(total_accs,total_sr,total_sb, thr_info,
+        hmc1 = gen_hmc_v2_by_counts(total_accs,total_sr,total_sb, ctx,
                                     org_acc_type, base_prob, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to the same bank but different row
     org_acc_type = 2 # same row different bank, a conflict originally
-    base_prob = prob * chnl_dist.conf_prob;
+    base_prob = prob * conf_prob;
     if base_prob != 0:
-        hmc1 = gen_hmc_v2_by_counts(total_accs,total_sr,total_sb, thr_info,
+        hmc1 = gen_hmc_v2_by_counts(total_accs,total_sr,total_sb, ctx,
                                     org_acc_type, base_prob, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to a different bank
     org_acc_type = 3 # different bank, a miss originally
-    base_prob = prob * chnl_dist.miss_prob;
+    base_prob = prob * miss_prob;
     if base_prob != 0:
-        hmc1 = gen_hmc_v2_by_counts(total_accs,total_sr,total_sb, thr_info,
+        hmc1 = gen_hmc_v2_by_counts(total_accs,total_sr,total_sb, ctx,
                                     org_acc_type, base_prob, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
@@ -335,13 +329,13 @@ def gen_hmc_v2_inter_pat(inter_pat, thr_info, case, debug):
 #       total_sr: total number of accesses that hit the target row
 #       total_sb: total number of access that hit the target bank but not
 #                 target row
-#       thr_info: thread_info
+#       ctx: model_context object
 #       orig_type: original HMC type when no contentino: 1 hit, 3 miss
 #                  2 conflict  
 #       base_prob: basic probability of this case
 # Output:
 #       hmc_ratios object
-def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, thr_info, orig_type,
+def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, ctx, orig_type,
                          base_prob, debug):
     hmc = hmc_ratios()
     hmc.hit = 0.0
@@ -350,18 +344,16 @@ def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, thr_info, orig_type,
 
     # if original access is a hit, and it is reorder-able, than this is also
     # a hit
-    #if ((orig_type == 1) and (total_accs * thr_info.est_serv_time <=
-    #                          thr_info.reorder_time)):
-    #    if thr_info.half_reorder:
+    #if ((orig_type == 1) and (total_accs * ctx.est_serv_time <=
+    #                          ctx.reorder_time)):
+    #    if ctx.half_reorder:
     #        hmc.hit = base_prob/2
     #        hmc.conflict = base_prob/2
     #    else:
     #        hmc.hit = base_prob
     #    return hmc
-    auto_close_frame = int(math.floor(thr_info.autoclose_time/
-                                  thr_info.est_serv_time))
-    reorder_frame = int(math.floor(thr_info.reorder_time/
-                                   thr_info.est_serv_time))
+    auto_close_frame = ctx.auto_close_frame
+    reorder_frame = ctx.reorder_frame
     # scenario 1: both same row an same bank (different row) accesses exist
     if (total_sr != 0)  and (total_sb != 0):
         prob_1 = base_prob
@@ -375,7 +367,7 @@ def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, thr_info, orig_type,
                                                            total_accs, 
                                                            auto_close_frame+1, 
                                                            reorder_frame)
-        if thr_info.half_reorder:
+        if ctx.half_reorder:
             hmc.hit += prob_1_1_1_1/2
             hmc.conflict += prob_1_1_1_1/2
         else:
@@ -400,7 +392,7 @@ def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, thr_info, orig_type,
         # scenario 1-2-1: last same row reorder-able, a hit        
         prob_1_2_1 = prob_1_2 * get_prob_m_within_d(total_sr, total_sb, 
                                                     total_accs, reorder_frame)
-        if thr_info.half_reorder:
+        if ctx.half_reorder:
             hmc.hit += prob_1_2_1/2
             hmc.conflict += prob_1_2_1/2
         else:
@@ -438,7 +430,7 @@ def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, thr_info, orig_type,
                                                       total_accs, 
                                                       auto_close_frame+1, 
                                                       reorder_frame)
-        if thr_info.half_reorder:
+        if ctx.half_reorder:
             hmc.hit += prob_3_1_1/2
             hmc.conflict += prob_3_1_1/2
         else:
@@ -461,13 +453,13 @@ def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, thr_info, orig_type,
         # scenario 4: not same row and same bank access
         prob_4 = base_prob
         if orig_type == 1: # originally a hit
-            if (total_accs * thr_info.est_serv_time) > thr_info.autoclose_time:
+            if (total_accs * ctx.est_serv_time) > ctx.autoclose_time:
                 # auto-closed, miss
                 hmc.miss += prob_4
             else: # not auto-closed, hit
                 hmc.hit += prob_4
         elif orig_type == 2: # originally a conflict
-            if (total_accs * thr_info.est_serv_time) > thr_info.autoclose_time:
+            if (total_accs * ctx.est_serv_time) > ctx.autoclose_time:
                 # auto-closed, miss
                 hmc.miss += prob_4
             else: # not auto-closed, hit
@@ -480,9 +472,9 @@ def gen_hmc_v2_by_counts(total_accs, total_sr, total_sb, thr_info, orig_type,
         exit(8)
 
     # check the conflicts, see if reordering can help
-    if ((orig_type == 1) and (total_accs * thr_info.est_serv_time <=
-                              thr_info.reorder_time)):
-        if thr_info.half_reorder:
+    if ((orig_type == 1) and (total_accs * ctx.est_serv_time <=
+                              ctx.reorder_time)):
+        if ctx.half_reorder:
             hmc.hit += hmc.conflict/2
             hmc.conflict /= 2
         else:
@@ -545,7 +537,8 @@ def get_prob_m_between_d1_d2(m, n, l, d1, d2):
     x = l - d2
     total_last_a_in_middle = 0
     for i in range(x+d-1, x-1, -1): # [x+d-1, x+d-d]
-        total_last_a_in_middle += acc_gen.cal_combination(i, m-1)
+        if (i >= (m-1)):
+            total_last_a_in_middle += acc_gen.cal_combination(i, m-1)
     # total cases of putting "m" "a"s in "l" slots
     total_a = acc_gen.cal_combination(l,m) 
     prob = float(total_last_a_in_middle)/float(total_a)
@@ -558,11 +551,11 @@ def get_prob_m_between_d1_d2(m, n, l, d1, d2):
 #      inter_pat_groups: Essentially a two-D array for interference patterns.
 #                        Each group has the interference pattern for one 
 #                        channel reuse distance.
-#      thr_info: thread_info object
+#      ctx: model_context object
 #      debug: debug output control
 # Return:
 #      hmc_ratios object
-def gen_hmc_v3_all_inter_pat_group(inter_pat_groups, thr_info, debug):
+def gen_hmc_v3_all_inter_pat_group(inter_pat_groups, ctx, debug):
     hmc = hmc_ratios()
     hmc.hit = 0.0
     hmc.miss = 0.0
@@ -575,12 +568,12 @@ def gen_hmc_v3_all_inter_pat_group(inter_pat_groups, thr_info, debug):
                 print "Processing a new interference pattern :"
                 print inter_pat_gen.log_full_inter_pat(inter_pat)
 
-            cases = gen_cases_inter_pat(inter_pat, thr_info, debug)
+            cases = gen_cases_inter_pat(inter_pat, ctx, debug)
             # generate HMC ratio for each case
             for case in cases:
                 if debug:
                     print "Case:", log_hmc_case(inter_pat, case)
-                hmc1 = gen_hmc_v3_inter_pat(inter_pat, thr_info, case, debug)
+                hmc1 = gen_hmc_v3_inter_pat(inter_pat, ctx, case, debug)
                 hmc.hit += hmc1.hit
                 hmc.miss += hmc1.miss
                 hmc.conflict += hmc1.conflict
@@ -602,14 +595,14 @@ def gen_hmc_v3_all_inter_pat_group(inter_pat_groups, thr_info, debug):
 # Version V3.
 # Inputs:
 #       inter_pat: the interference pattern to process
-#       thr_info: thread_info object
+#       ctx: model_context object
 #       debug: debug output control
 #       case: a list of of possible cases. Each case is an array too. The "i"th 
 #             element is the case of the "i"th thread. The value of this 
 #             element is case number of this thread's access sequence.
 # Output:
 #       a hmc_ratios object
-def gen_hmc_v3_inter_pat(inter_pat, thr_info, case, debug):
+def gen_hmc_v3_inter_pat(inter_pat, ctx, case, debug):
     hmc = hmc_ratios()
     hmc.hit = 0.0
     hmc.miss = 0.0
@@ -630,40 +623,37 @@ def gen_hmc_v3_inter_pat(inter_pat, thr_info, case, debug):
         print ", total_sr", total_sr, ", total_sb", total_sb
     # generate the hit/miss/ratio for this inter_pat
         # find the corresponding channel reuse distance information
-    found = False
-    for chnl_dist in thr_info.chnl_reuse_dists:
-        if chnl_dist.acc_dist == inter_pat.chnl_reuse_dist:
-            found = True
-            break
-    if not found:
+    if inter_pat.chnl_reuse_dist not in ctx.reuse_dist_index:
         print "Weired: reuse distance not found"
         exit(3)
+    (dist_prob, hit_prob, miss_prob, conf_prob) = \
+        ctx.reuse_dist_index[inter_pat.chnl_reuse_dist]
     # here I treat the previous access from the target thread as the 
     # same as any middle threads. Now lets generate the cases and 
     # probabilities for the three new cases
     # previous access is to the same row
     org_acc_type = 1 # same row, a hit originally
-    base_prob = prob * chnl_dist.hit_prob;
+    base_prob = prob * hit_prob;
     if base_prob != 0:
-        hmc1 = gen_hmc_v3_by_existence(total_accs,total_sr,total_sb, thr_info,
+        hmc1 = gen_hmc_v3_by_existence(total_accs,total_sr,total_sb, ctx,
                                        org_acc_type, base_prob, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to the same bank but different row
     org_acc_type = 2 # same row different bank, a conflict originally
-    base_prob = prob * chnl_dist.conf_prob;
+    base_prob = prob * conf_prob;
     if base_prob != 0:
-        hmc1 = gen_hmc_v3_by_existence(total_accs,total_sr,total_sb, thr_info,
+        hmc1 = gen_hmc_v3_by_existence(total_accs,total_sr,total_sb, ctx,
                                        org_acc_type, base_prob, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to a different bank
     org_acc_type = 3 # different bank, a miss originally
-    base_prob = prob * chnl_dist.miss_prob;
+    base_prob = prob * miss_prob;
     if base_prob != 0:
-        hmc1 = gen_hmc_v3_by_existence(total_accs,total_sr,total_sb, thr_info,
+        hmc1 = gen_hmc_v3_by_existence(total_accs,total_sr,total_sb, ctx,
                                        org_acc_type, base_prob, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
@@ -678,33 +668,31 @@ def gen_hmc_v3_inter_pat(inter_pat, thr_info, case, debug):
 #       total_sr: total number of accesses that hit the target row
 #       total_sb: total number of access that hit the target bank but not
 #                 target row
-#       thr_info: thread_info
+#       ctx: model_context object
 #       orig_type: original HMC type when no contentino: 1 hit, 3 miss
 #                  2 conflict  
 #       base_prob: basic probability of this case
 # Output:
 #       hmc_ratios object
-def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, thr_info, orig_type,
+def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, ctx, orig_type,
                             base_prob, debug):
     hmc = hmc_ratios()
     hmc.hit = 0.0
     hmc.miss = 0.0
     hmc.conflict = 0.0
 
-    auto_close_frame = int(math.floor(thr_info.autoclose_time/
-                                  thr_info.est_serv_time))
-    reorder_frame = int(math.floor(thr_info.reorder_time/
-                                   thr_info.est_serv_time))
+    auto_close_frame = ctx.auto_close_frame
+    reorder_frame = ctx.reorder_frame
     
     if orig_type == 1:
         # scenario 1: original is a hit
         if (total_sr == 0) and (total_sb == 0):
             # scenario 1-1: some-row access and some-bank access NOT exist
-            if ((total_accs * thr_info.est_serv_time) > 
-                thr_info.autoclose_time):
+            if ((total_accs * ctx.est_serv_time) > 
+                ctx.autoclose_time):
                 # scenario 1-1-1: row buffer auto-closed
-                if (total_accs * thr_info.est_serv_time <= 
-                    thr_info.reorder_time):
+                if (total_accs * ctx.est_serv_time <= 
+                    ctx.reorder_time):
                     # scenario 1-1-1-1: reorder-able, hit
                     hmc.hit = base_prob
                 else:
@@ -718,10 +706,10 @@ def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, thr_info, orig_type,
             hmc.hit = base_prob
         elif (total_sr == 0) and (total_sb != 0):
             # scenario 1-3: only same-bank accesses exist
-            if (total_accs * thr_info.est_serv_time <= 
-                thr_info.reorder_time):
+            if (total_accs * ctx.est_serv_time <= 
+                ctx.reorder_time):
                 # scenario 1-3-1: reorder-able, hit
-                if thr_info.half_reorder:
+                if ctx.half_reorder:
                     hmc.hit = base_prob/2
                     hmc.conflict = base_prob/2
                 else:
@@ -734,10 +722,10 @@ def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, thr_info, orig_type,
                 hmc.miss = base_prob/2
         elif (total_sr != 0) and (total_sb != 0):
             # scenario 1-4: both same-row accesses and same-bank accesses exist
-            if (total_accs * thr_info.est_serv_time <= 
-                thr_info.reorder_time):
+            if (total_accs * ctx.est_serv_time <= 
+                ctx.reorder_time):
                 # scenario 1-4-1: reorder-able, hit
-                if thr_info.half_reorder:
+                if ctx.half_reorder:
                     hmc.hit = base_prob/2
                     hmc.conflict = base_prob/2
                 else:
@@ -757,7 +745,7 @@ def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, thr_info, orig_type,
             hmc.hit = base_prob
         elif (total_sr == 0) and (total_sb != 0):
             # scenario 2-3: only same-bank accesses exist, conflict
-            if thr_info.half_reorder:
+            if ctx.half_reorder:
                hmc.conflict = base_prob/2
                hmc.miss = base_prob/2
             else:
@@ -772,8 +760,8 @@ def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, thr_info, orig_type,
         if (total_sr == 0) and (total_sb == 0):
             # scenario 3-1: neither same-row accesses nor same-bank accesses 
             # exist
-            if (total_accs * thr_info.est_serv_time > 
-                thr_info.autoclose_time):
+            if (total_accs * ctx.est_serv_time > 
+                ctx.autoclose_time):
                 # scenario 3-1-1: row buffer auto-closed, miss
                 hmc.miss = base_prob
             else:
@@ -784,7 +772,7 @@ def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, thr_info, orig_type,
             hmc.hit = base_prob
         elif (total_sr == 0) and (total_sb != 0):
             # scenario 3-3: only same-bank accesses exist, conflict
-            if thr_info.half_reorder:
+            if ctx.half_reorder:
                 hmc.conflict = base_prob/2
                 hmc.miss = base_prob/2
             else:
@@ -820,11 +808,11 @@ def gen_hmc_v3_by_existence(total_accs, total_sr, total_sb, thr_info, orig_type,
 #      inter_pat_groups: Essentially a two-D array for interference patterns.
 #                        Each group has the interference pattern for one 
 #                        channel reuse distance.
-#      thr_info: thread_info object
+#      ctx: model_context object
 #      debug: debug output control
 # Return:
 #      hmc_ratios object
-def gen_hmc_v1_all_inter_pat_group(inter_pat_groups, thr_info, debug):
+def gen_hmc_v1_all_inter_pat_group(inter_pat_groups, ctx, debug):
     hmc = hmc_ratios()
     hmc.hit = 0.0
     hmc.miss = 0.0
@@ -834,10 +822,10 @@ def gen_hmc_v1_all_inter_pat_group(inter_pat_groups, thr_info, debug):
     for inter_pats in inter_pat_groups:
         for inter_pat in inter_pats:
             # process this interference pattern
-            cases = gen_cases_inter_pat(inter_pat, thr_info, debug)
+            cases = gen_cases_inter_pat(inter_pat, ctx, debug)
             # generate HMC ratio for each case
             for case in cases:
-                hmc1 = gen_hmc_v1_inter_pat(inter_pat, thr_info, case, debug)
+                hmc1 = gen_hmc_v1_inter_pat(inter_pat, ctx, case, debug)
                 hmc.hit += hmc1.hit
                 hmc.miss += hmc1.miss
                 hmc.conflict += hmc1.conflict
@@ -858,49 +846,46 @@ def gen_hmc_v1_all_inter_pat_group(inter_pat_groups, thr_info, debug):
 # this file.
 # Inputs:
 #       full_inter_pat: a full interference pattern
-#       thr_info: see thread_info class for information
+#       ctx: see model_context class for information
 # Return:
 #       an object of class hmc_ratios
-def gen_hmc_v1_inter_pat(inter_pat, thr_info, case, debug):
+def gen_hmc_v1_inter_pat(inter_pat, ctx, case, debug):
 
     hmc = hmc_ratios()
     prob = inter_pat.prob
 
     # find the corresponding channel reuse distance information
-    found = False
-    for chnl_dist in thr_info.chnl_reuse_dists:
-        if chnl_dist.acc_dist == inter_pat.chnl_reuse_dist:
-            found = True
-            break
-    if not found:
+    if inter_pat.chnl_reuse_dist not in ctx.reuse_dist_index:
         print "Weired: reuse distance not found"
         exit(3)
+    (dist_prob, hit_prob, miss_prob, conf_prob) = \
+        ctx.reuse_dist_index[inter_pat.chnl_reuse_dist]
     # here I treat the previous access from the target thread as the 
     # same as any middle threads. Now lets generate the cases and 
     # probabilities for the three new cases
     # previous access is to the same row
     org_acc_type = 1 # same row, a hit originally
-    base_prob = inter_pat.prob * chnl_dist.hit_prob;
+    base_prob = inter_pat.prob * hit_prob;
     if inter_pat.prob != 0:
-        hmc1 = gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case,
+        hmc1 = gen_hmc_v1_inter_pat_w_org_acc(inter_pat, ctx, case,
                                               base_prob, org_acc_type, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to the same bank but different row
     org_acc_type = 2 # same row different bank, a conflict originally
-    base_prob = inter_pat.prob * chnl_dist.conf_prob;
+    base_prob = inter_pat.prob * conf_prob;
     if inter_pat.prob != 0:
-        hmc1 = gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case,
+        hmc1 = gen_hmc_v1_inter_pat_w_org_acc(inter_pat, ctx, case,
                                               base_prob, org_acc_type,debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
         hmc.conflict += hmc1.conflict
     # previous access is to a different bank
     org_acc_type = 3 # different bank, a miss originally
-    base_prob = inter_pat.prob * chnl_dist.miss_prob;
+    base_prob = inter_pat.prob * miss_prob;
     if inter_pat.prob != 0:
-        hmc1 = gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case,
+        hmc1 = gen_hmc_v1_inter_pat_w_org_acc(inter_pat, ctx, case,
                                               base_prob, org_acc_type, debug)
         hmc.hit += hmc1.hit
         hmc.miss += hmc1.miss
@@ -917,7 +902,7 @@ def gen_hmc_v1_inter_pat(inter_pat, thr_info, case, debug):
 #                     different row 3) different bank
 # Return:
 #       an object of class hmc_ratios
-def gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case, base_prob,
+def gen_hmc_v1_inter_pat_w_org_acc(inter_pat, ctx, case, base_prob,
                                    org_acc_type, debug):
 
     #output = inter_pat_gen.log_full_inter_pat(inter_pat)
@@ -975,8 +960,8 @@ def gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case, base_prob,
         if (last_same_row < last_same_bank): # last access is same row
             case = 1 # similar to the process of case 1
         else: # last access is same bank
-            if (last_same_row * thr_info.est_serv_time <= 
-                thr_info.reorder_time):
+            if (last_same_row * ctx.est_serv_time <= 
+                ctx.reorder_time):
                 # same row access and the target access are reorder-able
                 acc = 1 # hit
                 reordered = True
@@ -995,10 +980,10 @@ def gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case, base_prob,
         acc = 2 # miss
     
     if case == 1: # process for case 1
-        if (last_same_row * thr_info.est_serv_time > 
-            thr_info.autoclose_time): #auto-closed
-            if (last_same_row * thr_info.est_serv_time <= 
-                thr_info.reorder_time): #reordered
+        if (last_same_row * ctx.est_serv_time > 
+            ctx.autoclose_time): #auto-closed
+            if (last_same_row * ctx.est_serv_time <= 
+                ctx.reorder_time): #reordered
                 reordered = True
                 acc = 1 # hit
             else:
@@ -1006,8 +991,8 @@ def gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case, base_prob,
         else: #not auto-closed
             acc = 1 # hit
     elif case == 3: # process for case 3
-        if (last_same_row * thr_info.est_serv_time > 
-            thr_info.autoclose_time): #auto-closed
+        if (last_same_row * ctx.est_serv_time > 
+            ctx.autoclose_time): #auto-closed
             acc = 2 # miss
         else:
             acc = 3 # conflict
@@ -1025,7 +1010,7 @@ def gen_hmc_v1_inter_pat_w_org_acc(inter_pat, thr_info, case, base_prob,
         hmc.conflict = base_prob
 
     # if half reordered 
-    if thr_info.half_reorder and reordered:
+    if ctx.half_reorder and reordered:
         hmc.conflict += hmc.hit / 2
         hmc.hit /= 2
     
@@ -1051,3 +1036,80 @@ def log_hmc_case(inter_pat, case):
         
     output += ",A}"
     return output
+
+# Reduce the interference patterns to a table of the inputs of version 2 and 3
+# of step 4. Versions 2 and 3 only use the totals of the accesses of every
+# case, and the original access type of the target thread, so the step 4 of
+# these versions can be re-evaluated from the table, e.g., with other timing
+# parameters in ctx, without the interference patterns. 
+# Inputs:
+#      inter_pat_groups: see gen_hmc_v2_all_inter_pat_group
+#      ctx: model_context object
+#      by_existence: only keep whether same row and same bank accesses exist,
+#                    which is enough for version 3
+# Return:
+#      a dict: (total_accs, total_sr, total_sb, orig_type) ==> probability
+def gen_count_table(inter_pat_groups, ctx, by_existence):
+    table = dict()
+    for inter_pats in inter_pat_groups:
+        for inter_pat in inter_pats:
+            if inter_pat.chnl_reuse_dist not in ctx.reuse_dist_index:
+                print "Weired: reuse distance not found"
+                exit(3)
+            (dist_prob, hit_prob, miss_prob, conf_prob) = \
+                ctx.reuse_dist_index[inter_pat.chnl_reuse_dist]
+            for case in gen_cases_inter_pat(inter_pat, ctx, False):
+                total_accs = 0
+                total_sr = 0
+                total_sb = 0
+                prob = inter_pat.prob
+                for idx,val in enumerate(case):
+                    total_accs += inter_pat.threads[idx].cases[val].total_accs
+                    total_sr += inter_pat.threads[idx].cases[val].total_sr
+                    total_sb += inter_pat.threads[idx].cases[val].total_sb
+                    prob *= inter_pat.threads[idx].cases[val].prob
+                if by_existence:
+                    total_sr = min(total_sr, 1)
+                    total_sb = min(total_sb, 1)
+                # same original access types as gen_hmc_v3_inter_pat
+                for (org_acc_type, type_prob) in ((1, hit_prob),
+                                                  (2, conf_prob),
+                                                  (3, miss_prob)):
+                    base_prob = prob * type_prob
+                    if base_prob == 0:
+                        continue
+                    key = (total_accs, total_sr, total_sb, org_acc_type)
+                    table[key] = table.get(key, 0.0) + base_prob
+
+    return table
+
+# Get the hit/miss/conflict ratios from a table generated by gen_count_table.
+# Inputs:
+#      table: the dict returned by gen_count_table
+#      ctx: model_context object, with the timing parameters to use
+#      version: version of step 4, 2 or 3
+#      debug: debug output control
+# Return:
+#      hmc_ratios object
+def gen_hmc_count_table(table, ctx, version, debug):
+    if version == 2:
+        by_counts = gen_hmc_v2_by_counts
+    elif version == 3:
+        by_counts = gen_hmc_v3_by_existence
+    else:
+        print "Only version 2 and 3 of step 4 use the count table"
+        exit(62)
+
+    hmc = hmc_ratios()
+    hmc.hit = 0.0
+    hmc.miss = 0.0
+    hmc.conflict = 0.0
+    for ((total_accs, total_sr, total_sb, org_acc_type), base_prob) in \
+            table.iteritems():
+        hmc1 = by_counts(total_accs, total_sr, total_sb, ctx, org_acc_type,
+                         base_prob, debug)
+        hmc.hit += hmc1.hit
+        hmc.miss += hmc1.miss
+        hmc.conflict += hmc1.conflict
+
+    return hmc
@@ -62,11 +62,11 @@ all_acc_stats_prob_sum = 0.0
 # Input:
 #      full_inter_pat_groups: groups of full_interference_patterns, each group
 #                             corresponds to one channel reuse distance
-#      thr_info: see thread_info class
+#      ctx: see model_context class
 #
 # Return:
 #      hmc_ratios class: hmc ratios of all interference patterns
-def gen_acc_stat_all(full_inter_pat_groups, thr_info):
+def gen_acc_stat_all(full_inter_pat_groups, ctx):
     
     global all_acc_stats_prob_sum
     all_acc_stats_prob_sum = 0.0
@@ -79,7 +79,7 @@ def gen_acc_stat_all(full_inter_pat_groups, thr_info):
         for inter_pat in inter_pats:
             # generate the access status and ratios for this interference 
             # pattern
-            hmc1 = gen_acc_stat_one(inter_pat, thr_info)
+            hmc1 = gen_acc_stat_one(inter_pat, ctx)
             hmc.hit += hmc1.hit
             hmc.miss += hmc1.miss
             hmc.conflict += hmc1.conflict
@@ -114,7 +114,7 @@ class acc_stat_probs:
 #
 # This function uses depth first search to generate all cases. Each node in the
 # tree represents one access at one state.
-def gen_acc_stat_one(inter_pat, thr_info):
+def gen_acc_stat_one(inter_pat, ctx):
     
     # initialize the indices
     inter_pat.cur_thread = 0;
@@ -142,7 +142,7 @@ def gen_acc_stat_one(inter_pat, thr_info):
             all_acc_stats_prob_sum += node.prob
             output =  log_full_inter_pat(node)
             # see what the one is (hit,miss,conf)
-            hmc1 = hmc_ratios_gen.gen_hmc_full_inter_pat(node, thr_info)
+            hmc1 = hmc_ratios_gen.gen_hmc_full_inter_pat(node, ctx)
             output += (" {hit: " + str(hmc1.hit) + ", miss: " + str(hmc1.miss) +
                        ", conf: " + str(hmc1.conflict) + "}")
             print output
@@ -152,7 +152,7 @@ def gen_acc_stat_one(inter_pat, thr_info):
             continue
         
         # generate the memory access states for the current access
-        probs = gen_acc_stats(node, thr_info)
+        probs = gen_acc_stats(node, ctx)
         thread_idx = node.cur_thread
         acc_idx = node.threads[thread_idx].cur_acc
         # advance indices
@@ -228,10 +228,10 @@ def sum_acc_stat_probs(probs):
 # 
 # Input:
 #      inter_pat: see class full_interference_pattern
-#      thr_info : see class thread_info
+#      ctx : see model_context class
 # Return:
 #      an object of acc_stat_probs class
-def gen_acc_stats(inter_pat, thr_info):
+def gen_acc_stats(inter_pat, ctx):
 
     probs = acc_stat_probs()
     probs.same_bank_same_row = 0.0
@@ -252,9 +252,9 @@ def gen_acc_stats(inter_pat, thr_info):
     # if this is the first access of a thread, probabilities are based on
     # basic cases
     if acc_idx == 0:
-        probs.diff_bank = 1 - thr_info.bank_prob
-        probs.same_bank_diff_row = thr_info.bank_prob * (1 - thr_info.row_prob)
-        probs.same_bank_same_row = thr_info.bank_prob * thr_info.row_prob
+        probs.diff_bank = 1 - ctx.bank_prob
+        probs.same_bank_diff_row = ctx.bank_prob * (1 - ctx.row_prob)
+        probs.same_bank_same_row = ctx.bank_prob * ctx.row_prob
         
         sum_prob = sum_acc_stat_probs(probs)
         if sum_prob > 1.1 or sum_prob < 0.9:
@@ -271,9 +271,9 @@ def gen_acc_stats(inter_pat, thr_info):
             found = True
             break
     if not found: # this is the first in this sequence, treat like basic base
-        probs.diff_bank = 1 - thr_info.bank_prob
-        probs.same_bank_diff_row = thr_info.bank_prob * (1 - thr_info.row_prob)
-        probs.same_bank_same_row = thr_info.bank_prob * thr_info.row_prob
+        probs.diff_bank = 1 - ctx.bank_prob
+        probs.same_bank_diff_row = ctx.bank_prob * (1 - ctx.row_prob)
+        probs.same_bank_same_row = ctx.bank_prob * ctx.row_prob
         
         sum_prob = sum_acc_stat_probs(probs)
         if sum_prob > 1.1 or sum_prob < 0.9:
@@ -285,53 +285,48 @@ def gen_acc_stats(inter_pat, thr_info):
     acc_dist = acc_idx - prev
     
     # find the corresponding channel reuse distance
-    found = False
-    for cr_idx in range(len(thr_info.chnl_reuse_dists)):
-        if thr_info.chnl_reuse_dists[cr_idx].acc_dist == acc_dist:
-            crd = thr_info.chnl_reuse_dists[cr_idx]
-            found = True
-            break
-    if not found:
+    if acc_dist not in ctx.reuse_dist_index:
         print "Weird, access distance not exists"
         output =  log_full_inter_pat(inter_pat)
         print output
         print "thr_idx:", thr_idx, "acc_idx:", acc_idx
         print "prev:", prev, "acc_dist:", acc_dist
         exit(4)
+    (dist_prob, hit_prob, miss_prob, conf_prob) = ctx.reuse_dist_index[acc_dist]
 
     # count the probabilities
     # current access HITs previous access: same state as previous
     if prev_acc.same_row: # prev: same bank same row
-        probs.same_bank_same_row += crd.hit_prob
+        probs.same_bank_same_row += hit_prob
     elif prev_acc.same_bank: # prev: same bank different row
-        probs.same_bank_diff_row += crd.hit_prob
+        probs.same_bank_diff_row += hit_prob
     else: # prev: different bank
-        probs.diff_bank += crd.hit_prob
+        probs.diff_bank += hit_prob
 
     # current access MISSes previous access:
     # if previous is one the same bank, then current one is the different bank
     # if previous is different bank, then current one may be any three cases
     if prev_acc.same_row or prev_acc.same_bank: # prev: same bank
-        probs.diff_bank += crd.miss_prob
+        probs.diff_bank += miss_prob
     else: # prev: different bank
         # same bank same row
-        probs.diff_bank += crd.miss_prob * (1 - thr_info.bank_prob)
-        probs.same_bank_diff_row += (crd.miss_prob * (thr_info.bank_prob * 
-                                                     (1 - thr_info.row_prob)))
-        probs.same_bank_same_row += (crd.miss_prob * thr_info.bank_prob * 
-                                    thr_info.row_prob)
+        probs.diff_bank += miss_prob * (1 - ctx.bank_prob)
+        probs.same_bank_diff_row += (miss_prob * (ctx.bank_prob * 
+                                                     (1 - ctx.row_prob)))
+        probs.same_bank_same_row += (miss_prob * ctx.bank_prob * 
+                                    ctx.row_prob)
 
     # current access CONFLICTs previous access:
     # prev: same bank same row ==> current: same bank different row
     # prev: same bank different row ==> current: same bank same/different row
     # prev: different bank ==> different bank
     if prev_acc.same_row: # prev: same bank same row
-        probs.same_bank_same_row += crd.conf_prob
+        probs.same_bank_same_row += conf_prob
     elif prev_acc.same_bank: # prev: same bank different row
-        probs.same_bank_same_row += crd.conf_prob * thr_info.row_prob
-        probs.same_bank_diff_row += crd.conf_prob * (1 - thr_info.row_prob)
+        probs.same_bank_same_row += conf_prob * ctx.row_prob
+        probs.same_bank_diff_row += conf_prob * (1 - ctx.row_prob)
     else:
-        probs.diff_bank += crd.conf_prob
+        probs.diff_bank += conf_prob
     
     # sanity check
     sum_prob = sum_acc_stat_probs(probs)
@@ -343,14 +338,14 @@ def gen_acc_stats(inter_pat, thr_info):
 # For each access sequence of each channel reuse distance, generate all possible
 # cases of access states.
 # Input:
-#      thr_info: a thread_info object
+#      ctx: a model_context object
 # Return:
 #      Nothing to return. all cases are attach to the 'cases' list of each 
 #      access sequence object (accs_on_thread).
-def gen_acc_seq_stats_all(thr_info, debug):
-    for ch_dist in thr_info.chnl_reuse_dists:
+def gen_acc_seq_stats_all(ctx, debug):
+    for ch_dist in ctx.chnl_reuse_dists:
         for acc_seq in ch_dist.acc_seqs:
-            acc_seq.cases = gen_acc_seq_stats(acc_seq, thr_info, debug)
+            acc_seq.cases = gen_acc_seq_stats(acc_seq, ctx, debug)
             
             # sanity check
             sum_prob = 0.0
@@ -372,11 +367,11 @@ def gen_acc_seq_stats_all(thr_info, debug):
 # probabilities all state for this accesses, and saved it for later use.
 # Input:
 #      acc_seq: an accs_one_thread object; the access sequence to process
-#      thr_info: a thread_info object
+#      ctx: a model_context object
 # Return:
 #      all possible cases of access states, each case is an object of 
 #      acc_seq_case.
-def gen_acc_seq_stats(acc_seq, thr_info, debug):
+def gen_acc_seq_stats(acc_seq, ctx, debug):
     
     cases = []
     
@@ -402,7 +397,7 @@ def gen_acc_seq_stats(acc_seq, thr_info, debug):
             if c == 0: # just starting processing a new set of states for this 
                        # access, so calculate the probabilities for each type
                        # of accesses
-                cur_probs[stack_top] = gen_full_acc_seq_probs(acc_seq, thr_info,
+                cur_probs[stack_top] = gen_full_acc_seq_probs(acc_seq, ctx,
                                                               cur_states,
                                                               stack_top,
                                                               debug)
@@ -491,7 +486,7 @@ def generate_a_full_case(acc_seq, cur_states, cur_probs, debug):
 # for it. 
 # Input:
 #      acc_seq: the access sequence, accs_one_thread object
-#      thr_info: the thread_info object
+#      ctx: the model_context object
 #      cur_states: an integer array, each element represents that state of one
 #                  access; 0 same row, 1 same bank, 2 same channel,
 #                  3 different channel
@@ -499,7 +494,7 @@ def generate_a_full_case(acc_seq, cur_states, cur_probs, debug):
 #      debug: debug output control
 # Return:
 #      an object of acc_stat_probs class 
-def gen_full_acc_seq_probs(acc_seq, thr_info, cur_states, acc_idx, debug):
+def gen_full_acc_seq_probs(acc_seq, ctx, cur_states, acc_idx, debug):
     probs = acc_stat_probs()
     probs.same_bank_same_row = 0.0
     probs.same_bank_diff_row = 0.0
@@ -516,9 +511,9 @@ def gen_full_acc_seq_probs(acc_seq, thr_info, cur_states, acc_idx, debug):
     # if this is the first access of a thread, probabilities are based on
     # basic cases
     if acc_idx == 0:
-        probs.diff_bank = 1 - thr_info.bank_prob
-        probs.same_bank_diff_row = thr_info.bank_prob * (1 - thr_info.row_prob)
-        probs.same_bank_same_row = thr_info.bank_prob * thr_info.row_prob
+        probs.diff_bank = 1 - ctx.bank_prob
+        probs.same_bank_diff_row = ctx.bank_prob * (1 - ctx.row_prob)
+        probs.same_bank_same_row = ctx.bank_prob * ctx.row_prob
         
         sum_prob = sum_acc_stat_probs(probs)
         if sum_prob > 1.1 or sum_prob < 0.9:
@@ -535,9 +530,9 @@ def gen_full_acc_seq_probs(acc_seq, thr_info, cur_states, acc_idx, debug):
             found = True
             break
     if not found: # this is the first in this sequence, treat like basic base
-        probs.diff_bank = 1 - thr_info.bank_prob
-        probs.same_bank_diff_row = thr_info.bank_prob * (1 - thr_info.row_prob)
-        probs.same_bank_same_row = thr_info.bank_prob * thr_info.row_prob
+        probs.diff_bank = 1 - ctx.bank_prob
+        probs.same_bank_diff_row = ctx.bank_prob * (1 - ctx.row_prob)
+        probs.same_bank_same_row = ctx.bank_prob * ctx.row_prob
         
         sum_prob = sum_acc_stat_probs(probs)
         if sum_prob > 1.1 or sum_prob < 0.9:
@@ -549,53 +544,48 @@ def gen_full_acc_seq_probs(acc_seq, thr_info, cur_states, acc_idx, debug):
     acc_dist = acc_idx - prev
     
     # find the corresponding channel reuse distance
-    found = False
-    for cr_idx in range(len(thr_info.chnl_reuse_dists)):
-        if thr_info.chnl_reuse_dists[cr_idx].acc_dist == acc_dist:
-            crd = thr_info.chnl_reuse_dists[cr_idx]
-            found = True
-            break
-    if not found:
+    if acc_dist not in ctx.reuse_dist_index:
         print "Weird, access distance not exists"
         output =  log_full_inter_pat(inter_pat)
         print output
         print "thr_idx:", thr_idx, "acc_idx:", acc_idx
         print "prev:", prev, "acc_dist:", acc_dist
         exit(4)
+    (dist_prob, hit_prob, miss_prob, conf_prob) = ctx.reuse_dist_index[acc_dist]
 
     # count the probabilities
     # current access HITs previous access: same state as previous
     if prev_acc.same_row: # prev: same bank same row
-        probs.same_bank_same_row += crd.hit_prob
+        probs.same_bank_same_row += hit_prob
     elif prev_acc.same_bank: # prev: same bank different row
-        probs.same_bank_diff_row += crd.hit_prob
+        probs.same_bank_diff_row += hit_prob
     else: # prev: different bank
-        probs.diff_bank += crd.hit_prob
+        probs.diff_bank += hit_prob
 
     # current access MISSes previous access:
     # if previous is one the same bank, then current one is the different bank
     # if previous is different bank, then current one may be any three cases
     if prev_acc.same_row or prev_acc.same_bank: # prev: same bank
-        probs.diff_bank += crd.miss_prob
+        probs.diff_bank += miss_prob
     else: # prev: different bank
         # same bank same row
-        probs.diff_bank += crd.miss_prob * (1 - thr_info.bank_prob)
-        probs.same_bank_diff_row += (crd.miss_prob * (thr_info.bank_prob * 
-                                                     (1 - thr_info.row_prob)))
-        probs.same_bank_same_row += (crd.miss_prob * thr_info.bank_prob * 
-                                    thr_info.row_prob)
+        probs.diff_bank += miss_prob * (1 - ctx.bank_prob)
+        probs.same_bank_diff_row += (miss_prob * (ctx.bank_prob * 
+                                                     (1 - ctx.row_prob)))
+        probs.same_bank_same_row += (miss_prob * ctx.bank_prob * 
+                                    ctx.row_prob)
 
     # current access CONFLICTs previous access:
     # prev: same bank same row ==> current: same bank different row
     # prev: same bank different row ==> current: same bank same/different row
     # prev: different bank ==> different bank
     if prev_acc.same_row: # prev: same bank same row
-        probs.same_bank_same_row += crd.conf_prob
+        probs.same_bank_same_row += conf_prob
     elif prev_acc.same_bank: # prev: same bank different row
-        probs.same_bank_same_row += crd.conf_prob * thr_info.row_prob
-        probs.same_bank_diff_row += crd.conf_prob * (1 - thr_info.row_prob)
+        probs.same_bank_same_row += conf_prob * ctx.row_prob
+        probs.same_bank_diff_row += conf_prob * (1 - ctx.row_prob)
     else:
-        probs.diff_bank += crd.conf_prob
+        probs.diff_bank += conf_prob
     
     # sanity check
     sum_prob = sum_acc_stat_probs(probs)
@@ -607,14 +597,14 @@ def gen_full_acc_seq_probs(acc_seq, thr_info, cur_states, acc_idx, debug):
 # For each access sequence of each channel reuse distance, generate all possible
 # cases of access states. Version 3
 # Input:
-#      thr_info: a thread_info object
+#      ctx: a model_context object
 # Return:
 #      Nothing to return. all cases are attach to the 'cases' list of each 
 #      access sequence object (accs_on_thread).
-def gen_acc_seq_stats_all_v3(thr_info, debug):
-    for ch_dist in thr_info.chnl_reuse_dists:
+def gen_acc_seq_stats_all_v3(ctx, debug):
+    for ch_dist in ctx.chnl_reuse_dists:
         for acc_seq in ch_dist.acc_seqs:
-            acc_seq.cases = gen_acc_seq_stats_v3(acc_seq, thr_info, debug)
+            acc_seq.cases = gen_acc_seq_stats_v3(acc_seq, ctx, debug)
 
             if debug:
                 output = acc_gen.log_acc_sequence(acc_seq)
@@ -636,11 +626,11 @@ def gen_acc_seq_stats_all_v3(thr_info, debug):
 # All accesses are assumed to have the same state
 # Input:
 #      acc_seq: an accs_one_thread object; the access sequence to process
-#      thr_info: a thread_info object
+#      ctx: a model_context object
 # Return:
 #      all possible cases of access states, each case is an object of 
 #      acc_seq_case.
-def gen_acc_seq_stats_v3(acc_seq, thr_info, debug):
+def gen_acc_seq_stats_v3(acc_seq, ctx, debug):
     
     cases = []
 
@@ -675,7 +665,7 @@ def gen_acc_seq_stats_v3(acc_seq, thr_info, debug):
     case.total_accs = acc_seq.total_accs
     case.total_sr = case.total_accs
     case.total_sb = 0
-    case.prob = thr_info.bank_prob * thr_info.row_prob
+    case.prob = ctx.bank_prob * ctx.row_prob
     cases.append(case)
     # case 2: all accessing the same bank but different row
     case = acc_seq_case()
@@ -688,7 +678,7 @@ def gen_acc_seq_stats_v3(acc_seq, thr_info, debug):
     case.total_accs = acc_seq.total_accs
     case.total_sb = case.total_accs
     case.total_sr = 0
-    case.prob = thr_info.bank_prob * (1-thr_info.row_prob)
+    case.prob = ctx.bank_prob * (1-ctx.row_prob)
     cases.append(case)
     # case 3: all accessing the same channel, but different bank
     case = acc_seq_case()
@@ -701,7 +691,7 @@ def gen_acc_seq_stats_v3(acc_seq, thr_info, debug):
     case.total_accs = acc_seq.total_accs
     case.total_sb = 0
     case.total_sr = 0
-    case.prob = 1 - thr_info.bank_prob
+    case.prob = 1 - ctx.bank_prob
     cases.append(case)
     
     return cases
@@ -5,6 +5,9 @@
 #
 #
 
+import math
+import sys
+
 # class for access distances
 class chnl_reuse_dist_info:
     def __init__(self):
@@ -38,6 +41,40 @@ class thread_info:
                                   # auto-closing, in nanoseconds
         self.half_reorder = True  # Only consider half of the reorders to be
                                   # hit, the rest remains conflict
+        self.chnls = []           # parameters of each target channel, each
+                                  # element is a chnl_params object. The
+                                  # timing parameters above are shared by all
+                                  # channels.
+
+# This class holds the parameters (one section of the parameter file) for
+# predicting one target channel
+class chnl_params:
+    def __init__(self):
+        self.chnl_id = 0                  # id of the target channel
+        self.thr_info = thread_info()     # thread information for this channel
+        self.con_acc_probs = consecutive_acc_probs()
+        self.con_noacc_probs = consecutive_noacc_probs()
+        self.min_con_acc = 0      # minimum number of consecutive accesses to
+                                  # this channel
+        self.min_con_noacc = 0    # minimum number of consecutive accesses to
+                                  # other channels
+        self.corun_classes = []   # classes of co-running threads that are
+                                  # different from the target thread, each
+                                  # element is a corun_class object
+
+# This class holds the parameters of a class of co-running (middle) threads,
+# e.g., the threads of another service. The rest of the middle threads are 
+# assumed to be the same as the target thread.
+class corun_class:
+    def __init__(self):
+        self.thr_cnt = 0               # number of threads of this class
+        self.params = chnl_params()    # the parameters of one thread of this
+                                       # class; chnl_id and corun_classes are
+                                       # not used
+        self.acc_seqs = dict()         # channel reuse distance of the target
+                                       # thread ==> list of access sequences
+                                       # (accs_one_thread objects) of one 
+                                       # thread of this class
 
 # This class is the about the probability of having another access to the 
 # targeted channel after n consecutive accesses to this channel
@@ -98,6 +135,32 @@ class accs_one_thread:
                              # each case is an access_case object. Sum of all
                              # elements' probability should be 1
     
+# This class is a node of the search tree that generates the access sequences
+# of one middle thread (step 1). Instead of a copy of all previous accesses, a
+# node only links to its parent and keeps the state needed to check its 
+# children in constant time.
+class acc_search_node(object):
+    __slots__ = ("parent",       # parent node; None for the root
+                 "same_chnl",    # whether this access is to the target channel
+                 "forced",       # whether this access is the only valid choice
+                                 # after its parent, i.e., its probability is 1
+                 "depth",        # number of accesses from the root to here
+                 "last_acc_pos", # position of the last target channel access;
+                                 # -1 if there is none
+                 "run_type",     # type of the current run of consecutive 
+                                 # accesses: True for target channel, False
+                                 # for other channels, None at the root
+                 "run_len")      # length of the current run
+
+    def __init__(self, parent, same_chnl, depth, last_acc_pos, run_type,
+                 run_len):
+        self.parent = parent
+        self.same_chnl = same_chnl
+        self.forced = False
+        self.depth = depth
+        self.last_acc_pos = last_acc_pos
+        self.run_type = run_type
+        self.run_len = run_len
 
 # This class fully lists all possible memory access cases. No simplification is
 # made.
@@ -120,3 +183,93 @@ class hmc_ratios:
         self.hit = 0.0
         self.miss = 0.0
         self.conflict = 0.0
+
+# This class is the compiled, read-only view of a thread_info object (plus the
+# timing options from the command line and the consecutive-access tables) that
+# is consumed by all four steps of the model. It is built once, right after the
+# parameter file is parsed, so that the per-case code never has to search the
+# channel reuse distances or recompute the timing frames.
+# It has the same field names as thread_info, so it can be passed wherever a
+# thread_info object is only read.
+class model_context(object):
+    __slots__ = ("chnl_prob",          # see thread_info
+                 "bank_prob",          # see thread_info
+                 "row_prob",           # see thread_info
+                 "chnl_reuse_dists",   # tuple of the chnl_reuse_dist_info 
+                                       # objects of thread_info, in file order
+                 "reuse_dist_index",   # dict: acc_dist ==> (prob, hit_prob,
+                                       # miss_prob, conf_prob)
+                 "reorder_time",       # see thread_info
+                 "autoclose_time",     # see thread_info
+                 "est_serv_time",      # see thread_info
+                 "half_reorder",       # see thread_info
+                 "auto_close_frame",   # number of accesses that can be served
+                                       # before a row buffer is auto-closed
+                 "reorder_frame",      # number of accesses that can be served
+                                       # within the reordering timespan
+                 "acc_prob",           # float version of 
+                                       # consecutive_acc_probs.acc_prob
+                 "acc_switch_prob",    # acc_switch_prob[n] = 1 - acc_prob[n]
+                 "noacc_prob",         # float version of 
+                                       # consecutive_noacc_probs.noacc_prob
+                 "noacc_switch_prob",  # noacc_switch_prob[n] = 1-noacc_prob[n]
+                 "exact")              # whether the four tables above keep
+                                       # the Fraction values, and the access
+                                       # sequences are priced one at a time
+                                       # as in the original implementation
+                                       # (the slow reference); the other
+                                       # probabilities are floats, so the
+                                       # results are floats either way
+
+    # Inputs:
+    #       thr_info: see thread_info class; timing options already filled in
+    #       con_acc_probs: see consecutive_acc_probs class
+    #       con_noacc_probs: see consecutive_noacc_probs class
+    #       exact: keep the consecutive-access tables as Fractions, and use
+    #              the original per-sequence computation (see price_acc_seqs)
+    def __init__(self, thr_info, con_acc_probs, con_noacc_probs, exact=False):
+        init = object.__setattr__
+        init(self, "chnl_prob", thr_info.chnl_prob)
+        init(self, "bank_prob", thr_info.bank_prob)
+        init(self, "row_prob", thr_info.row_prob)
+        init(self, "chnl_reuse_dists", tuple(thr_info.chnl_reuse_dists))
+        index = dict()
+        for ch_dist in thr_info.chnl_reuse_dists:
+            index[ch_dist.acc_dist] = (ch_dist.prob, ch_dist.hit_prob,
+                                       ch_dist.miss_prob, ch_dist.conf_prob)
+        init(self, "reuse_dist_index", index)
+        init(self, "reorder_time", thr_info.reorder_time)
+        init(self, "autoclose_time", thr_info.autoclose_time)
+        init(self, "est_serv_time", thr_info.est_serv_time)
+        init(self, "half_reorder", thr_info.half_reorder)
+
+        # with a zero service time, every access is within both frames
+        if thr_info.est_serv_time != 0.0:
+            init(self, "auto_close_frame", 
+                 int(math.floor(thr_info.autoclose_time/
+                                thr_info.est_serv_time)))
+            init(self, "reorder_frame", 
+                 int(math.floor(thr_info.reorder_time/
+                                thr_info.est_serv_time)))
+        else:
+            init(self, "auto_close_frame", sys.maxint)
+            init(self, "reorder_frame", sys.maxint)
+
+        # the complements are taken before converting to float, so that they
+        # are exactly the values the Fraction arithmetic used to produce
+        if exact:
+            conv = lambda p: p
+        else:
+            conv = float
+        init(self, "acc_prob", 
+             tuple([conv(p) for p in con_acc_probs.acc_prob]))
+        init(self, "acc_switch_prob", 
+             tuple([conv(1 - p) for p in con_acc_probs.acc_prob]))
+        init(self, "noacc_prob", 
+             tuple([conv(p) for p in con_noacc_probs.noacc_prob]))
+        init(self, "noacc_switch_prob", 
+             tuple([conv(1 - p) for p in con_noacc_probs.noacc_prob]))
+        init(self, "exact", exact)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("model_context is read-only")
@@ -0,0 +1,486 @@
+# This file contains functions for reading the parameter file and running the
+# four steps of the hit/miss/conflict ratio model. It is used by run_model.py,
+# and can be used by other scripts that need to run the model many times in
+# one process.
+#
+# A parameter file may describe several target channels. Each channel starts
+# with a line "c: <channel id>", followed by the "t", "a", "ca", "cn", "mt" and
+# "mn" lines of this channel. A file without any "c" line describes one
+# channel, whose id is 0.
+#
+# The middle threads of a channel may belong to several classes of co-runners
+# (e.g., other services). A class starts with a line "g: <thread count>" in the
+# section of the channel, followed by the "t", "a", "ca", "cn", "mt" and "mn" 
+# lines of one thread of this class. The middle threads that are not in any
+# class are the same as the target thread. See corun_gen.py.
+#
+
+import os
+import sys
+import StringIO
+
+import acc_gen
+import inter_pat_gen
+import hmc_ratios_gen
+import corun_gen
+
+from mem_model_types import *
+
+from fractions import *
+
+# Read a parameter file.
+# Inputs:
+#       filename: path to the parameter file
+#       thr_info: a thread_info object with the timing parameters filled in;
+#                 one chnl_params object is appended to thr_info.chnls for
+#                 every channel in the file
+# Return:
+#       thr_info.chnls
+def parse_param_file(filename, thr_info):
+    f = open(filename, "r")
+
+    chnl = None
+    params = None # the chnl_params object the following lines belong to
+    for line in f:
+        if line.isspace():
+            continue
+        elif line.startswith("#"):
+            continue
+
+        if line.startswith("c:"):
+            chnl = new_chnl_params(thr_info,
+                                   int(line.strip("\n").split(":")[1]))
+            params = chnl
+            continue
+        if chnl is None: # a file without "c" lines
+            chnl = new_chnl_params(thr_info, 0)
+            params = chnl
+        if line.startswith("g:"):
+            cls = new_corun_class(thr_info, chnl,
+                                  int(line.strip("\n").split(":")[1]))
+            params = cls.params
+            continue
+        chnl_thr_info = params.thr_info
+
+        if line.startswith("t:"):
+            temp = line.strip("\n").split(":")[1].split(",")
+            chnl_thr_info.chnl_prob = float(temp[0])
+            chnl_thr_info.bank_prob = float(temp[1])
+            chnl_thr_info.row_prob = float(temp[2])
+            params.min_con_acc = int(temp[3])
+            params.min_con_noacc = int(temp[4])
+        elif line.startswith("a:"):
+            temp = line.strip("\n").split(":")[1].split(",")
+            chnl_dist = chnl_reuse_dist_info()
+            chnl_dist.acc_dist = int(temp[0])
+            chnl_dist.prob = float(temp[1])
+            chnl_dist.hit_prob = float(temp[2])
+            chnl_dist.miss_prob = float(temp[3])
+            chnl_dist.conf_prob = float(temp[4])
+            chnl_thr_info.chnl_reuse_dists.append(chnl_dist)
+        elif line.startswith("ca:"):
+            temp = line.strip("\n").split(":")[1].split(",")
+            for t in temp:
+                vals = t.split("/")
+                params.con_acc_probs.acc_prob.append(Fraction(int(vals[0]),
+                                                              int(vals[1])))
+        elif line.startswith("cn:"):
+            temp = line.strip("\n").split(":")[1].split(",")
+            for t in temp:
+                vals = t.split("/")
+                params.con_noacc_probs.noacc_prob.append(
+                    Fraction(int(vals[0]), int(vals[1])))
+        elif line.startswith("mt:"):
+            temp = line.strip("\n").split(":")
+            params.min_con_acc = int(temp[1])
+        elif line.startswith("mn:"):
+            temp = line.strip("\n").split(":")
+            params.min_con_noacc = int(temp[1])
+        else:
+            print "Unknown line form input file:", line
+            exit(-1)
+
+    f.close()
+
+    return thr_info.chnls
+
+# Create the parameters of a new channel, with the timing parameters of
+# thr_info, and append it to thr_info.chnls
+def new_chnl_params(thr_info, chnl_id):
+    chnl = chnl_params()
+    chnl.chnl_id = chnl_id
+    chnl.thr_info.autoclose_time = thr_info.autoclose_time
+    chnl.thr_info.reorder_time = thr_info.reorder_time
+    chnl.thr_info.est_serv_time = thr_info.est_serv_time
+    chnl.thr_info.half_reorder = thr_info.half_reorder
+    thr_info.chnls.append(chnl)
+
+    return chnl
+
+# Create the parameters of a new co-runner class of a channel, with the timing
+# parameters of thr_info, and append it to chnl.corun_classes
+def new_corun_class(thr_info, chnl, thr_cnt):
+    cls = corun_class()
+    cls.thr_cnt = thr_cnt
+    cls.params.chnl_id = chnl.chnl_id
+    cls.params.thr_info.autoclose_time = thr_info.autoclose_time
+    cls.params.thr_info.reorder_time = thr_info.reorder_time
+    cls.params.thr_info.est_serv_time = thr_info.est_serv_time
+    cls.params.thr_info.half_reorder = thr_info.half_reorder
+    chnl.corun_classes.append(cls)
+
+    return cls
+
+# Print the parameters of a channel
+def log_chnl_params(chnl):
+    print "Inputs from configuration file, channel", chnl.chnl_id, ":"
+    log_params(chnl, "    ")
+    for cls in chnl.corun_classes:
+        print "    Co-runner class of", cls.thr_cnt, "threads:"
+        log_params(cls.params, "        ")
+
+# Print the parameters of a chnl_params object, each line starts with "indent"
+def log_params(params, indent):
+    thr_info = params.thr_info
+    print indent + "Thread info, chnl_prob:", thr_info.chnl_prob
+    print indent + "Thread info, bank_prob:", thr_info.bank_prob
+    print indent + "Thread info, row_prob:", thr_info.row_prob
+    print indent + "Thread info, reorder time:", thr_info.reorder_time
+    print indent + "Thread info, auto-close:", thr_info.autoclose_time
+    print indent + "Thread info, est. time:", thr_info.est_serv_time
+    print indent + "Thread info, half_reorder:", thr_info.half_reorder
+    for chnl_dist in thr_info.chnl_reuse_dists:
+        print indent + "Channel reuse dist", chnl_dist.acc_dist
+        print indent + "    prob:", chnl_dist.prob
+        print indent + "    hit_prob:", chnl_dist.hit_prob
+        print indent + "    miss_prob:", chnl_dist.miss_prob
+        print indent + "    conf_prob:", chnl_dist.conf_prob
+    print indent + "Con-acc-probs:", params.con_acc_probs.acc_prob
+    print indent + "Con-noacc-probs:", params.con_noacc_probs.noacc_prob
+    print indent + "min_con_acc:", params.min_con_acc
+    print indent + "min_con_noacc:", params.min_con_noacc
+
+# Run the four steps of the model for one channel.
+# Inputs:
+#       ctx: the model_context object of this channel
+#       chnl: the chnl_params object of this channel
+#       thread_cnt: how many threads to process
+#       steps: the version of each of the four steps, a list of four integers
+#       debug: whether enable debug output or not
+# Return:
+#       hmc_ratios object
+def run_steps(ctx, chnl, thread_cnt, steps, debug):
+    if len(chnl.corun_classes) != 0:
+        corun_gen.get_own_thread_cnt(chnl, thread_cnt)
+
+    run_steps_1_2(ctx, chnl, steps, debug)
+
+    return run_steps_3_4(ctx, chnl, thread_cnt, steps, debug)
+
+# Run step 1 and 2 of the model for one channel. These steps generate the
+# access sequences of one middle thread, so they do not depend on the number
+# of threads, and their results can be used by step 3 and 4 for any number of
+# threads.
+# Inputs:
+#       ctx, chnl, steps, debug: see run_steps
+def run_steps_1_2(ctx, chnl, steps, debug):
+    con_acc_probs = chnl.con_acc_probs
+    con_noacc_probs = chnl.con_noacc_probs
+    min_con_acc = chnl.min_con_acc
+    min_con_noacc = chnl.min_con_noacc
+    thread_cnt = 0 # not used by step 1
+
+    # model contexts of the co-runner classes
+    cls_ctxs = []
+    for cls in chnl.corun_classes:
+        cls_ctxs.append(model_context(cls.params.thr_info,
+                                      cls.params.con_acc_probs,
+                                      cls.params.con_noacc_probs, ctx.exact))
+    if len(cls_ctxs) != 0:
+        if (steps[2] not in (2, 3)) or (steps[3] not in (2, 3)):
+            print "Only version 2 and 3 of step 3 and 4 support co-runner",
+            print "classes"
+            exit(62)
+
+    print "Step 1"
+    # step 1
+    if (steps[0] == 1) or (steps[0] == 2):
+        acc_gen.gen_full_acc_seq_1thr_all(ctx, con_acc_probs,
+                                          con_noacc_probs, thread_cnt,
+                                          min_con_acc, min_con_noacc, debug)
+    elif (steps[0] == 3):
+        acc_gen.gen_acc_seq_1thr_all_v3(ctx, con_acc_probs,
+                                        con_noacc_probs,
+                                        thread_cnt, min_con_acc, min_con_noacc,
+                                        debug)
+    elif(steps[0] == 4):
+        acc_gen.gen_acc_seq_1thr_all_v4(ctx, con_acc_probs,
+                                        con_noacc_probs, thread_cnt,
+                                        min_con_acc, min_con_noacc, debug)
+    else:
+        print "Unknown step 1 function version:", steps[0]
+        exit(61)
+    for (cls, cls_ctx) in zip(chnl.corun_classes, cls_ctxs):
+        cls.acc_seqs = corun_gen.gen_thread_acc_seqs(ctx.chnl_reuse_dists,
+                                                     cls.params, cls_ctx,
+                                                     steps[0], debug)
+
+    # step 2
+    print "Step 2"
+    if (steps[1] == 1) or (steps[1] == 2):
+        inter_pat_gen.gen_acc_seq_stats_all(ctx, debug)
+    elif (steps[1] == 3):
+        inter_pat_gen.gen_acc_seq_stats_all_v3(ctx, debug)
+    else:
+        print "Unknown step 2 function version:", steps[1]
+        exit(61)
+    for (cls, cls_ctx) in zip(chnl.corun_classes, cls_ctxs):
+        corun_gen.gen_thread_acc_seq_stats(cls.acc_seqs, cls_ctx, steps[1],
+                                           debug)
+
+    return
+
+# Run step 3 and 4 of the model for one channel, after run_steps_1_2.
+# Inputs and return value are the same as run_steps.
+def run_steps_3_4(ctx, chnl, thread_cnt, steps, debug):
+    inter_pat_groups = run_step_3(ctx, chnl, thread_cnt, steps, debug)
+
+    # step 4
+    print "Step 4"
+    if (steps[3] == 2):
+        hmc = hmc_ratios_gen.gen_hmc_v2_all_inter_pat_group(inter_pat_groups,
+                                                            ctx, debug)
+    elif (steps[3] == 3):
+        hmc = hmc_ratios_gen.gen_hmc_v3_all_inter_pat_group(inter_pat_groups,
+                                                            ctx, debug)
+    elif (steps[3] == 1):
+        hmc = hmc_ratios_gen.gen_hmc_v1_all_inter_pat_group(inter_pat_groups,
+                                                            ctx, debug)
+    else:
+        print "Unknown step 4 function version:", steps[3]
+        exit(61)
+
+    return hmc
+
+# Run step 3 of the model for one channel, after run_steps_1_2. Step 3 does not
+# depend on the timing options (auto-close, reorder and service time), only 
+# step 4 does.
+# Inputs:
+#       ctx, chnl, thread_cnt, steps, debug: see run_steps
+# Return:
+#       groups of interference patterns, one group for each channel reuse
+#       distance
+def run_step_3(ctx, chnl, thread_cnt, steps, debug):
+    con_acc_probs = chnl.con_acc_probs
+    con_noacc_probs = chnl.con_noacc_probs
+    min_con_acc = chnl.min_con_acc
+    min_con_noacc = chnl.min_con_noacc
+
+    # step 3
+    print "Step 3"
+    if len(chnl.corun_classes) != 0:
+        # versions 2 and 3 are the same with co-runner classes
+        inter_pat_groups = corun_gen.gen_inter_pat_groups(ctx, chnl,
+                                                          thread_cnt,
+                                                          steps[3] == 3,
+                                                          debug)
+    elif (steps[2] == 1):
+        inter_pat_groups = acc_gen.gen_acc_seq_v1_full(ctx,
+                                                       con_acc_probs,
+                                                       con_noacc_probs,
+                                                       thread_cnt,
+                                                       min_con_acc,
+                                                       min_con_noacc,
+                                                       debug)
+    elif (steps[2] == 2):
+        inter_pat_groups = acc_gen.gen_acc_seq_v2_full_comb(ctx,
+                                                            con_acc_probs,
+                                                            con_noacc_probs,
+                                                            thread_cnt,
+                                                            min_con_acc,
+                                                            min_con_noacc,
+                                                            debug)
+    elif (steps[2] == 3):
+        inter_pat_groups = acc_gen.gen_acc_seq_v3_full_comb(ctx,
+                                                            con_acc_probs,
+                                                            con_noacc_probs,
+                                                            thread_cnt,
+                                                            min_con_acc,
+                                                            min_con_noacc,
+                                                            debug)
+    else:
+        print "Unknown step 3 function version:", steps[2]
+        exit(61)
+
+    return inter_pat_groups
+
+# Run the model for every channel of thr_info.
+# Inputs:
+#       thr_info: thread_info object, with thr_info.chnls filled in
+#       thread_cnt: how many threads to process
+#       steps: the version of each of the four steps, a list of four integers
+#       exact: see model_context class
+#       debug: whether enable debug output or not
+# Return:
+#       a list of (channel id, hmc_ratios object), in the order of
+#       thr_info.chnls
+def run_all_chnls(thr_info, thread_cnt, steps, exact, debug):
+    results = []
+    for chnl in thr_info.chnls:
+        ctx = model_context(chnl.thr_info, chnl.con_acc_probs,
+                            chnl.con_noacc_probs, exact)
+        hmc = run_steps(ctx, chnl, thread_cnt, steps, debug)
+        results.append((chnl.chnl_id, hmc))
+
+    return results
+
+# Run the model for every channel of thr_info, and for several numbers of
+# threads. Step 1 and 2 are run only once for each channel.
+# Inputs:
+#       thr_info: thread_info object, with thr_info.chnls filled in
+#       thread_cnts: a list of the numbers of threads to process
+#       steps, exact, debug: see run_all_chnls
+# Return:
+#       a list of (channel id, list of hmc_ratios objects, one for each 
+#       element of thread_cnts), in the order of thr_info.chnls
+def run_all_chnls_threads(thr_info, thread_cnts, steps, exact, debug):
+    results = []
+    for chnl in thr_info.chnls:
+        ctx = model_context(chnl.thr_info, chnl.con_acc_probs,
+                            chnl.con_noacc_probs, exact)
+        if len(chnl.corun_classes) != 0:
+            corun_gen.get_own_thread_cnt(chnl, max(thread_cnts))
+        run_steps_1_2(ctx, chnl, steps, debug)
+        hmcs = []
+        for thread_cnt in thread_cnts:
+            hmcs.append(run_steps_3_4(ctx, chnl, thread_cnt, steps, debug))
+        results.append((chnl.chnl_id, hmcs))
+
+    return results
+
+# Run a function without the progress output of the model, which is printed
+# to the standard output. The output is kept in memory, and written to the
+# standard error if the model exits on an error, so the error is not lost.
+# Inputs:
+#       quiet: whether to drop the progress output; if False, func is run as is
+#       func: the function to run
+#       args: the arguments of func
+# Return:
+#       the return value of func
+def run_quiet(quiet, func, *args):
+    if not quiet:
+        return func(*args)
+
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        return func(*args)
+    except SystemExit:
+        stdout.flush()
+        sys.stderr.write(sys.stdout.getvalue())
+        raise
+    finally:
+        sys.stdout = stdout
+
+# Load all parameter files in a directory.
+# Inputs:
+#       profile_dir: the directory
+#       thr_info: a thread_info object with the timing parameters filled in
+# Return:
+#       a list of (application name, chnl_params object), sorted by name
+def load_profiles(profile_dir, thr_info):
+    profiles = []
+    for filename in sorted(os.listdir(profile_dir)):
+        path = os.path.join(profile_dir, filename)
+        if filename.startswith(".") or (not os.path.isfile(path)):
+            continue
+        app_info = thread_info()
+        app_info.autoclose_time = thr_info.autoclose_time
+        app_info.reorder_time = thr_info.reorder_time
+        app_info.est_serv_time = thr_info.est_serv_time
+        app_info.half_reorder = thr_info.half_reorder
+        chnls = parse_param_file(path, app_info)
+        if len(chnls) == 0:
+            print "No parameters in", path
+            exit(-1)
+        if len(chnls[0].corun_classes) != 0:
+            print "Co-runner classes are not allowed in", path
+            exit(-1)
+        profiles.append((os.path.splitext(filename)[0], chnls[0]))
+
+    return profiles
+
+# Generate the distribution of one thread of every application, for the
+# channel reuse distances of all applications (steps 1 and 2).
+# Inputs:
+#       profiles: the list returned by load_profiles
+#       steps: the version of each of the four steps, a list of four integers
+#       exact: see model_context class
+#       debug: whether enable debug output or not
+# Return:
+#       (list of model_context objects, list of distributions), one element
+#       for each application. A distribution is a dict: channel reuse
+#       distance ==> distribution of one thread (see corun_gen.gen_acc_dist)
+def gen_profile_dists(profiles, steps, exact, debug):
+    ch_dists = dict() # channel reuse distance ==> chnl_reuse_dist_info
+    for (name, chnl) in profiles:
+        for ch_dist in chnl.thr_info.chnl_reuse_dists:
+            ch_dists.setdefault(ch_dist.acc_dist, ch_dist)
+    ch_dists = [ch_dists[d] for d in sorted(ch_dists)]
+
+    ctxs = []
+    dists = []
+    for (name, chnl) in profiles:
+        print "Generating access sequences of", name
+        ctx = model_context(chnl.thr_info, chnl.con_acc_probs,
+                            chnl.con_noacc_probs, exact)
+        acc_seqs = corun_gen.gen_thread_acc_seqs(ch_dists, chnl, ctx, steps[0],
+                                                 debug)
+        corun_gen.gen_thread_acc_seq_stats(acc_seqs, ctx, steps[1], debug)
+
+        dist = dict()
+        for (acc_dist, seqs) in acc_seqs.iteritems():
+            dist[acc_dist] = corun_gen.gen_acc_dist(seqs, steps[3] == 3)
+        ctxs.append(ctx)
+        dists.append(dist)
+
+    return (ctxs, dists)
+
+# Predict the HMC ratios of an application co-running with other applications
+# (and other threads of its own), using the distributions generated by 
+# gen_profile_dists.
+# Inputs:
+#       target: index of the target application
+#       thr_cnts: dict: index of an application ==> number of its threads,
+#                 including the target thread
+#       ctxs, dists: returned by gen_profile_dists
+#       steps: the version of each of the four steps, a list of four integers
+#       debug: whether enable debug output or not
+# Return:
+#       hmc_ratios object
+def run_corun(target, thr_cnts, ctxs, dists, steps, debug):
+    ctx = ctxs[target]
+    thread_cnt = sum(thr_cnts.itervalues())
+
+    # the middle threads, for each channel reuse distance of the target
+    group_dists = []
+    for ch_dist in ctx.chnl_reuse_dists:
+        group = []
+        for app in sorted(thr_cnts):
+            thr_cnt = thr_cnts[app]
+            if app == target:
+                thr_cnt -= 1
+            group.append((dists[app][ch_dist.acc_dist], thr_cnt))
+        group_dists.append(group)
+
+    inter_pat_groups = corun_gen.conv_inter_pat_groups(ctx, group_dists,
+                                                       thread_cnt,
+                                                       steps[3] == 3, debug)
+    if steps[3] == 2:
+        hmc = hmc_ratios_gen.gen_hmc_v2_all_inter_pat_group(inter_pat_groups,
+                                                            ctx, debug)
+    else:
+        hmc = hmc_ratios_gen.gen_hmc_v3_all_inter_pat_group(inter_pat_groups,
+                                                            ctx, debug)
+
+    return hmc
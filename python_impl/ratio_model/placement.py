@@ -0,0 +1,343 @@
+#!/usr/bin/python
+
+# This script searches for a placement of jobs onto memory channels that
+# minimizes the predicted memory latency, or maximizes the predicted memory
+# bandwidth, of all jobs.
+#
+# Each job runs one application, whose parameter file is in a profile
+# directory (see corun_matrix.py), with a number of threads. The jobs are
+# listed in a job file, one job per line:
+#     <application name> <thread count>
+# Lines started with "#" are comments. All threads of a job are placed on the
+# same channel, and the threads on a channel can not exceed its capacity.
+#
+# The cost of a channel is computed with the co-runner model (see
+# corun_gen.py) and the latency model, for every application on it. The
+# channels are identical, so the cost only depends on the multiset of
+# (application, thread count) on a channel, and it is cached with this
+# multiset as the key. A placement is first built greedily, by putting the
+# largest jobs first, each on the channel where it increases the cost least.
+# Then the placement is improved by local search: moving a job to another
+# channel, or swapping two jobs on different channels, until no move or swap
+# reduces the cost.
+#
+# Latency objective: the cost of a channel is the sum of the final latency of
+# every thread on it. Bandwidth objective: the cost is the negative bandwidth
+# of the channel (see latency_model.latency_to_bandwidth), averaged over the 
+# final latencies of the threads on it.
+#
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+import model_runner
+
+from mem_model_types import *
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                             "latency_model"))
+import latency_model
+
+parser = OptionParser()
+parser.add_option("-p", "--profiles", dest="profile_dir", help="Directory of "
+                  + "the parameter files of the applications",
+                  metavar="PROFILE_DIR")
+parser.add_option("-f", "--jobs", dest="job_file", help="Path to the job " +
+                  "file", metavar="JOBFILE")
+parser.add_option("-c", "--channels", dest="chnl_cnt", help="Number of " +
+                  "channels", metavar="CHANNELS", type="int")
+parser.add_option("-k", "--capacity", dest="capacity", help="Maximum number " +
+                  "of threads on a channel", metavar="CAPACITY", type="int")
+parser.add_option("-m", "--objective", dest="objective", help="latency or " +
+                  "bandwidth; default latency", metavar="OBJECTIVE",
+                  type="string", default="latency")
+parser.add_option("-i", "--issue_time", dest="issue_time", help="Memory " +
+                  "issue time for a single thread, in nanoseconds",
+                  metavar="ISSUE_TIME", type="float")
+# timing constants of the latency model, same as gen_latencies.py
+latency_model.add_machine_options(parser)
+parser.add_option("--line", dest="line_size", help="Bytes transferred by " +
+                  "one memory access; default 64", metavar="LINE_SIZE",
+                  type="int", default=64)
+parser.add_option("--iters", dest="max_iters", help="Maximum number of " +
+                  "local search iterations; default 1000", metavar="ITERS",
+                  type="int", default=1000)
+parser.add_option("-o", "--timeout", dest="timeout", help="Time in nanoseconds "
+                  + "before a bank auto-close; 0 means no auto-close",
+                  metavar="TIEMOUT", type="float", default=0.0)
+parser.add_option("-r", "--reorder", dest="reorder", help="Maximum timespan " +
+                  "allowed for reordering: 0 means no reordering",
+                  metavar="REORDER", type="float", default=0.0)
+parser.add_option("-e", "--esttime", dest="est_serv_time", help="Estimated " +
+                  "service time for memory request, in nanoseconds",
+                  metavar="EST_TIME", type="float", default=0.0)
+parser.add_option("--half", dest="half_reorder", help="Whether " +
+                  "half reordered misses/conflicts remains misses/conflicts ",
+                  action="store_true", default=False)
+parser.add_option("-s", "--steps", dest="steps", help="The version of " +
+                  "each of the four steps; comma separate list of four " +
+                  "integers; step 3 and 4 should be version 2 or 3; " +
+                  "default 3,3,3,3", metavar="V,V,V,V", type="string",
+                  default="3,3,3,3")
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+# Cache of the channel costs: key (see get_chnl_key) ==> (cost, dict:
+# application index ==> final latency)
+chnl_cost_cache = dict()
+
+# Minimum reduction of the cost for local search to apply a change
+MIN_GAIN = 1e-9
+
+# Read the job file.
+# Inputs:
+#       filename: path to the job file
+#       names: dict: application name ==> application index
+# Return:
+#       a list of (application index, thread count), one for each job
+def parse_job_file(filename, names):
+    jobs = []
+    f = open(filename, "r")
+    for line in f:
+        if line.isspace() or line.startswith("#"):
+            continue
+        temp = line.split()
+        if temp[0] not in names:
+            print "Unknown application in job file:", temp[0]
+            exit(-1)
+        jobs.append((names[temp[0]], int(temp[1])))
+    f.close()
+
+    return jobs
+
+# Get the cache key of a channel: the sorted tuple of (application index,
+# thread count), with the threads of the same application added up
+# Inputs:
+#       chnl_jobs: indices of the jobs on the channel
+def get_chnl_key(chnl_jobs):
+    thr_cnts = dict()
+    for j in chnl_jobs:
+        (app, thr_cnt) = jobs[j]
+        thr_cnts[app] = thr_cnts.get(app, 0) + thr_cnt
+
+    return tuple(sorted(thr_cnts.iteritems()))
+
+# Get the cost of a channel, see the comments at the beginning of this file
+# Inputs:
+#       key: the key returned by get_chnl_key
+# Return:
+#       the cost
+def get_chnl_cost(key):
+    if key in chnl_cost_cache:
+        return chnl_cost_cache[key][0]
+    if len(key) == 0:
+        chnl_cost_cache[key] = (0.0, dict())
+        return 0.0
+
+    thr_cnts = dict(key)
+    thread_cnt = sum(thr_cnts.itervalues())
+    cost = 0.0
+    lats = dict()
+    for app in thr_cnts:
+        # the model prints its progress; keep it only for debugging
+        hmc = model_runner.run_quiet(not options.debug, model_runner.run_corun,
+                                     app, thr_cnts, profile_ctxs,
+                                     profile_dists, steps, options.debug)
+        result = latency_model.compute_machine_latency(hmc.hit, hmc.miss,
+                                                       hmc.conflict,
+                                                       options.issue_time,
+                                                       thread_cnt, 0.0,
+                                                       options, options.debug)
+        lat = result["final_lat"]
+        lats[app] = lat
+        if options.objective == "latency":
+            cost += thr_cnts[app] * lat
+        else:
+            cost -= (float(thr_cnts[app]) / thread_cnt *
+                     latency_model.latency_to_bandwidth(lat, 
+                                                        options.line_size))
+
+    chnl_cost_cache[key] = (cost, lats)
+
+    return cost
+
+# Place the jobs greedily, largest jobs first.
+# Return:
+#       a list of lists, the indices of the jobs on each channel
+def greedy_place():
+    placement = [[] for c in range(options.chnl_cnt)]
+    loads = [0] * options.chnl_cnt
+    order = sorted(range(len(jobs)), key=lambda j: jobs[j][1], reverse=True)
+    for j in order:
+        best_chnl = -1
+        best_delta = 0.0
+        for c in range(options.chnl_cnt):
+            if loads[c] + jobs[j][1] > options.capacity:
+                continue
+            delta = (get_chnl_cost(get_chnl_key(placement[c] + [j])) -
+                     get_chnl_cost(get_chnl_key(placement[c])))
+            if (best_chnl == -1) or (delta < best_delta):
+                best_chnl = c
+                best_delta = delta
+        if best_chnl == -1:
+            print "Job", j, "does not fit in any channel"
+            exit(19)
+        placement[best_chnl].append(j)
+        loads[best_chnl] += jobs[j][1]
+
+    return placement
+
+# Improve a placement by moving and swapping jobs, see the comments at the
+# beginning of this file. Each iteration applies the move or swap that reduces
+# the cost most. Changes that reduce the cost by less than MIN_GAIN are 
+# rounding errors, and are ignored.
+# Input:
+#       placement: returned by greedy_place; changed in place
+# Return:
+#       (number of iterations, number of candidate placements evaluated)
+def local_search(placement):
+    cand_cnt = 0
+    for it in range(options.max_iters):
+        costs = [get_chnl_cost(get_chnl_key(p)) for p in placement]
+        loads = [sum([jobs[j][1] for j in p]) for p in placement]
+        best = None
+        best_delta = -MIN_GAIN
+        for c1 in range(options.chnl_cnt):
+            for j1 in placement[c1]:
+                rest1 = [j for j in placement[c1] if j != j1]
+                for c2 in range(options.chnl_cnt):
+                    if c2 == c1:
+                        continue
+                    # move j1 to c2
+                    if loads[c2] + jobs[j1][1] <= options.capacity:
+                        cand_cnt += 1
+                        delta = (get_chnl_cost(get_chnl_key(rest1)) +
+                                 get_chnl_cost(get_chnl_key(placement[c2] +
+                                                            [j1])) -
+                                 costs[c1] - costs[c2])
+                        if delta < best_delta:
+                            best = (c1, j1, c2, None)
+                            best_delta = delta
+                    # swap j1 with a job j2 of c2
+                    if c2 < c1:
+                        continue
+                    for j2 in placement[c2]:
+                        if jobs[j1] == jobs[j2]: # same job, nothing changes
+                            continue
+                        if ((loads[c1] - jobs[j1][1] + jobs[j2][1] >
+                             options.capacity) or
+                            (loads[c2] - jobs[j2][1] + jobs[j1][1] >
+                             options.capacity)):
+                            continue
+                        rest2 = [j for j in placement[c2] if j != j2]
+                        cand_cnt += 1
+                        delta = (get_chnl_cost(get_chnl_key(rest1 + [j2])) +
+                                 get_chnl_cost(get_chnl_key(rest2 + [j1])) -
+                                 costs[c1] - costs[c2])
+                        if delta < best_delta:
+                            best = (c1, j1, c2, j2)
+                            best_delta = delta
+
+        if best is None: # local optimum
+            return (it, cand_cnt)
+        (c1, j1, c2, j2) = best
+        placement[c1].remove(j1)
+        placement[c2].append(j1)
+        if j2 is not None:
+            placement[c2].remove(j2)
+            placement[c1].append(j2)
+
+    return (options.max_iters, cand_cnt)
+
+if __name__ == "__main__":
+    (options, args) = latency_model.parse_machine_options(parser)
+
+    if options.profile_dir is None:
+        print "Please specify the profile directory"
+        parser.print_help()
+        exit(-1)
+
+    if options.job_file is None:
+        print "Please specify the job file"
+        parser.print_help()
+        exit(-1)
+
+    if (options.chnl_cnt is None) or (options.capacity is None):
+        print "Please specify the number of channels and their capacity"
+        parser.print_help()
+        exit(-1)
+
+    if options.issue_time is None:
+        print "Please specify the issue time of a single thread."
+        parser.print_help()
+        exit(-1)
+
+    if options.objective not in ("latency", "bandwidth"):
+        print "Unknown objective:", options.objective
+        parser.print_help()
+        exit(-1)
+
+    # parse the function versions
+    steps = [int(n) for n in options.steps.split(',')]
+    if len(steps) != 4:
+        print "Only four function versions are allowed"
+        parser.print_help()
+        exit(-1)
+    if (steps[2] not in (2, 3)) or (steps[3] not in (2, 3)):
+        print "Only version 2 and 3 of step 3 and 4 are supported"
+        exit(62)
+
+    if options.debug is True:
+        print "Options are:"
+        print "    profile directory: ", options.profile_dir
+        print "    job file: ", options.job_file
+        print "    channels: ", options.chnl_cnt
+        print "    channel capacity: ", options.capacity
+        print "    objective: ", options.objective
+        print "    issue time: ", options.issue_time
+        print "    machine profile: ", options.machine
+        print "    line size: ", options.line_size
+        print "    local search iterations: ", options.max_iters
+        print "    reorder time: ", options.reorder
+        print "    auto-close time: ", options.timeout
+        print "    estimate service time: ", options.est_serv_time
+        print "    half conflict reordering: ", options.half_reorder
+        print "    function versions: ", steps
+        print "    debug: ", options.debug
+
+    thr_info = thread_info()
+    thr_info.autoclose_time = options.timeout
+    thr_info.reorder_time = options.reorder
+    thr_info.est_serv_time = options.est_serv_time
+    thr_info.half_reorder = options.half_reorder
+
+    profiles = model_runner.load_profiles(options.profile_dir, thr_info)
+    names = dict()
+    for (idx, (name, chnl)) in enumerate(profiles):
+        names[name] = idx
+    jobs = parse_job_file(options.job_file, names)
+
+    (profile_ctxs, profile_dists) = model_runner.gen_profile_dists(
+        profiles, steps, False, options.debug)
+
+    start = time.time()
+    placement = greedy_place()
+    greedy_cost = sum([get_chnl_cost(get_chnl_key(p)) for p in placement])
+    (iters, cand_cnt) = local_search(placement)
+    final_cost = sum([get_chnl_cost(get_chnl_key(p)) for p in placement])
+    elapsed = time.time() - start
+
+    print "Greedy cost:", greedy_cost, ", final cost:", final_cost,
+    print ", local search iterations:", iters
+    print "Candidate placements:", cand_cnt, ", evaluated channels:",
+    print len(chnl_cost_cache), ", in", elapsed, "seconds"
+    for (c, p) in enumerate(placement):
+        lats = chnl_cost_cache[get_chnl_key(p)][1]
+        print "Channel", c, ":",
+        for j in sorted(p):
+            (app, thr_cnt) = jobs[j]
+            print "job", j, "(" + profiles[app][0] + ",", thr_cnt,
+            print "threads, latency", str(lats[app]) + ")",
+        print
@@ -0,0 +1,398 @@
+# This file contains a row buffer simulator for checking the predictions of
+# the model. The accesses of several threads are interleaved round-robin (one
+# access of every thread in each slot, the same assumption as step 3), and the
+# hit/miss/conflict outcome of every access is decided the same way as version
+# 1 of step 4 (see gen_hmc_full_inter_pat_w_org_acc), counting time as the
+# number of accesses to the channel times the estimated service time:
+#     - an access to a bank without any previous access is a miss
+#     - if the last access to the bank is to the same row, the access is a hit,
+#       unless the row has been auto-closed (the time since that access is
+#       larger than the auto-close time); an auto-closed row is a hit if the
+#       access can be reordered (the time is no larger than the reorder time),
+#       and a miss otherwise
+#     - if the last access to the bank is to another row, the access is a hit
+#       if an earlier access to its row can be reordered with it; otherwise,
+#       it is a miss if the row has been auto-closed, and a conflict if not
+# With "half reorder", half of the reordered hits are counted as conflicts.
+# Like the model, reordering does not change the order seen by the following
+# accesses.
+#
+# The outcomes are computed with numpy, a chunk of accesses at a time: the
+# previous access to the same bank and to the same row are found by sorting
+# the accesses of a channel. Only the last access to every bank, and the
+# accesses within the reorder time, are kept between chunks.
+#
+# The accesses come from traces of DRAM addresses (e.g., written by
+# "virtual2dram.py --binary" in tools/address_translation), or are generated
+# from the parameters of a channel by synthetic_stream:
+#     - the lengths of the runs of accesses to the channel and to other
+#       channels follow the "ca" and "cn" tables (see sample_run_lengths)
+#     - an access to the channel is a single-thread hit, miss or conflict with
+#       the probabilities of the "a" line of its channel reuse distance (the
+#       line with the largest distance that is not larger); a hit goes to the
+#       same row as the previous access of the thread, a conflict to another
+#       row of the same bank, and a miss to another bank
+#     - the channel has round(1 / other_thread_hit_same_bank_prob) banks, and
+#       every bank has round(1 / other_thread_hit_same_row_prob) rows shared
+#       by all threads, so that two threads meet in a bank, and in a row of
+#       the same bank, with about these probabilities; with a zero
+#       probability, the banks (rows) of every thread are private
+
+import math
+
+from mem_model_types import *
+
+# numpy is required by the simulator
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# outcomes of an access; a reordered hit is counted separately for "half
+# reorder"
+HIT = 0
+MISS = 1
+CONF = 2
+REORDERED = 3
+
+# The row buffer simulator. Every channel is simulated separately.
+class row_buffer_sim:
+    # Inputs:
+    #       autoclose_time, reorder_time, est_serv_time, half_reorder: see
+    #       thread_info class; est_serv_time should be positive
+    def __init__(self, autoclose_time, reorder_time, est_serv_time,
+                 half_reorder):
+        self.autoclose_time = autoclose_time
+        self.reorder_time = reorder_time
+        self.est_serv_time = est_serv_time
+        self.half_reorder = half_reorder
+        # number of previous accesses of a channel that may be reordered
+        # with an access, plus one for the rounding of the division
+        self.window = int(math.floor(reorder_time / est_serv_time)) + 1
+        self.counts = dict()    # channel id ==> counts of the outcomes
+        self.chnl_pos = dict()  # channel id ==> number of accesses so far
+        self.banks = dict()     # channel id ==> dict: bank ==> (position,
+                                # row) of the last access
+        self.history = dict()   # channel id ==> (banks, rows, positions) of
+                                # the last "window" accesses
+
+    # Simulate a chunk of interleaved accesses.
+    # Inputs:
+    #       chnl: numpy int64 array, the channel id of every access; the
+    #             accesses with negative ids are not simulated
+    #       bank, row: numpy int64 arrays, the bank (in the channel) and the
+    #                  row of every access
+    def add_chunk(self, chnl, bank, row):
+        for c in numpy.unique(chnl).tolist():
+            if c < 0:
+                continue
+            sel = (chnl == c)
+            self.add_chnl_chunk(c, bank[sel], row[sel])
+
+    # Simulate a chunk of the accesses of one channel, see add_chunk.
+    def add_chnl_chunk(self, c, bank, row):
+        n = len(bank)
+        start = self.chnl_pos.get(c, 0)
+        empty = numpy.zeros(0, dtype=numpy.int64)
+        (hbank, hrow, hpos) = self.history.get(c, (empty, empty, empty))
+        h = len(hbank)
+        abank = numpy.concatenate((hbank, bank))
+        arow = numpy.concatenate((hrow, row))
+        apos = numpy.concatenate((hpos, numpy.arange(start, start + n,
+                                                     dtype=numpy.int64)))
+
+        # the previous access to the same bank; the first access of a bank
+        # in this chunk follows the last one of the previous chunks
+        banks = self.banks.setdefault(c, dict())
+        order = numpy.argsort(abank, kind="mergesort")
+        (first, last) = group_bounds(abank[order])
+        prev_pos = numpy.empty_like(apos)
+        prev_row = numpy.empty_like(arow)
+        prev_pos[order[1:]] = apos[order[:-1]]
+        prev_row[order[1:]] = arow[order[:-1]]
+        for (i, b) in zip(order[first].tolist(), abank[order[first]].tolist()):
+            (prev_pos[i], prev_row[i]) = banks.get(b, (-1, -1))
+        for (i, b) in zip(order[last].tolist(), abank[order[last]].tolist()):
+            banks[b] = (int(apos[i]), int(arow[i]))
+
+        # the previous access to the same row, if it is in the window
+        if ((arow.min() >= 0) and (arow.max() < (1 << 47)) and
+            (abank.min() >= 0) and (abank.max() < (1 << 16))):
+            # one 64-bit key sorts faster than two keys
+            order = numpy.argsort((abank << 47) | arow, kind="mergesort")
+        else:
+            order = numpy.lexsort((arow, abank))
+        (first, last) = group_bounds(abank[order], arow[order])
+        prev_row_pos = numpy.empty_like(apos)
+        prev_row_pos[order[1:]] = apos[order[:-1]]
+        prev_row_pos[order[first]] = -1
+
+        # the outcomes of the accesses of this chunk
+        (apos, prev_pos, prev_row, prev_row_pos) = (
+            apos[h:], prev_pos[h:], prev_row[h:], prev_row_pos[h:])
+        est = self.est_serv_time
+        bank_time = (apos - prev_pos) * est
+        closed = bank_time > self.autoclose_time
+        reorder = numpy.where(prev_row == row, bank_time <= self.reorder_time,
+                              (prev_row_pos >= 0) &
+                              ((apos - prev_row_pos) * est <=
+                               self.reorder_time))
+        outcomes = numpy.where(prev_row == row, HIT, CONF)
+        outcomes = numpy.where(closed & (prev_row != row) & ~reorder, MISS,
+                               outcomes)
+        outcomes = numpy.where(closed & (prev_row == row),
+                               numpy.where(reorder, REORDERED, MISS),
+                               outcomes)
+        outcomes = numpy.where((prev_row != row) & reorder, REORDERED,
+                               outcomes)
+        outcomes = numpy.where(prev_pos < 0, MISS, outcomes)
+        counts = numpy.bincount(outcomes, minlength=4)
+        self.counts[c] = self.counts.get(c, 0) + counts
+
+        self.chnl_pos[c] = start + n
+        self.history[c] = (abank[-self.window:], arow[-self.window:],
+                           numpy.concatenate((hpos, apos))[-self.window:])
+
+    # Get the simulated ratios of a channel.
+    # Return:
+    #       (hmc_ratios object, number of accesses)
+    def get_ratios(self, c):
+        hmc = hmc_ratios()
+        counts = self.counts.get(c, numpy.zeros(4, dtype=numpy.int64))
+        total = float(counts.sum())
+        if total == 0:
+            return (hmc, 0)
+        reordered = counts[REORDERED] / total
+        hmc.hit = counts[HIT] / total
+        hmc.miss = counts[MISS] / total
+        hmc.conflict = counts[CONF] / total
+        if self.half_reorder:
+            hmc.hit += reordered / 2
+            hmc.conflict += reordered / 2
+        else:
+            hmc.hit += reordered
+        return (hmc, int(total))
+
+    # Get the ids of the simulated channels.
+    def get_chnls(self):
+        return sorted(self.counts.keys())
+
+# Find the groups of equal values in sorted arrays.
+# Inputs:
+#       keys: one or more sorted numpy arrays of the same length; a group has
+#             the same value in all of them
+# Return:
+#       (first, last): numpy bool arrays, whether an element is the first or
+#       the last of its group
+def group_bounds(*keys):
+    n = len(keys[0])
+    change = numpy.zeros(max(n - 1, 0), dtype=bool)
+    for key in keys:
+        change |= key[1:] != key[:-1]
+    first = numpy.ones(n, dtype=bool)
+    last = numpy.ones(n, dtype=bool)
+    first[1:] = change
+    last[:-1] = change
+    return (first, last)
+
+# Sample the lengths of runs of consecutive accesses from a "ca" or "cn"
+# table. Item n of the table, p(n), is the fraction of the accesses after n
+# accesses of a run that are still in a run, i.e., S(n + 1) / S(n) where
+# S(n) is the sum of max(L - n + 1, 0) over the run lengths L. The number of
+# runs of at least n accesses is S(n) - S(n + 1) = S(n) * (1 - p(n)).
+# Inputs:
+#       table: list of floats, the "ca" or "cn" table; the last item is used
+#              for longer runs
+#       cnt: number of runs
+#       rng: numpy.random.RandomState object
+#       residual: sample the rest of the run after a random access instead,
+#                 whose length is n with a probability proportional to the
+#                 number of runs of at least n accesses
+# Return:
+#       numpy int64 array of the run lengths
+def sample_run_lengths(table, cnt, rng, residual=False):
+    last = max(len(table) - 1, 1)
+    cont = [table[min(n, len(table) - 1)] for n in range(last + 2)]
+    # number of runs of at least n accesses, n from 1 to last + 1, relative
+    # to S(1)
+    at_least = []
+    s = 1.0
+    for n in range(1, last + 2):
+        at_least.append(s * (1 - cont[n]))
+        s *= cont[n]
+    if at_least[0] <= 0:
+        # the runs never end
+        return numpy.zeros(cnt, dtype=numpy.int64) + (1 << 62)
+    # probabilities of the lengths 1 to last, and of the longer runs
+    if residual:
+        probs = at_least[:last]
+        if cont[last] < 1:
+            probs.append(at_least[last] / (1 - cont[last]))
+        else:
+            probs.append(at_least[last])
+    else:
+        probs = [at_least[n] - at_least[n + 1] for n in range(last)]
+        probs.append(at_least[last])
+    cum = numpy.cumsum(numpy.maximum(probs, 0))
+    lengths = numpy.searchsorted(cum, rng.random_sample(cnt) * cum[-1],
+                                 side="right") + 1
+    lengths = numpy.minimum(lengths, last + 1).astype(numpy.int64)
+    longer = (lengths > last)
+    if longer.any():
+        # beyond the table, the runs go on with the probability of its last
+        # item
+        if cont[last] < 1:
+            lengths[longer] = last + rng.geometric(1 - cont[last],
+                                                   longer.sum())
+        else:
+            lengths[longer] = 1 << 62
+    return lengths
+
+# A synthetic stream of the accesses of one thread, generated from the
+# parameters of a channel (see the beginning of this file).
+class synthetic_stream:
+    # Inputs:
+    #       chnl: chnl_params object
+    #       thr_idx: index of the thread, for its private banks and rows
+    #       rng: numpy.random.RandomState object
+    def __init__(self, chnl, thr_idx, rng):
+        thr = chnl.thr_info
+        self.rng = rng
+        self.chnl_id = chnl.chnl_id
+        self.acc_table = [float(p) for p in chnl.con_acc_probs.acc_prob]
+        self.noacc_table = [float(p) for p in chnl.con_noacc_probs.noacc_prob]
+        if (len(self.acc_table) == 0) or (len(self.noacc_table) == 0):
+            print "Channel", chnl.chnl_id, "has no ca or cn line"
+            exit(19)
+        dists = sorted(thr.chnl_reuse_dists, key=lambda d: d.acc_dist)
+        if len(dists) == 0:
+            print "Channel", chnl.chnl_id, "has no channel reuse distance"
+            exit(19)
+        self.dists = numpy.array([d.acc_dist for d in dists])
+        self.hit_probs = numpy.array([d.hit_prob for d in dists])
+        self.miss_probs = numpy.array([d.miss_prob for d in dists])
+
+        if thr.bank_prob > 0:
+            self.bank_cnt = max(int(round(1 / thr.bank_prob)), 1)
+            self.bank_base = 0
+        else:
+            self.bank_cnt = 8
+            self.bank_base = thr_idx * self.bank_cnt
+        if thr.row_prob > 0:
+            self.row_cnt = max(int(round(1 / thr.row_prob)), 1)
+            self.row_base = 0
+        else:
+            self.row_cnt = None
+            self.row_base = thr_idx << 32
+
+        # the current run, the last access to the channel, and its bank and
+        # row; the stream starts at a random access
+        self.target = bool(rng.random_sample() < self.acc_table[0])
+        if self.target:
+            table = self.acc_table
+        else:
+            table = self.noacc_table
+        self.run_left = int(sample_run_lengths(table, 1, rng, True)[0])
+        self.pos = 0
+        self.last_pos = -1
+        self.bank = rng.randint(self.bank_cnt)
+        if self.row_cnt is None:
+            self.row = 0
+        else:
+            self.row = rng.randint(self.row_cnt)
+
+    # Generate the next accesses.
+    # Inputs:
+    #       n: number of accesses
+    # Return:
+    #       (chnl, bank, row): numpy int64 arrays; chnl is the channel id for
+    #       the accesses to the channel, and -1 for the other accesses
+    def next_chunk(self, n):
+        rng = self.rng
+        # the runs: the rest of the current run, then alternating runs of
+        # the two kinds; the lengths are capped at n for the sums
+        vals = []
+        lengths = []
+        total = 0
+        kind = self.target
+        if self.run_left > 0:
+            vals.append(numpy.array([self.target]))
+            lengths.append(numpy.array([self.run_left], dtype=numpy.int64))
+            total += min(self.run_left, n)
+            kind = not self.target
+        while total < n:
+            cnt = 64
+            acc = sample_run_lengths(self.acc_table, cnt, rng)
+            noacc = sample_run_lengths(self.noacc_table, cnt, rng)
+            if kind:
+                pair = (acc, noacc)
+            else:
+                pair = (noacc, acc)
+            vals.append(numpy.tile([kind, not kind], cnt))
+            lengths.append(numpy.column_stack(pair).ravel())
+            total += int(numpy.minimum(lengths[-1], n).sum())
+        vals = numpy.concatenate(vals)
+        lengths = numpy.concatenate(lengths)
+        capped = numpy.minimum(lengths, n)
+        ends = numpy.cumsum(capped)
+        # run k reaches the end of the chunk; the rest of it is carried to
+        # the next chunk
+        k = int(numpy.searchsorted(ends, n))
+        left = int(lengths[k] - (n - (ends[k] - capped[k])))
+        if left > 0:
+            (self.target, self.run_left) = (bool(vals[k]), left)
+        else:
+            (self.target, self.run_left) = (not vals[k], 0)
+        is_target = numpy.repeat(vals[:k + 1], capped[:k + 1])[:n]
+
+        # the single-thread outcomes of the accesses to the channel
+        tpos = numpy.flatnonzero(is_target) + self.pos
+        self.pos += n
+        m = len(tpos)
+        chnl = numpy.where(is_target, self.chnl_id, -1).astype(numpy.int64)
+        bank = numpy.zeros(n, dtype=numpy.int64)
+        row = numpy.zeros(n, dtype=numpy.int64)
+        if m == 0:
+            return (chnl, bank, row)
+        prev = numpy.empty_like(tpos)
+        prev[0] = self.last_pos
+        prev[1:] = tpos[:-1]
+        self.last_pos = int(tpos[-1])
+        idx = numpy.maximum(numpy.searchsorted(self.dists, tpos - prev,
+                                               side="right") - 1, 0)
+        u = rng.random_sample(m)
+        outcome = numpy.where(u < self.hit_probs[idx], HIT,
+                              numpy.where(u < self.hit_probs[idx] +
+                                          self.miss_probs[idx], MISS, CONF))
+        outcome[prev < 0] = MISS
+
+        # misses move to another bank, misses and conflicts to another row
+        if self.bank_cnt > 1:
+            step = numpy.where(outcome == MISS,
+                               rng.randint(1, self.bank_cnt, m), 0)
+        else:
+            step = numpy.zeros(m, dtype=numpy.int64)
+        banks = (self.bank + numpy.cumsum(step)) % self.bank_cnt
+        change = (outcome != HIT)
+        if self.row_cnt is None:
+            rows = self.row + numpy.cumsum(change)
+        elif self.row_cnt > 1:
+            rows = (self.row + numpy.cumsum(numpy.where(
+                change, rng.randint(1, self.row_cnt, m), 0))) % self.row_cnt
+        else:
+            rows = numpy.zeros(m, dtype=numpy.int64)
+        self.bank = int(banks[-1])
+        self.row = int(rows[-1])
+        bank[is_target] = banks + self.bank_base
+        row[is_target] = rows + self.row_base
+        return (chnl, bank, row)
+
+# Interleave the chunks of several threads round-robin.
+# Inputs:
+#       chunks: list of (chnl, bank, row) tuples of numpy arrays of the same
+#               length, one for each thread
+# Return:
+#       (chnl, bank, row) of the interleaved accesses
+def interleave(chunks):
+    return tuple([numpy.column_stack([chunk[i] for chunk in chunks]).ravel()
+                  for i in range(3)])
@@ -11,15 +11,12 @@
 # 
 
 
-import acc_gen
-import inter_pat_gen
-import hmc_ratios_gen
+import model_runner
+import dist_bucket
 from optparse import OptionParser
 
 from mem_model_types import *
 
-from fractions import *
-
 parser = OptionParser()
 parser.add_option("-f", "--file", dest="filename", help="Path to the parameter "
                   + "file", metavar="parameterfile")
@@ -40,6 +37,17 @@ parser.add_option("--half", dest="half_reorder", help="Whether " +
 parser.add_option("-s", "--steps", dest="steps", help="The version of " +
                   "each of the four steps; comma separate list of four integers"
                   , metavar="V,V,V,V", type="string")
+parser.add_option("-b", "--buckets", dest="buckets", help="Merge the " +
+                  "channel reuse distances into at most BUCKETS groups",
+                  metavar="BUCKETS", type="int")
+parser.add_option("--bucket_mode", dest="bucket_mode", help="How to merge " +
+                  "the channel reuse distances: log or error; default error",
+                  metavar="MODE", type="string", default="error")
+parser.add_option("--exact", dest="exact", help="Price the access " +
+                  "sequences one at a time with the Fraction tables, as the " +
+                  "original implementation does, instead of in batches; " +
+                  "slow, for double checking only", action="store_true", 
+                  default=False)
 parser.add_option("-d", "--debug", action="store_true", dest="debug", 
                   default=False, help="Enable debug output")
 
@@ -75,169 +83,60 @@ if options.debug is True:
     print "    auto-close time: ", options.timeout 
     print "    estimate service time: ", options.est_serv_time
     print "    half conflict reordering: ", options.half_reorder
+    print "    per-sequence pricing: ", options.exact
+    print "    reuse distance buckets: ", options.buckets
+    print "    bucket mode: ", options.bucket_mode
     print "    function versions: ", steps
     print "    debug: ", options.debug
 
 
 # parse the input file
-f = open(options.filename, "r")
-
 thr_info = thread_info()
 thr_info.autoclose_time = options.timeout
 thr_info.reorder_time = options.reorder
 thr_info.est_serv_time = options.est_serv_time
 thr_info.half_reorder = options.half_reorder
 
-for line in f:
-    if line.isspace():
-        continue
-    elif line.startswith("#"):
-        continue
-    
-    if line.startswith("t:"):
-        temp = line.strip("\n").split(":")[1].split(",")
-        thr_info.chnl_prob = float(temp[0])
-        thr_info.bank_prob = float(temp[1])
-        thr_info.row_prob = float(temp[2])
-        min_con_acc = int(temp[3])
-        min_con_noacc = int(temp[4])
-    elif line.startswith("a:"):
-        temp = line.strip("\n").split(":")[1].split(",")
-        chnl_dist = chnl_reuse_dist_info()
-        chnl_dist.acc_dist = int(temp[0])
-        chnl_dist.prob = float(temp[1])
-        chnl_dist.hit_prob = float(temp[2])
-        chnl_dist.miss_prob = float(temp[3])
-        chnl_dist.conf_prob = float(temp[4])
-        thr_info.chnl_reuse_dists.append(chnl_dist)
-    elif line.startswith("ca:"):
-        con_acc_probs = consecutive_acc_probs()
-        temp = line.strip("\n").split(":")[1].split(",")
-        for t in temp:
-            vals = t.split("/")
-            con_acc_probs.acc_prob.append(Fraction(int(vals[0]),int(vals[1])))
-    elif line.startswith("cn:"):
-        con_noacc_probs = consecutive_noacc_probs()
-        temp = line.strip("\n").split(":")[1].split(",")
-        for t in temp:
-            vals = t.split("/")
-            con_noacc_probs.noacc_prob.append(Fraction(int(vals[0]),
-                                                       int(vals[1])))
-    elif line.startswith("mt:"):
-        temp = line.strip("\n").split(":")
-        min_con_acc = int(temp[1])
-    elif line.startswith("mn:"):
-        temp = line.strip("\n").split(":")
-        min_con_noacc = int(temp[1])
-    else:
-        print "Unknown line form input file:", line
-        exit(-1)
+model_runner.parse_param_file(options.filename, thr_info)
 
 # print inputs from the configure file
 if options.debug:
-    print "Inputs from configuration file:"
-    print "    Thread info, chnl_prob:", thr_info.chnl_prob
-    print "    Thread info, bank_prob:", thr_info.bank_prob 
-    print "    Thread info, row_prob:", thr_info.row_prob
-    print "    Thread info, reorder time:", thr_info.reorder_time
-    print "    Thread info, auto-close:", thr_info.autoclose_time
-    print "    Thread info, est. time:", thr_info.est_serv_time
-    print "    Thread info, half_reorder:", thr_info.half_reorder
-    for chnl_dist in thr_info.chnl_reuse_dists:
-        print "    Channel reuse dist", chnl_dist.acc_dist
-        print "        prob:", chnl_dist.prob
-        print "        hit_prob:", chnl_dist.hit_prob
-        print "        miss_prob:", chnl_dist.miss_prob
-        print "        conf_prob:", chnl_dist.conf_prob
-    print "    Con-acc-probs:", con_acc_probs.acc_prob
-    print "    Con-noacc-probs:", con_noacc_probs.noacc_prob
-    print "    min_con_acc:", min_con_acc
-    print "    min_con_noacc:", min_con_noacc
+    for chnl in thr_info.chnls:
+        model_runner.log_chnl_params(chnl)
 
 thread_cnt = options.thread_cnt
 debug = options.debug
 
+# merge the channel reuse distances if asked to
+if options.buckets is not None:
+    for chnl in thr_info.chnls:
+        bound = dist_bucket.bucket_reuse_dists(chnl.thr_info, options.buckets, 
+                                               options.bucket_mode, debug)
+        print "Channel reuse distances merged into", 
+        print len(chnl.thr_info.chnl_reuse_dists), "groups,",
+        # the bound only covers version 3 of step 1, see dist_bucket.py
+        if steps[0] == 3:
+            print "error bound of hit/miss/conflict ratios:", bound
+        else:
+            print "no error bound for version", steps[0], "of step 1"
+
 #if (steps[0] == 1) and (steps[1] == 1) and (steps[2] == 1) and (steps[3] == 1):
     # full version of the algorithm 
-#    inter_pat_groups = acc_gen.gen_acc_seq_v1(thr_info, con_acc_probs, 
+#    inter_pat_groups = acc_gen.gen_acc_seq_v1(ctx, con_acc_probs, 
 #                                            con_noacc_probs, thread_cnt, 
 #                                            min_con_acc, min_con_noacc, debug)
 
-#    hmc = inter_pat_gen.gen_acc_stat_all(inter_pat_groups, thr_info)
+#    hmc = inter_pat_gen.gen_acc_stat_all(inter_pat_groups, ctx)
 #else:
-print "Step 1"
-# step 1
-if (steps[0] == 1) or (steps[0] == 2):
-    acc_gen.gen_full_acc_seq_1thr_all(thr_info, con_acc_probs, 
-                                      con_noacc_probs, thread_cnt, 
-                                      min_con_acc, min_con_noacc, debug)
-elif (steps[0] == 3):
-    acc_gen.gen_acc_seq_1thr_all_v3(thr_info, con_acc_probs, 
-                                    con_noacc_probs, 
-                                    thread_cnt, min_con_acc, min_con_noacc, 
-                                    debug)
-elif(steps[0] == 4):
-    acc_gen.gen_acc_seq_1thr_all_v4(thr_info, con_acc_probs, 
-                                    con_noacc_probs, thread_cnt, 
-                                    min_con_acc, min_con_noacc, debug)
-else:
-    print "Unknown step 1 function version:", steps[0]
-    exit(61)
-    
-# step 2
-print "Step 2"
-if (steps[1] == 1) or (steps[1] == 2):
-    inter_pat_gen.gen_acc_seq_stats_all(thr_info, debug)
-elif (steps[1] == 3):
-    inter_pat_gen.gen_acc_seq_stats_all_v3(thr_info, debug)
+# run steps 1 to 4 for every channel; the combinations of access sequences
+# and the step 1 search trees are shared by all channels
+results = model_runner.run_all_chnls(thr_info, thread_cnt, steps, 
+                                     options.exact, debug)
+
+if len(results) == 1:
+    hmc = results[0][1]
+    print "Final hit/miss/conflict:", hmc.hit, hmc.miss, hmc.conflict
 else:
-    print "Unknown step 2 function version:", steps[1]
-    exit(61)
-
-# step 3
-print "Step 3"
-if (steps[2] == 1):
-    inter_pat_groups = acc_gen.gen_acc_seq_v1_full(thr_info, 
-                                                   con_acc_probs, 
-                                                   con_noacc_probs, 
-                                                   thread_cnt,
-                                                   min_con_acc, 
-                                                   min_con_noacc,
-                                                   debug)
-elif (steps[2] == 2):
-    inter_pat_groups = acc_gen.gen_acc_seq_v2_full_comb(thr_info, 
-                                                        con_acc_probs, 
-                                                        con_noacc_probs, 
-                                                        thread_cnt,
-                                                        min_con_acc, 
-                                                        min_con_noacc,
-                                                        debug)
-elif (steps[2] == 3):
-    inter_pat_groups = acc_gen.gen_acc_seq_v3_full_comb(thr_info, 
-                                                        con_acc_probs, 
-                                                        con_noacc_probs, 
-                                                        thread_cnt,
-                                                        min_con_acc, 
-                                                        min_con_noacc,
-                                                        debug)
-else:
-    print "Unknown step 3 function version:", steps[2]
-    exit(61)
-
-# step 4
-print "Step 4"
-if (steps[3] == 2):
-    hmc = hmc_ratios_gen.gen_hmc_v2_all_inter_pat_group(inter_pat_groups, 
-                                                        thr_info, debug)
-elif (steps[3] == 3):
-    hmc = hmc_ratios_gen.gen_hmc_v3_all_inter_pat_group(inter_pat_groups, 
-                                                        thr_info, debug)
-elif (steps[3] == 1):
-    hmc = hmc_ratios_gen.gen_hmc_v1_all_inter_pat_group(inter_pat_groups, 
-                                                        thr_info, debug)
-else:
-    print "Unknown step 4 function version:", steps[3]
-    exit(61)
-
-
-print "Final hit/miss/conflict:", hmc.hit, hmc.miss, hmc.conflict
+    for (chnl_id, hmc) in results:
+        print "Channel", chnl_id, "final hit/miss/conflict:", 
+        print hmc.hit, hmc.miss, hmc.conflict
@@ -0,0 +1,180 @@
+#!/usr/bin/python
+
+# This script checks the predictions of the model against the row buffer
+# simulator (see row_buffer_sim.py). The simulated accesses are either read
+# from traces of DRAM addresses, one trace for each thread, or generated from
+# the parameter file for the "-t" threads. The simulated hit/miss/conflict
+# ratios of every channel are printed, next to the ratios predicted by the
+# model when a parameter file is given.
+#
+# A trace is a .npy file of records with the fields node, channel, rank, bank
+# and row, e.g., written by "virtual2dram.py --binary" (without --rle) in
+# tools/address_translation. The threads are interleaved round-robin until the
+# shortest trace ends. The channel ids are node * channels per node + channel,
+# the same as trace2params.py.
+
+from optparse import OptionParser
+
+import model_runner
+import row_buffer_sim
+
+from mem_model_types import *
+
+parser = OptionParser()
+parser.add_option("-f", "--file", dest="filename", help="Path to the " +
+                  "parameter file", metavar="parameterfile")
+parser.add_option("-i", "--traces", dest="traces", help="Comma separated " +
+                  "paths to the traces of the threads; without traces, the " +
+                  "accesses are generated from the parameter file",
+                  metavar="TRACES")
+parser.add_option("-t", "--t", dest="thread_cnt", help="Number of threads " +
+                  "to generate", metavar="THREAD_COUNT", type="int")
+parser.add_option("-n", "--accesses", dest="acc_cnt", help="Number of " +
+                  "accesses to generate for each thread; default 1000000",
+                  metavar="ACCESSES", type="int", default=1000000)
+parser.add_option("-o", "--timeout", dest="timeout", help="Time in nanoseconds "
+                  + "before a bank auto-close", metavar="TIEMOUT",
+                  type="float", default=0.0)
+parser.add_option("-r", "--reorder", dest="reorder", help="Maximum timespan " +
+                  "allowed for reordering: 0 means no reordering",
+                  metavar="REORDER", type="float", default=0.0)
+parser.add_option("-e", "--esttime", dest="est_serv_time", help="Estimated " +
+                  "service time for memory request, in nanoseconds; must " +
+                  "be positive", metavar="EST_TIME", type="float")
+parser.add_option("--half", dest="half_reorder", help="Whether " +
+                  "half reordered misses/conflicts remains misses/conflicts ",
+                  action="store_true", default=False)
+parser.add_option("-s", "--steps", dest="steps", help="The version of " +
+                  "each of the four steps of the model; default 3,3,3,3",
+                  metavar="V,V,V,V", type="string", default="3,3,3,3")
+parser.add_option("--chunk", dest="chunk", help="Number of accesses of " +
+                  "each thread simulated at once; default 1048576",
+                  metavar="ACCESSES", type="int", default=1 << 20)
+parser.add_option("--chnls_per_node", dest="chnls_per_node", help="Number " +
+                  "of channels of a node, for the channel ids of the traces; " +
+                  "default 2", metavar="CHANNELS", type="int", default=2)
+parser.add_option("--seed", dest="seed", help="Seed of the generated " +
+                  "accesses; default 0", metavar="SEED", type="int", default=0)
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+# Simulate the traces of the threads.
+# Inputs:
+#       sim: row_buffer_sim object
+#       filenames: list of the paths to the traces
+#       options: the command line options
+def sim_traces(sim, filenames, options):
+    numpy = row_buffer_sim.numpy
+    traces = [numpy.load(filename, mmap_mode="r") for filename in filenames]
+    length = min([len(trace) for trace in traces])
+    for start in xrange(0, length, options.chunk):
+        chunks = []
+        for trace in traces:
+            recs = trace[start:min(start + options.chunk, length)]
+            chnl = (recs['node'].astype(numpy.int64) * options.chnls_per_node +
+                    recs['channel'])
+            bank = (recs['rank'].astype(numpy.int64) << 8) | recs['bank']
+            chunks.append((chnl, bank, recs['row'].astype(numpy.int64)))
+        sim.add_chunk(*row_buffer_sim.interleave(chunks))
+        if options.debug:
+            print "Simulated", (start + len(chunks[0][0])) * len(traces),
+            print "accesses"
+
+# Simulate the accesses generated from the parameters of every channel.
+# Inputs:
+#       sim: row_buffer_sim object
+#       chnls: list of chnl_params objects
+#       options: the command line options
+def sim_synthetic(sim, chnls, options):
+    rng = row_buffer_sim.numpy.random.RandomState(options.seed)
+    for chnl in chnls:
+        streams = [row_buffer_sim.synthetic_stream(chnl, i, rng)
+                   for i in range(options.thread_cnt)]
+        for start in xrange(0, options.acc_cnt, options.chunk):
+            n = min(options.chunk, options.acc_cnt - start)
+            sim.add_chunk(*row_buffer_sim.interleave(
+                [stream.next_chunk(n) for stream in streams]))
+            if options.debug:
+                print "Channel", chnl.chnl_id, ": simulated",
+                print (start + n) * options.thread_cnt, "accesses"
+
+if __name__ == "__main__":
+    (options, args) = parser.parse_args()
+
+    if options.filename is None and options.traces is None:
+        print "Please specify the parameter file or the traces"
+        parser.print_help()
+        exit(-1)
+
+    if options.est_serv_time is None or options.est_serv_time <= 0:
+        print "Please specify a positive estimated service time"
+        parser.print_help()
+        exit(-1)
+
+    if options.traces is not None:
+        traces = options.traces.split(",")
+        if (options.thread_cnt is not None and
+            options.thread_cnt != len(traces)):
+            print "There should be one trace for each of the",
+            print options.thread_cnt, "threads"
+            exit(-1)
+        options.thread_cnt = len(traces)
+    elif options.thread_cnt is None:
+        print "Please specify the number of threads to generate"
+        parser.print_help()
+        exit(-1)
+
+    steps = [int(n) for n in options.steps.split(',')]
+    if len(steps) != 4:
+        print "Only four function versions are allowed"
+        parser.print_help()
+        exit(-1)
+
+    if row_buffer_sim.numpy is None:
+        print "numpy is required for the simulation"
+        exit(2)
+
+    if options.debug is True:
+        print "Options are:"
+        print "    input file: ", options.filename
+        print "    traces: ", options.traces
+        print "    thread count: ", options.thread_cnt
+        print "    reorder time: ", options.reorder
+        print "    auto-close time: ", options.timeout
+        print "    estimate service time: ", options.est_serv_time
+        print "    half conflict reordering: ", options.half_reorder
+        print "    function versions: ", steps
+
+    thr_info = thread_info()
+    thr_info.autoclose_time = options.timeout
+    thr_info.reorder_time = options.reorder
+    thr_info.est_serv_time = options.est_serv_time
+    thr_info.half_reorder = options.half_reorder
+    if options.filename is not None:
+        model_runner.parse_param_file(options.filename, thr_info)
+
+    sim = row_buffer_sim.row_buffer_sim(options.timeout, options.reorder,
+                                        options.est_serv_time,
+                                        options.half_reorder)
+    if options.traces is not None:
+        sim_traces(sim, traces, options)
+    else:
+        sim_synthetic(sim, thr_info.chnls, options)
+
+    predicted = dict()
+    if options.filename is not None:
+        for (chnl_id, hmc) in model_runner.run_all_chnls(
+                thr_info, options.thread_cnt, steps, False, options.debug):
+            predicted[chnl_id] = hmc
+
+    for chnl_id in sim.get_chnls():
+        (hmc, acc_cnt) = sim.get_ratios(chnl_id)
+        print "Channel", chnl_id, "simulated hit/miss/conflict:", hmc.hit,
+        print hmc.miss, hmc.conflict, "(" + str(acc_cnt), "accesses)"
+        if chnl_id in predicted:
+            pred = predicted[chnl_id]
+            print "Channel", chnl_id, "predicted hit/miss/conflict:",
+            print pred.hit, pred.miss, pred.conflict
+            print "Channel", chnl_id, "error of hit/miss/conflict:",
+            print pred.hit - hmc.hit, pred.miss - hmc.miss,
+            print pred.conflict - hmc.conflict
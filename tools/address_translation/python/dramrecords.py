@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+# This file writes translated addresses as a binary record array, in the
+# ".npy" format of numpy, so that large regions can be loaded for analysis
+# with numpy.load (or memory-mapped with mmap_mode="r"). The records are
+# written as they come, and the number of records in the header is filled in
+# when the file is closed, so numpy is not needed to write the file.
+#
+# Each record has fixed width (36 bytes, little endian, not aligned):
+#     vaddr, paddr, size: uint64; the virtual address (the physical address
+#                         when only translating physical addresses), the
+#                         physical address, and the size in bytes (the step,
+#                         or the size of a run of addresses)
+#     node, channel, rank, bank: uint8
+#     row, col: uint32
+# The DRAM fields are 0 when only translating virtual addresses.
+#
+
+import struct
+
+NPY_MAGIC = "\x93NUMPY\x01\x00"
+RECORD_DTYPE = ("[('vaddr', '<u8'), ('paddr', '<u8'), ('size', '<u8'), " +
+                "('node', '|u1'), ('channel', '|u1'), ('rank', '|u1'), " +
+                "('bank', '|u1'), ('row', '<u4'), ('col', '<u4')]")
+RECORD = struct.Struct("<QQQBBBBII")
+# the header has a fixed length, so that the record count can be filled in
+# at the end
+NPY_HEADER_LEN = 256 - len(NPY_MAGIC) - 2
+# number of records packed before each write
+BATCH_SIZE = 4096
+
+# This function formats the header of the .npy file.
+# Parameters:
+#     int count: number of records
+# Return value:
+#     str header: the header, including the magic string
+def npyHeader(count):
+    header = ("{'descr': " + RECORD_DTYPE + ", 'fortran_order': False, " +
+              "'shape': (" + str(count).rjust(20) + ",), }")
+    header = header.ljust(NPY_HEADER_LEN - 1) + "\n"
+    return NPY_MAGIC + struct.pack("<H", NPY_HEADER_LEN) + header
+
+class npyRecordWriter:
+    # Parameters:
+    #     str filename: path to the .npy file to write
+    def __init__(self, filename):
+        self.f = open(filename, "wb")
+        self.f.write(npyHeader(0))
+        self.count = 0
+        self.batch = []
+
+    # This function adds one record.
+    # Parameters:
+    #     int vaddr, paddr, size: see the beginning of this file
+    #     dict ramaddr: the dram address returned by physical2dram, or None
+    def write(self, vaddr, paddr, size, ramaddr):
+        if ramaddr is None:
+            self.batch.append(RECORD.pack(vaddr, paddr, size, 0, 0, 0, 0, 0,
+                                          0))
+        else:
+            self.batch.append(RECORD.pack(vaddr, paddr, size,
+                                          ramaddr['Node'], ramaddr['Channel'],
+                                          ramaddr['Rank'], ramaddr['Bank'],
+                                          ramaddr['Row'], ramaddr['Col']))
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.f.write("".join(self.batch))
+        self.count += len(self.batch)
+        self.batch = []
+
+    # This function writes the remaining records and the final header.
+    # Return value:
+    #     int count: number of records in the file
+    def close(self):
+        self.flush()
+        self.f.seek(0)
+        self.f.write(npyHeader(self.count))
+        self.f.close()
+        return self.count
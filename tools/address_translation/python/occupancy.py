@@ -0,0 +1,189 @@
+#!/usr/bin/python
+
+# This file counts how the translated memory of a process is placed on the
+# DRAM: the bytes on every node, channel, rank and bank (and row), counted
+# incrementally as the translated addresses stream through, so the addresses
+# do not need to be kept or printed. From the placement, it estimates the
+# "t:" line of the parameter file of the hit/miss/conflict ratio model
+# (python_impl/ratio_model/parameters.txt) for every channel, assuming that
+# the memory is accessed uniformly, in the order of the virtual addresses:
+#     channel_acc_prob: the fraction of the bytes on the channel
+#     other_thread_hit_same_bank_prob: the probability that two accesses to
+#         the channel go to the same bank, i.e., the sum of the squared
+#         fractions of the (rank, bank) pairs of the channel
+#     other_thread_hit_same_row_prob: the probability that two accesses to
+#         the same bank also go to the same row, i.e., the sum of the squared
+#         fractions of the rows of the channel divided by that of the banks
+#         (the model multiplies it by the same-bank probability)
+#     min_con_acc, min_con_noacc: the shortest run of consecutive accesses
+#         (in the order of the virtual addresses) to the channel and to the
+#         other channels; only the runs with both ends inside a contiguous
+#         virtual region are counted, and 1 is used if there is none
+
+# numpy is optional; it is only needed by occupancyCounter.addArray
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class occupancyCounter:
+    # Parameters:
+    #     int step: the size in bytes of one access, i.e., the step of the
+    #               translated addresses
+    def __init__(self, step):
+        self.step = step
+        self.total = 0
+        # (node, channel, rank, bank) ==> bytes
+        self.banks = dict()
+        # (node, channel, rank, bank, row) ==> bytes
+        self.rows = dict()
+        # (node, channel) ==> shortest runs of accesses to the channel and
+        # to other channels
+        self.min_acc = dict()
+        self.min_noacc = dict()
+        # the current contiguous virtual region: the next virtual address,
+        # the number of accesses so far, the channel of the current run and
+        # where it starts, and where the last run of every channel ended
+        self.next_vaddr = None
+        self.pos = 0
+        self.cur_chnl = None
+        self.cur_start = 0
+        self.last_end = dict()
+
+    # This function counts one translated address, or a run of addresses.
+    # Parameters:
+    #     int vaddr: the (first) virtual address
+    #     int size: the size in bytes, a multiple of step
+    #     dict ramaddr: the dram address returned by physical2dram
+    def add(self, vaddr, size, ramaddr):
+        chnl = (ramaddr['Node'], ramaddr['Channel'])
+        bank = chnl + (ramaddr['Rank'], ramaddr['Bank'])
+        row = bank + (ramaddr['Row'],)
+        self.total += size
+        self.banks[bank] = self.banks.get(bank, 0) + size
+        self.rows[row] = self.rows.get(row, 0) + size
+
+        if vaddr != self.next_vaddr:
+            # a new contiguous region; the current run is cut by the gap
+            self.pos = 0
+            self.cur_chnl = None
+            self.last_end = dict()
+        self.next_vaddr = vaddr + size
+
+        if chnl != self.cur_chnl:
+            if self.cur_chnl is not None:
+                # the current run has ended; it is complete if it did not
+                # start the region
+                if self.cur_start > 0:
+                    self.updateMin(self.min_acc, self.cur_chnl,
+                                   self.pos - self.cur_start)
+                self.last_end[self.cur_chnl] = self.pos
+            if chnl in self.last_end:
+                self.updateMin(self.min_noacc, chnl,
+                               self.pos - self.last_end[chnl])
+            self.cur_chnl = chnl
+            self.cur_start = self.pos
+        self.pos += size // self.step
+
+    def updateMin(self, mins, chnl, length):
+        if (chnl not in mins) or (length < mins[chnl]):
+            mins[chnl] = length
+
+    # This function counts a chunk of translated addresses at once, e.g.,
+    # those of physical2dram.decodePlan.translateArray; the runs of
+    # accesses are not counted, as the virtual addresses are not known.
+    # Parameters:
+    #     ramaddrs: numpy structured array with the fields of
+    #               physical2dram.DRAM_DTYPE
+    #     int size: the size in bytes of every address
+    def addArray(self, ramaddrs, size):
+        if len(ramaddrs) == 0:
+            return
+        # the rows are packed into one 64-bit key (8 bits for the node,
+        # channel, rank and bank, 32 bits for the row), which sorts much
+        # faster than the rows of a 2-D array
+        U = numpy.uint64
+        keys = ramaddrs['row'].astype(U)
+        for (f, shift) in (('bank', 32), ('rank', 40), ('channel', 48),
+                           ('node', 56)):
+            keys |= ramaddrs[f].astype(U) << U(shift)
+        (keys, counts) = numpy.unique(keys, return_counts=True)
+        self.total += len(ramaddrs) * size
+        for (key, count) in zip(keys.tolist(), counts.tolist()):
+            row = ((key >> 56) & 0xFF, (key >> 48) & 0xFF, (key >> 40) & 0xFF,
+                   (key >> 32) & 0xFF, key & 0xFFFFFFFF)
+            self.rows[row] = self.rows.get(row, 0) + count * size
+            self.banks[row[:4]] = self.banks.get(row[:4], 0) + count * size
+
+    # This function gives the channels with memory on them
+    # Return value:
+    #     A sorted list of (node, channel)
+    def channels(self):
+        return sorted(set([bank[:2] for bank in self.banks]))
+
+    # This function estimates the "t:" line of a channel, see the beginning
+    # of this file
+    # Parameters:
+    #     tuple chnl: (node, channel)
+    # Return value:
+    #     (channel_acc_prob, same_bank_prob, same_row_prob, min_con_acc,
+    #      min_con_noacc)
+    def estimateThread(self, chnl):
+        chnl_bytes = float(sum([b for (k, b) in self.banks.iteritems()
+                                if k[:2] == chnl]))
+        if chnl_bytes == 0:
+            return (0.0, 0.0, 0.0, 1, 1)
+        bank_prob = sum([(b / chnl_bytes) ** 2 for (k, b) in
+                         self.banks.iteritems() if k[:2] == chnl])
+        same_row_prob = sum([(b / chnl_bytes) ** 2 for (k, b) in
+                             self.rows.iteritems() if k[:2] == chnl])
+        # same row given the same bank
+        if bank_prob == 0:
+            row_prob = 0.0
+        else:
+            row_prob = same_row_prob / bank_prob
+        return (chnl_bytes / self.total, bank_prob, row_prob,
+                self.min_acc.get(chnl, 1), self.min_noacc.get(chnl, 1))
+
+    # This function prints the bytes on every node, channel, rank and bank
+    def printHistogram(self):
+        print "#Node ,Channel ,Rank ,Bank ,Bytes ,Fraction"
+        for bank in sorted(self.banks):
+            print "%d,%d,%d,%d,%d,%f" % (bank + (self.banks[bank],
+                                                 float(self.banks[bank]) /
+                                                 self.total))
+
+    # This function writes the estimated "t:" lines of all channels, in
+    # sections of the parameter file started with "c: <channel id>", where
+    # the channel id is node * channels per node + channel
+    # Parameters:
+    #     file f: the output file
+    #     int chnls_per_node: number of channels of each node
+    def writeThreadLines(self, f, chnls_per_node):
+        f.write("# estimated from the placement of " + str(self.total) +
+                " bytes, see occupancy.py\n")
+        f.write("# channel_acc_prob, other_thread_hit_same_bank_prob, " +
+                "other_thread_hit_same_row_prob, min_con_acc, " +
+                "min_con_noacc\n")
+        for chnl in self.channels():
+            f.write("c: %d\n" % (chnl[0] * chnls_per_node + chnl[1]))
+            f.write("t: %f, %f, %f, %d, %d\n" % self.estimateThread(chnl))
+
+# Check the estimates of a uniform placement: with B banks of R rows, the
+# same-bank probability is 1/B and the same-row probability is 1/R.
+if __name__ == "__main__":
+    for (bank_cnt, row_cnt) in ((8, 4), (16, 1), (1, 32), (4, 1024)):
+        counter = occupancyCounter(64)
+        for bank in range(bank_cnt):
+            for row in range(row_cnt):
+                counter.add(((bank * row_cnt + row) << 12), 4096,
+                            {'Node': 0, 'Channel': 0, 'Rank': 0,
+                             'Bank': bank, 'Row': row})
+        (chnl_prob, bank_prob, row_prob, min_acc, min_noacc) = \
+            counter.estimateThread((0, 0))
+        if (abs(bank_prob - 1.0 / bank_cnt) > 1e-9 or
+            abs(row_prob - 1.0 / row_cnt) > 1e-9):
+            print "Wrong estimates for", bank_cnt, "banks of", row_cnt,
+            print "rows:", bank_prob, row_prob
+            exit(1)
+    print "Estimates of uniform placements are correct"
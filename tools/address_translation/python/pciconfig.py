@@ -3,6 +3,7 @@
 
 # Author: Wei Wang <wwang@virginia.edu>
 
+import struct
 
 version = '1.0'
 
@@ -11,6 +12,20 @@ debug = False
 # Keep a cache of read values to improve performance
 pcicache = dict()
 
+# The snapshot that getPCIConfig reads from instead of sysfs, see useSnapshot
+snapshot = None
+
+# Snapshot file format (little endian):
+#     header: magic "DRAMONPC", number of nodes (uint32), number of 
+#             devices (uint32)
+#     nodes: (bus, slot) of every node, two uint8 each
+#     devices: domain (uint16), bus, slot, function (uint8), size of the
+#              configuration space (uint32), then the configuration space
+SNAPSHOT_MAGIC = "DRAMONPC"
+SNAPSHOT_HEADER = struct.Struct("<8sII")
+SNAPSHOT_NODE = struct.Struct("<BB")
+SNAPSHOT_DEVICE = struct.Struct("<HBBBI")
+
 # This method with return the configuration value in hex format
 # for the register that located at [address] of [function] of
 # the device that attached to PCI domain [domain], bus [bus] and
@@ -29,6 +44,9 @@ pcicache = dict()
 # If you want to read registers located after address 0x40, you
 # probably need root privilege. 
 def getPCIConfig( domain, bus, slot, function, address, cache_pci):
+    if snapshot is not None:
+        return snapshot.read(domain, bus, slot, function, address)
+
     pciDevSysPath = "/sys/bus/pci/devices/"
     key = (hex(domain)[2:].zfill(4) + ":" + hex(bus)[2:].zfill(2) + ":" + 
           hex(slot)[2:].zfill(2) + "." + hex(function)[2:])
@@ -58,4 +76,97 @@ def getPCIConfig( domain, bus, slot, function, address, cache_pci):
         
     return configData
 
+# This function gives the sysfs path of the configuration space of a device
+def pciConfigPath(domain, bus, slot, function):
+    return ("/sys/bus/pci/devices/" + hex(domain)[2:].zfill(4) + ":" + 
+            hex(bus)[2:].zfill(2) + ":" + hex(slot)[2:].zfill(2) + "." + 
+            hex(function)[2:] + "/config")
+
+# The configuration spaces of the PCI devices of the memory controllers,
+# read once, so that the registers can be read without sysfs (and without 
+# root) and saved to a file for another machine
+class pciSnapshot:
+    def __init__(self):
+        # (bus, slot) of the nodes
+        self.nodes = []
+        # (domain, bus, slot, function) ==> configuration space, memoryview
+        self.devices = dict()
+
+    # This function reads the whole configuration space of a device with one
+    # read. Without root, only the first 64 bytes are readable.
+    def readDevice(self, domain, bus, slot, function):
+        configfile = open(pciConfigPath(domain, bus, slot, function), "rb")
+        data = configfile.read()
+        configfile.close()
+        if debug is True:
+            print "Read", len(data), "bytes of configuration space of", \
+                pciConfigPath(domain, bus, slot, function)
+        self.devices[(domain, bus, slot, function)] = memoryview(data)
+
+    # This function reads the functions 1 to 3 (address map, DRAM
+    # controller and miscellaneous control) of all nodes.
+    # Parameters:
+    #     list nodes: the PCI address (bus, slot) of each node
+    def readNodes(self, nodes):
+        self.nodes = list(nodes)
+        for node in nodes:
+            for function in range(1, 4):
+                self.readDevice(0x0, node[0], node[1], function)
+
+    # This function reads a register, same as getPCIConfig
+    def read(self, domain, bus, slot, function, address):
+        key = (domain, bus, slot, function)
+        if not self.devices.has_key(key):
+            print "PCI device", hex(domain)[2:].zfill(4) + ":" + \
+                hex(bus)[2:].zfill(2) + ":" + hex(slot)[2:].zfill(2) + "." + \
+                hex(function)[2:], "is not in the snapshot"
+            exit(2)
+        data = self.devices[key]
+        if address + 4 > len(data):
+            print "Register", hex(address), "is not in the snapshot, " + \
+                "which has", len(data), "bytes (taken without root?)"
+            exit(2)
+        return struct.unpack_from("<I", data, address)[0]
+
+    # This function saves the snapshot to a file
+    def save(self, filename):
+        f = open(filename, "wb")
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(self.nodes), 
+                                     len(self.devices)))
+        for node in self.nodes:
+            f.write(SNAPSHOT_NODE.pack(node[0], node[1]))
+        for key in sorted(self.devices.keys()):
+            data = self.devices[key]
+            f.write(SNAPSHOT_DEVICE.pack(key[0], key[1], key[2], key[3], 
+                                         len(data)))
+            f.write(data.tobytes())
+        f.close()
+
+    # This function loads a snapshot file written by save
+    def load(self, filename):
+        f = open(filename, "rb")
+        data = memoryview(f.read())
+        f.close()
+        (magic, node_cnt, device_cnt) = SNAPSHOT_HEADER.unpack_from(data, 0)
+        if magic != SNAPSHOT_MAGIC:
+            print "Not a PCI snapshot file:", filename
+            exit(2)
+        offset = SNAPSHOT_HEADER.size
+        self.nodes = []
+        for i in range(node_cnt):
+            self.nodes.append(SNAPSHOT_NODE.unpack_from(data, offset))
+            offset += SNAPSHOT_NODE.size
+        self.devices = dict()
+        for i in range(device_cnt):
+            (domain, bus, slot, function, size) = \
+                SNAPSHOT_DEVICE.unpack_from(data, offset)
+            offset += SNAPSHOT_DEVICE.size
+            self.devices[(domain, bus, slot, function)] = \
+                data[offset:offset + size]
+            offset += size
 
+# This function makes getPCIConfig read from a snapshot, or from sysfs 
+# again if snap is None
+def useSnapshot(snap):
+    global snapshot
+    snapshot = snap
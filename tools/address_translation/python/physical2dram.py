@@ -13,6 +13,12 @@ import subprocess
 
 import pciconfig
 
+# numpy is optional; it is only needed by decodePlan.translateArray
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 debug = False
 version = "0.1"
 
@@ -57,219 +63,193 @@ def removeMaskedBitsV2(addr, mask):
 
     return addr_out
 
-# This function translates physical address into dram address as node, channel, rank,
-# bank, row and column.
+# This function compiles a mask for removeMaskedBitsV2 into a table of the
+# runs of 1 bits in the mask, so that the bits can be gathered with a few 
+# shifts instead of one loop iteration per bit.
 # Parameters:
-#     int phyaddr: the physical address to translate
-#     int nodes: the PCI address for each nodes
+#     int mask: the mask
 # Return value:
-#     A dictionary with the follwing fields:
-#          Node, Channel, Rank, Bank, Row, and Col
-# Note this is for AMD family 10h processors, only tested on Opteron 6174
-# This algorithm is mostly taken directly from AMD BKDG for 10h processors
-def physical2dram( phyaddr, nodes, cache_pci):
-#configData = pciconfig.getPCIConfig(0x0, 0x0, 0x18, 0x1, 0x110)
-#print hex(configData)
+#     A list of (source bit, number of bits, destination bit), one for each
+#     run of 1 bits in the mask
+def compileMask(mask):
+    segments = []
+    src = 0
+    dst = 0
+    while mask != 0:
+        if (mask & 0x1) == 1:
+            width = 0
+            while (mask & 0x1) == 1:
+                width = width + 1
+                mask = mask >> 1
+            segments.append((src, width, dst))
+            src = src + width
+            dst = dst + width
+        else:
+            mask = mask >> 1
+            src = src + 1
 
-    if debug is True:
-        print "Translating physcial address: ", hex(phyaddr)
-        
-    pciconfig.debug = debug
+    return segments
+
+# This function removes masked bits from addr with a table returned by 
+# compileMask; the result is the same as removeMaskedBitsV2(addr, mask)
+def gatherBits(addr, segments):
+    addr_out = 0
+    for (src, width, dst) in segments:
+        addr_out = addr_out | (((addr >> src) & ((1 << width) - 1)) << dst)
+
+    return addr_out
+
+# This function removes masked bits from a numpy array of addresses with a
+# table returned by compileMask
+# Parameters:
+#     numpy array addrs: the addresses, uint64
+#     list segments: the table
+# Return value:
+#     numpy array of the results, uint64
+def gatherBitsArray(addrs, segments):
+    U = numpy.uint64
+    addrs_out = numpy.zeros(addrs.shape, dtype=numpy.uint64)
+    for (src, width, dst) in segments:
+        addrs_out |= ((addrs >> U(src)) & U((1 << width) - 1)) << U(dst)
+
+    return addrs_out
+
+# The fields of the dram addresses returned by decodePlan.translateArray
+DRAM_DTYPE = [('node', 'u1'), ('channel', 'u1'), ('rank', 'u1'), 
+              ('bank', 'u1'), ('row', '<u4'), ('col', '<u4')]
+
+# This function finds the PCI addresses of the memory controllers (nodes)
+# with "lspci", or from the PCI snapshot in use. The result is kept, so 
+# "lspci" is only run once.
+# Return value:
+#     A list of (bus, slot), one for each node
+nodes_cache = None
+def findNodes():
+    global nodes_cache
+    if pciconfig.snapshot is not None:
+        return pciconfig.snapshot.nodes
+    if nodes_cache is not None:
+        return nodes_cache
 
     # lspci, and find the right PCI domains, buses, slots and functions for address map and dram controller
-    if nodes == None:
-        lspcicmd = subprocess.Popen("lspci", stdout=subprocess.PIPE)
-        lspciout, lspcierr = lspcicmd.communicate()
+    lspcicmd = subprocess.Popen("lspci", stdout=subprocess.PIPE)
+    lspciout, lspcierr = lspcicmd.communicate()
         
-        lspciouts = lspciout.split('\n')
-        nodes = [] # a list of all MCTs/nodes
-
-        # process the output of "lspci", and collect the PCI for each node
-        for line in lspciouts:
-            if "DRAM Controller" in line:
-                pciaddr = line.split(' ')[0]
-                bus = int(pciaddr.split(':')[0], 16)
-                slot = int(pciaddr.split(':')[1].split('.')[0], 16)
-                node = (bus, slot)
-                nodes.append(node)
-                if debug is True:
-                    print "Find one memory controller/node at PCI address: 0000:" + hex(bus)[2:].zfill(2) + ":" + hex(slot)[2:].zfill(2)
+    lspciouts = lspciout.split('\n')
+    nodes = [] # a list of all MCTs/nodes
+
+    # process the output of "lspci", and collect the PCI for each node
+    for line in lspciouts:
+        if "DRAM Controller" in line:
+            pciaddr = line.split(' ')[0]
+            bus = int(pciaddr.split(':')[0], 16)
+            slot = int(pciaddr.split(':')[1].split('.')[0], 16)
+            node = (bus, slot)
+            nodes.append(node)
+            if debug is True:
+                print "Find one memory controller/node at PCI address: 0000:" + hex(bus)[2:].zfill(2) + ":" + hex(slot)[2:].zfill(2)
+
+    nodes_cache = nodes
+    return nodes
+
+# The DRAM address map of a machine, read once from the PCI configuration 
+# registers of all nodes. Translating an address with it only takes integer
+# operations, without reading any register.
+# Note this is for AMD family 10h processors, only tested on Opteron 6174
+# This algorithm is mostly taken directly from AMD BKDG for 10h processors
+class decodePlan:
+    # Parameters:
+    #     list nodes: the PCI address for each nodes, or None to find them
+    #                 with findNodes
+    #     bool cache_pci: whether to cache PCI configuration registers
+    def __init__(self, nodes, cache_pci):
+        pciconfig.debug = debug
+        if nodes == None:
+            nodes = findNodes()
+
+        self.nodes = []
+        for i in range(len(nodes)):
+            self.nodes.append(self.readNode(i, nodes[i], cache_pci))
+
+    # This function reads the registers of one node.
+    # check "AMD family 10h Processor BKDG" for description of related PCI configration registers
+    # Parameters:
+    #     int i: the index of the node
+    #     tuple node: the PCI (bus, slot) of the node
+    #     bool cache_pci: whether to cache PCI configuration registers
+    # Return value:
+    #     A dictionary of the settings of the node
+    def readNode(self, i, node, cache_pci):
+        def getConfig(function, address):
+            return pciconfig.getPCIConfig(0x0, node[0], node[1], function, 
+                                          address, cache_pci)
+        plan = dict()
 
-    CSFound = False
-    NodeFound = False
-    for i in range(len(nodes)):
-        node = nodes[i]
-        
         # get the base memory address for this memory controller
-        # check "AMD family 10h Processor BKDG" for description of related PCI configration registers
         F1Offset = 0x40 + (i << 3)
-        DramBaseLow = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x1, 
-                                             F1Offset, cache_pci)
-        DramEn = DramBaseLow & 0x00000003
+        DramBaseLow = getConfig(0x1, F1Offset)
+        plan['DramEn'] = DramBaseLow & 0x00000003
         IntlvEn = (DramBaseLow & 0x00000700) >> 8
+        plan['IntlvEn'] = IntlvEn
         DramBaseLow = DramBaseLow & 0xFFFF0000
-        DramBaseHigh = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x1, 
-                                              F1Offset + 0x100, cache_pci)
-        DramBaseHigh = DramBaseHigh & 0xFF
-        DramBaseLong = ((DramBaseHigh << 32) + DramBaseLow) << 8
-        
+        DramBaseHigh = getConfig(0x1, F1Offset + 0x100) & 0xFF
+        plan['DramBase'] = ((DramBaseHigh << 32) + DramBaseLow) << 8
+
         # get the memory address limit for this memory controller
-        DramLimitLow = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x1, 
-                                              F1Offset + 0x4, cache_pci)
-        NodeID = DramLimitLow & 0x00000007
-        IntlvSel = (DramLimitLow & 0x00000700) >> 8
+        DramLimitLow = getConfig(0x1, F1Offset + 0x4)
+        plan['NodeID'] = DramLimitLow & 0x00000007
+        plan['IntlvSel'] = (DramLimitLow & 0x00000700) >> 8
         DramLimitLow = DramLimitLow | 0x0000FFFF
-        DramLimitHigh = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x1, 
-                                               F1Offset + 0x104, cache_pci)
-        DramLimitHigh = DramLimitHigh & 0xFF
-        DramLimitLong = (((DramLimitHigh << 32) + DramLimitLow) << 8) | 0xFF
+        DramLimitHigh = getConfig(0x1, F1Offset + 0x104) & 0xFF
+        plan['DramLimit'] = (((DramLimitHigh << 32) + DramLimitLow) << 8) | 0xFF
 
         if debug is True:
-            print "Node " + str(NodeID) + ": base memory address: " + hex(DramBaseLong) + ", memory limit: ", hex(DramLimitLong)
+            print "Node " + str(plan['NodeID']) + ": base memory address: " + hex(plan['DramBase']) + ", memory limit: ", hex(plan['DramLimit'])
+
+        # node interleaving
+        if IntlvEn == 1:
+            plan['Ilog'] = 1
+        elif IntlvEn == 3:
+            plan['Ilog'] = 2
+        elif IntlvEn == 7:
+            plan['Ilog'] = 7
+        else:
+            plan['Ilog'] = 0
 
         # get the memory hole address for this memory controller
-        HoleEn = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x1, 0xF0, 
-                                        cache_pci)
-        HoleOffset = HoleEn & 0x0000FF80
-        HoleEn = HoleEn & 0x00000003
+        HoleEn = getConfig(0x1, 0xF0)
+        plan['HoleOffset'] = HoleEn & 0x0000FF80
+        plan['HoleEn'] = HoleEn & 0x00000003
         if debug is True:
-            print "Node " + str(NodeID) + ":  memory hole enabled: " + hex(HoleEn) + ", memory hole offset: ", hex(HoleOffset)
+            print "Node " + str(plan['NodeID']) + ":  memory hole enabled: " + hex(plan['HoleEn']) + ", memory hole offset: ", hex(plan['HoleOffset'])
 
-        
-        # now lets check whether the physical address belongs to this memory controller/node
-        if (DramEn != 0x0) and (DramBaseLong <= phyaddr) and (phyaddr <= DramLimitLong):
-            NodeFound = True
+        # "swap interleaved region"
+        Temp = getConfig(0x2, 0x10C)
+        plan['IntLvRgnSwapEn'] = Temp & 0x1
+        plan['IntLvRgnBaseAddr'] = (Temp >> 3) & 0x7F
+        plan['IntLvRgnLmtAddr'] = (Temp >> 11) & 0x7F
+        plan['IntLvRgnSize'] = (Temp >> 20) & 0x7F
 
-            if debug is True:
-                print "Physical address " + hex(phyaddr) + " belongs to node " + str(NodeID)
-            
-            # check node interleaving
-            if (IntlvEn == 0x0) or (IntlvSel == ((phyaddr >> 12) & IntlvEn)):
-                if IntlvEn == 1:
-                    Ilog = 1
-                elif IntlvEn == 3:
-                    Ilog = 2
-                elif IntlvEn == 7:
-                    Ilog = 7
-                else:
-                    Ilog = 0
-                    
-            #if debug is True:
-            #    print "Ilog is", Ilog
-
-            # modified the physical address based on "swap interleaved region"
-            Temp = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x2, 0x10C, 
-                                          cache_pci)
-            IntLvRgnSwapEn = Temp & 0x1
-            if IntLvRgnSwapEn != 0:
-                IntLvRgnBaseAddr = (Temp >> 3) & 0x7F
-                IntLvRgnLmtAddr = (Temp >> 11) & 0x7F
-                IntLvRgnSize = (Temp >> 20) & 0x7F
-                if ((phyaddr >> 34) == 0) and (((phyaddr >> 27) >= IntLvRgnBaseAddr) and ((phyaddr >> 27) <= IntLvRgnLmtAddr) or ((phyaddr >> 27) < IntLvRgnSize)):
-                   phyaddr = phyaddr ^ (IntLvRgnBaseAddr << 27)
-            if debug is True:
-                print "Physical address after \"swap interleaved region\" is", hex(phyaddr)
-            # end of "swap interleaved region"
-
-            # determine which channel (dram controller or DCT) to use (dual-channel here)
-            Temp = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x2, 0x110,
-                                          cache_pci)
-            DctSelHiRngEn = Temp & 1
-            DctSelHi = (Temp >> 1) & 1
-            DctSelIntLvEn = Temp & 4
-            DctGangEn = Temp & 0x10
-            DctSelIntLvAddr = (Temp >> 6) & 3
-            DctSelBaseAddr = Temp & 0xFFFFF800
-            DctSelBaseOffsetLong = (pciconfig.getPCIConfig(0x0, node[0], 
-                                                           node[1], 0x2, 0x114,
-                                                           cache_pci) 
-                                    & 0xFFFFFC00) << 16
-            
-            if debug is True:
-                print "DCT_select_high_enabled is", DctSelHiRngEn, ", DCT_high_range_DCT is", DctSelHi, ", DCT_interleave_enabled is", DctSelIntLvEn
-                print "DCT_is_ganged is", DctGangEn, ", Dct_channel_interleave_bits are", bin(DctSelIntLvAddr), ", Dct_high_addr_bits are", hex(DctSelBaseAddr)
-                print "Dct_base_address is", hex(DctSelBaseOffsetLong)
-
-            # determine if high range is selected
-            if (DctSelHiRngEn !=0) and (DctGangEn == 0) and ((phyaddr >> 27) >= (DctSelBaseAddr >> 11)):
-                HiRangeSelected = True
-            else:
-                HiRangeSelected = False
-            
-            if debug is True:
-                print "DCT high ranged selected is", HiRangeSelected
-
-            # now, let's really determine which channel to use
-            if (DctGangEn != 0):
-                ChannelSelect = 0
-            elif HiRangeSelected is True:
-                ChannelSelect = DctSelHi
-            elif (DctSelIntLvEn != 0) and (DctSelIntLvAddr == 0):
-                ChannelSelect = (phyaddr >> 6) & 1;
-            elif (DctSelIntLvEn != 0) and ( ((DctSelIntLvAddr>>1)&1) != 0):
-                fivebits = (phyaddr >> 16) & 0x1F
-                bit0 = fivebits & 0x1
-                bit1 = (fivebits>>1) & 0x1
-                bit2 = (fivebits>>2) & 0x1
-                bit3 = (fivebits>>3) & 0x1
-                bit4 = (fivebits>>4) & 0x1
-                temp = (bit0 ^ bit1 ^ bit2 ^ bit3 ^ bit4) & 0x1
-                if ((DctSelIntLvAddr & 1) != 0):
-                    ChannelSelect = (((phyaddr>>9) & 0x1) ^ temp) & 0x1
-                else:
-                    ChannelSelect = (((phyaddr>>6) & 0x1) ^ temp ) & 0x1
-            elif (DctSelIntLvEn != 0) and ((IntLvEn & 4) != 0):
-                ChannelSelect = (phyaddr>>15) & 0x1
-            elif (DctSelIntLvEn != 0) and ((IntLvEn & 2) != 0):
-                ChannelSelect = (phyaddr>>14) & 0x1
-            elif (DctSelIntLvEn != 0) and ((IntLvEn & 1) != 0):
-                ChannelSelect = (phyaddr>>13) & 0x1
-            elif (DctSelIntLvEn != 0):
-                ChannelSelect = (phyaddr>>12) & 0x1
-            elif (DctSelHiRngEn != 0) and (DctGangEn == 0):
-                ChannelSelect = ~DctSelHi & 0x1
-            else:
-                ChannelSelect = 0
-            if debug is True:
-                print "Channel is", ChannelSelect
+        # channel (dram controller or DCT) selection (dual-channel here)
+        Temp = getConfig(0x2, 0x110)
+        plan['DctSelHiRngEn'] = Temp & 1
+        plan['DctSelHi'] = (Temp >> 1) & 1
+        plan['DctSelIntLvEn'] = Temp & 4
+        plan['DctGangEn'] = Temp & 0x10
+        plan['DctSelIntLvAddr'] = (Temp >> 6) & 3
+        plan['DctSelBaseAddr'] = Temp & 0xFFFFF800
+        plan['DctSelBaseOffsetLong'] = (getConfig(0x2, 0x114) 
+                                        & 0xFFFFFC00) << 16
+        if debug is True:
+            print "DCT_select_high_enabled is", plan['DctSelHiRngEn'], ", DCT_high_range_DCT is", plan['DctSelHi'], ", DCT_interleave_enabled is", plan['DctSelIntLvEn']
+            print "DCT_is_ganged is", plan['DctGangEn'], ", Dct_channel_interleave_bits are", bin(plan['DctSelIntLvAddr']), ", Dct_high_addr_bits are", hex(plan['DctSelBaseAddr'])
+            print "Dct_base_address is", hex(plan['DctSelBaseOffsetLong'])
 
-            # determine base address offset to use
-            if HiRangeSelected is True:
-                if ((DctSelBaseAddr & 0xFFFF0000) == 0) and ((HoleEn & 1) != 0) and (phyaddr >= 0x100000000):
-                    ChannelOffsetLong = HoleOffset << 16
-                else:
-                    ChannelOffsetLong = DctSelBaseOffsetLong
-            else:
-                if ((HoleEn & 1) != 0) and (phyaddr >= 0x100000000):
-                    ChannelOffsetLong = HoleOffset << 16
-                else:
-                    ChannelOffsetLong = DramBaseLong & 0xFFFFF8000000
-            if debug is True:
-                print "Channel base address offset is", hex(ChannelOffsetLong)
-
-            # remove hoisting offset and normalize to dram bus addresses
-            ChannelAddrLong = (phyaddr & 0x0000FFFFFFFFFFC0) - (ChannelOffsetLong & 0x0000FFFFFF800000)
-            # remove node ID (in case of processor interleaving)
-            Temp = ChannelAddrLong & 0xFC0
-            ChannelAddrLong = ((ChannelAddrLong >> Ilog) & 0xFFFFFFFFF000) | Temp
-            # remove channel interleave and hash
-            if (DctSelIntLvEn != 0) and (HiRangeSelected == 0) and (DctGangEn == 0):
-                if ((DctSelIntLvAddr & 1) != 1):
-                    ChannelAddrLong = (ChannelAddrLong >> 1) & 0xFFFFFFFFFFFFFFC0
-                elif (DctSelIntLvAddr == 1):
-                    Temp = ChannelAddrLong & 0xFC0
-                    ChannelAddrLong = ((ChannelAddrLong & 0xFFFFFFFFFFFFE000) >> 1) | Temp
-                else: #ChannelAddrLong == 0b11
-                    Temp = ChannelAddrLong & 0x1C0
-                    ChannelAddrLong = ((ChannelAddrLong & 0xFFFFFFFFFFFFFC00) >> 1) | Temp
-            if debug is True:
-                print "Physical address ", hex(phyaddr), "normalized to DCT bus address", hex(ChannelAddrLong)
-            
-            # end channel determination
-            
-            # select the chip(rank)
-            InputAddr = ChannelAddrLong >> 8
-            
+        # the enabled chips (ranks) of both channels, as lists of 
+        # (CS, ~CSMask, CSBase & ~CSMask, table to remove the masked bits)
+        plan['CS'] = []
+        for ChannelSelect in range(2):
+            ranks = []
             for CS in range(0,8):
                 F2Offset = 0x40 + (CS << 2)
                 if ((CS % 2) == 0):
@@ -281,73 +261,357 @@ def physical2dram( phyaddr, nodes, cache_pci):
                     F2Offset = F2Offset + 0x100
                     F2MaskOffset = F2MaskOffset + 0x100
                     
-                CSBase = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x2, 
-                                                F2Offset, cache_pci)
+                CSBase = getConfig(0x2, F2Offset)
                 CSEn = CSBase & 0x00000001
                 CSBase = CSBase & 0x1FF83FE0
-                CSMask = pciconfig.getPCIConfig(0x0, node[0], node[1], 0x2, 
-                                                F2MaskOffset, cache_pci)
+                CSMask = getConfig(0x2, F2MaskOffset)
                 CSMask = (CSMask | 0x0007C01F) & 0x1FFFFFFF
 
                 if debug is True:
-                    print "Rank ", CS, ": CSBase is", hex(CSBase<<8), "(" + str((CSBase<<8)/(1024*1024)) + "MB)", ", CSMask is", hex(CSMask)
-                
-                if (CSEn != 0) and ((InputAddr & ~CSMask) == (CSBase & ~CSMask)):
-                    CSFound = 1
-                    OnlineSpareCTL = pciconfig.getPCIConfig(0x0, node[0], 
-                                                            node[1], 0x3, 0xB0,
-                                                            cache_pci)
-                    if ChannelSelect == 1:
-                        SwapDone = (OnlineSpareCTL >> 3) & 0x00000001
-                        BadDramCS = (OnlineSpareCTL >> 8) & 0x00000007
-                        if (SwapDone != 0) and (CS == BadDramCS):
-                            print "Need channel 1 (DCT1) online spare chip/rank"
-                    else:
-                        SwapDone = (OnlineSpareCTL >> 1) & 0x00000001
-                        BadDramCS = (OnlineSpareCTL >> 4) & 0x00000007
-                        if (SwapDone != 0) and (CS == BadDramCS):
-                            print "Need channel 0 (DCT1) online spare chip/rank"
-
-                    # Let parse the normalized address and get the bank, row and col
-                    # first, remove masked bits and get normalized address for this rank
-                    rankaddr = removeMaskedBitsV2(ChannelAddrLong, (CSMask<<8)|0xff)
-                    if debug is True:
-                        print "Rank normalized address is", hex(rankaddr)
-                    # second, lets get the DRAM address map
-                    # Note that I am only reading the DIMM slot 0 here. The 
-                    # other slots are configured at higher bits of the same
-                    # PCI register (0x80 and 0x180).
-                    DramAddrMapOffset = 0x80
-                    if ChannelSelect == 1:
-                        DramAddrMapOffset = DramAddrMapOffset + 0x100
-                    DramAddrMap = pciconfig.getPCIConfig(0x0, node[0], node[1], 
-                                                         0x2, DramAddrMapOffset,
-                                                         cache_pci)
-                    DramAddrMap = DramAddrMap & 0xf
-                    if debug is True:
-                        print "DramAddrMap is", bin(DramAddrMap)
-                    if DramAddrMap == 0b111:
-                        bank = rankaddr>>13 & 0b111
-                        row = (((rankaddr>>16) & 0b11) << 13) | ((rankaddr>>18) & 0x1FFF)
-                        col = (rankaddr>>3) & 0x3FF
-                    else:
-                        print "Other Dram Address Map is not implemented yet."
-                        
-                    break
-
-            # since we have found the dram configuration, we can leave now
-            break
-
-    if NodeFound is False:
+                    print "Channel", ChannelSelect, "Rank ", CS, ": CSBase is", hex(CSBase<<8), "(" + str((CSBase<<8)/(1024*1024)) + "MB)", ", CSMask is", hex(CSMask)
+
+                if CSEn != 0:
+                    ranks.append((CS, ~CSMask, CSBase & ~CSMask, 
+                                  compileMask((CSMask<<8)|0xff)))
+            plan['CS'].append(ranks)
+
+        # online spare chips (ranks), for both channels
+        OnlineSpareCTL = getConfig(0x3, 0xB0)
+        plan['SwapDone'] = [(OnlineSpareCTL >> 1) & 0x00000001,
+                            (OnlineSpareCTL >> 3) & 0x00000001]
+        plan['BadDramCS'] = [(OnlineSpareCTL >> 4) & 0x00000007, 
+                             (OnlineSpareCTL >> 8) & 0x00000007]
+
+        # the DRAM address maps of both channels
+        # Note that I am only reading the DIMM slot 0 here. The 
+        # other slots are configured at higher bits of the same
+        # PCI register (0x80 and 0x180).
+        plan['DramAddrMap'] = [getConfig(0x2, 0x80) & 0xf, 
+                               getConfig(0x2, 0x180) & 0xf]
+        if debug is True:
+            print "DramAddrMap is", bin(plan['DramAddrMap'][0]), bin(plan['DramAddrMap'][1])
+
+        return plan
+
+    # This function translates physical address into dram address as node,
+    # channel, rank, bank, row and column.
+    # Parameters:
+    #     int phyaddr: the physical address to translate
+    # Return value:
+    #     A dictionary with the follwing fields:
+    #          Node, Channel, Rank, Bank, Row, and Col
+    def translate(self, phyaddr):
+        for plan in self.nodes:
+            # now lets check whether the physical address belongs to this memory controller/node
+            if (plan['DramEn'] == 0x0) or (phyaddr < plan['DramBase']) or (phyaddr > plan['DramLimit']):
+                continue
+            # check node interleaving
+            IntlvEn = plan['IntlvEn']
+            if (IntlvEn != 0x0) and (plan['IntlvSel'] != ((phyaddr >> 12) & IntlvEn)):
+                continue
+            return self.translateInNode(plan, phyaddr)
+
         print "Strange, physical address" , hex(phyaddr), "belongs to no node!"
-        ramaddr = {'Node': 0, 'Channel': 0, 'Rank': 0, 'Bank': 0, 'Row': 0, 'Col':0}
-    else:
-        #print "Physical address", hex(phyaddr), ": node", NodeID, ", channel", ChannelSelect, ", rank", CS, ", bank", bank, ", row", row, ", col", col
-        ramaddr = {'Node': NodeID, 'Channel': ChannelSelect, 'Rank': CS, 'Bank': bank, 'Row': row, 'Col':col}
-    return ramaddr
-                
-            
-            
-        
+        return {'Node': 0, 'Channel': 0, 'Rank': 0, 'Bank': 0, 'Row': 0, 'Col':0}
+
+    # This function translates a physical address of a node, see translate
+    def translateInNode(self, plan, phyaddr):
+        # modified the physical address based on "swap interleaved region"
+        if plan['IntLvRgnSwapEn'] != 0:
+            if ((phyaddr >> 34) == 0) and (((phyaddr >> 27) >= plan['IntLvRgnBaseAddr']) and ((phyaddr >> 27) <= plan['IntLvRgnLmtAddr']) or ((phyaddr >> 27) < plan['IntLvRgnSize'])):
+                phyaddr = phyaddr ^ (plan['IntLvRgnBaseAddr'] << 27)
+
+        DctSelHiRngEn = plan['DctSelHiRngEn']
+        DctSelHi = plan['DctSelHi']
+        DctSelIntLvEn = plan['DctSelIntLvEn']
+        DctGangEn = plan['DctGangEn']
+        DctSelIntLvAddr = plan['DctSelIntLvAddr']
+        DctSelBaseAddr = plan['DctSelBaseAddr']
+        IntlvEn = plan['IntlvEn']
+
+        # determine if high range is selected
+        if (DctSelHiRngEn !=0) and (DctGangEn == 0) and ((phyaddr >> 27) >= (DctSelBaseAddr >> 11)):
+            HiRangeSelected = True
+        else:
+            HiRangeSelected = False
+
+        # now, let's really determine which channel to use
+        if (DctGangEn != 0):
+            ChannelSelect = 0
+        elif HiRangeSelected is True:
+            ChannelSelect = DctSelHi
+        elif (DctSelIntLvEn != 0) and (DctSelIntLvAddr == 0):
+            ChannelSelect = (phyaddr >> 6) & 1;
+        elif (DctSelIntLvEn != 0) and ( ((DctSelIntLvAddr>>1)&1) != 0):
+            fivebits = (phyaddr >> 16) & 0x1F
+            bit0 = fivebits & 0x1
+            bit1 = (fivebits>>1) & 0x1
+            bit2 = (fivebits>>2) & 0x1
+            bit3 = (fivebits>>3) & 0x1
+            bit4 = (fivebits>>4) & 0x1
+            temp = (bit0 ^ bit1 ^ bit2 ^ bit3 ^ bit4) & 0x1
+            if ((DctSelIntLvAddr & 1) != 0):
+                ChannelSelect = (((phyaddr>>9) & 0x1) ^ temp) & 0x1
+            else:
+                ChannelSelect = (((phyaddr>>6) & 0x1) ^ temp ) & 0x1
+        elif (DctSelIntLvEn != 0) and ((IntlvEn & 4) != 0):
+            ChannelSelect = (phyaddr>>15) & 0x1
+        elif (DctSelIntLvEn != 0) and ((IntlvEn & 2) != 0):
+            ChannelSelect = (phyaddr>>14) & 0x1
+        elif (DctSelIntLvEn != 0) and ((IntlvEn & 1) != 0):
+            ChannelSelect = (phyaddr>>13) & 0x1
+        elif (DctSelIntLvEn != 0):
+            ChannelSelect = (phyaddr>>12) & 0x1
+        elif (DctSelHiRngEn != 0) and (DctGangEn == 0):
+            ChannelSelect = ~DctSelHi & 0x1
+        else:
+            ChannelSelect = 0
+
+        # determine base address offset to use
+        if HiRangeSelected is True:
+            if ((DctSelBaseAddr & 0xFFFF0000) == 0) and ((plan['HoleEn'] & 1) != 0) and (phyaddr >= 0x100000000):
+                ChannelOffsetLong = plan['HoleOffset'] << 16
+            else:
+                ChannelOffsetLong = plan['DctSelBaseOffsetLong']
+        else:
+            if ((plan['HoleEn'] & 1) != 0) and (phyaddr >= 0x100000000):
+                ChannelOffsetLong = plan['HoleOffset'] << 16
+            else:
+                ChannelOffsetLong = plan['DramBase'] & 0xFFFFF8000000
+
+        # remove hoisting offset and normalize to dram bus addresses
+        ChannelAddrLong = (phyaddr & 0x0000FFFFFFFFFFC0) - (ChannelOffsetLong & 0x0000FFFFFF800000)
+        # remove node ID (in case of processor interleaving)
+        Temp = ChannelAddrLong & 0xFC0
+        ChannelAddrLong = ((ChannelAddrLong >> plan['Ilog']) & 0xFFFFFFFFF000) | Temp
+        # remove channel interleave and hash
+        if (DctSelIntLvEn != 0) and (HiRangeSelected == 0) and (DctGangEn == 0):
+            if ((DctSelIntLvAddr & 1) != 1):
+                ChannelAddrLong = (ChannelAddrLong >> 1) & 0xFFFFFFFFFFFFFFC0
+            elif (DctSelIntLvAddr == 1):
+                Temp = ChannelAddrLong & 0xFC0
+                ChannelAddrLong = ((ChannelAddrLong & 0xFFFFFFFFFFFFE000) >> 1) | Temp
+            else: #ChannelAddrLong == 0b11
+                Temp = ChannelAddrLong & 0x1C0
+                ChannelAddrLong = ((ChannelAddrLong & 0xFFFFFFFFFFFFFC00) >> 1) | Temp
+
+        # select the chip(rank)
+        InputAddr = ChannelAddrLong >> 8
+        for (CS, NotCSMask, CSBaseMasked, segments) in plan['CS'][ChannelSelect]:
+            if (InputAddr & NotCSMask) != CSBaseMasked:
+                continue
+
+            if (plan['SwapDone'][ChannelSelect] != 0) and (CS == plan['BadDramCS'][ChannelSelect]):
+                print "Need channel", ChannelSelect, "(DCT" + str(ChannelSelect) + ") online spare chip/rank"
+
+            # Let parse the normalized address and get the bank, row and col
+            # first, remove masked bits and get normalized address for this rank
+            rankaddr = gatherBits(ChannelAddrLong, segments)
+            # second, use the DRAM address map
+            if plan['DramAddrMap'][ChannelSelect] == 0b111:
+                bank = rankaddr>>13 & 0b111
+                row = (((rankaddr>>16) & 0b11) << 13) | ((rankaddr>>18) & 0x1FFF)
+                col = (rankaddr>>3) & 0x3FF
+            else:
+                print "Other Dram Address Map is not implemented yet."
+                bank = 0
+                row = 0
+                col = 0
+
+            return {'Node': plan['NodeID'], 'Channel': ChannelSelect, 'Rank': CS, 'Bank': bank, 'Row': row, 'Col':col}
+
+        print "Strange, physical address" , hex(phyaddr), "belongs to no rank!"
+        return {'Node': plan['NodeID'], 'Channel': ChannelSelect, 'Rank': 0, 'Bank': 0, 'Row': 0, 'Col':0}
+
+    # This function translates a numpy array of physical addresses at once,
+    # with the same steps as translate done with array operations. The 
+    # messages of translate are printed once per array, with the number of
+    # addresses.
+    # Parameters:
+    #     phyaddrs: the physical addresses, numpy array or list
+    # Return value:
+    #     A numpy structured array of the dram addresses, with the fields in
+    #     DRAM_DTYPE; the fields are 0 for the addresses that can not be
+    #     translated
+    def translateArray(self, phyaddrs):
+        phyaddrs = numpy.asarray(phyaddrs, dtype=numpy.uint64)
+        U = numpy.uint64
+        ramaddrs = numpy.zeros(phyaddrs.shape, dtype=DRAM_DTYPE)
+        found = numpy.zeros(phyaddrs.shape, dtype=bool)
+        for plan in self.nodes:
+            if plan['DramEn'] == 0x0:
+                continue
+            # the addresses of this memory controller/node
+            sel = (~found) & (phyaddrs >= U(plan['DramBase'])) & \
+                  (phyaddrs <= U(plan['DramLimit']))
+            IntlvEn = plan['IntlvEn']
+            if IntlvEn != 0x0:
+                sel &= ((phyaddrs >> U(12)) & U(IntlvEn)) == U(plan['IntlvSel'])
+            if not sel.any():
+                continue
+            found |= sel
+            ramaddrs[sel] = self.translateArrayInNode(plan, phyaddrs[sel])
+
+        if not found.all():
+            print "Strange,", (~found).sum(), "physical addresses belong to no node!"
+        return ramaddrs
 
+    # This function translates physical addresses of a node, see 
+    # translateArray and translateInNode
+    def translateArrayInNode(self, plan, phyaddr):
+        U = numpy.uint64
+        ramaddrs = numpy.zeros(phyaddr.shape, dtype=DRAM_DTYPE)
+        ramaddrs['node'] = plan['NodeID']
+
+        # modified the physical address based on "swap interleaved region"
+        if plan['IntLvRgnSwapEn'] != 0:
+            region = phyaddr >> U(27)
+            swap = ((phyaddr >> U(34)) == U(0)) & \
+                   (((region >= U(plan['IntLvRgnBaseAddr'])) & 
+                     (region <= U(plan['IntLvRgnLmtAddr']))) |
+                    (region < U(plan['IntLvRgnSize'])))
+            phyaddr = numpy.where(swap, 
+                                  phyaddr ^ U(plan['IntLvRgnBaseAddr'] << 27),
+                                  phyaddr)
+
+        DctSelHiRngEn = plan['DctSelHiRngEn']
+        DctSelIntLvEn = plan['DctSelIntLvEn']
+        DctGangEn = plan['DctGangEn']
+        DctSelIntLvAddr = plan['DctSelIntLvAddr']
+        DctSelBaseAddr = plan['DctSelBaseAddr']
+        IntlvEn = plan['IntlvEn']
+
+        # determine if high range is selected
+        if (DctSelHiRngEn !=0) and (DctGangEn == 0):
+            HiRangeSelected = (phyaddr >> U(27)) >= U(DctSelBaseAddr >> 11)
+        else:
+            HiRangeSelected = numpy.zeros(phyaddr.shape, dtype=bool)
+
+        # now, let's really determine which channel to use; the branches
+        # after the high range only depend on the registers
+        if (DctGangEn != 0):
+            ChannelSelect = numpy.zeros(phyaddr.shape, dtype=numpy.uint64)
+        elif (DctSelIntLvEn != 0) and (DctSelIntLvAddr == 0):
+            ChannelSelect = (phyaddr >> U(6)) & U(1)
+        elif (DctSelIntLvEn != 0) and ( ((DctSelIntLvAddr>>1)&1) != 0):
+            fivebits = (phyaddr >> U(16)) & U(0x1F)
+            temp = (fivebits ^ (fivebits >> U(1)) ^ (fivebits >> U(2)) ^ 
+                    (fivebits >> U(3)) ^ (fivebits >> U(4))) & U(0x1)
+            if ((DctSelIntLvAddr & 1) != 0):
+                ChannelSelect = ((phyaddr >> U(9)) ^ temp) & U(0x1)
+            else:
+                ChannelSelect = ((phyaddr >> U(6)) ^ temp) & U(0x1)
+        elif (DctSelIntLvEn != 0) and ((IntlvEn & 4) != 0):
+            ChannelSelect = (phyaddr >> U(15)) & U(0x1)
+        elif (DctSelIntLvEn != 0) and ((IntlvEn & 2) != 0):
+            ChannelSelect = (phyaddr >> U(14)) & U(0x1)
+        elif (DctSelIntLvEn != 0) and ((IntlvEn & 1) != 0):
+            ChannelSelect = (phyaddr >> U(13)) & U(0x1)
+        elif (DctSelIntLvEn != 0):
+            ChannelSelect = (phyaddr >> U(12)) & U(0x1)
+        elif (DctSelHiRngEn != 0) and (DctGangEn == 0):
+            ChannelSelect = numpy.full(phyaddr.shape, ~plan['DctSelHi'] & 0x1,
+                                       dtype=numpy.uint64)
+        else:
+            ChannelSelect = numpy.zeros(phyaddr.shape, dtype=numpy.uint64)
+        ChannelSelect = numpy.where(HiRangeSelected, U(plan['DctSelHi']),
+                                    ChannelSelect)
+
+        # determine base address offset to use
+        above4G = phyaddr >= U(0x100000000)
+        HoleOffset = U(plan['HoleOffset'] << 16)
+        if (plan['HoleEn'] & 1) != 0:
+            if (DctSelBaseAddr & 0xFFFF0000) == 0:
+                HiOffset = numpy.where(above4G, HoleOffset, 
+                                       U(plan['DctSelBaseOffsetLong']))
+            else:
+                HiOffset = U(plan['DctSelBaseOffsetLong'])
+            LoOffset = numpy.where(above4G, HoleOffset, 
+                                   U(plan['DramBase'] & 0xFFFFF8000000))
+        else:
+            HiOffset = U(plan['DctSelBaseOffsetLong'])
+            LoOffset = U(plan['DramBase'] & 0xFFFFF8000000)
+        ChannelOffsetLong = numpy.where(HiRangeSelected, HiOffset, LoOffset)
+
+        # remove hoisting offset and normalize to dram bus addresses; the 
+        # subtraction may wrap around, which does not change the bits kept
+        # below
+        ChannelAddrLong = (phyaddr & U(0x0000FFFFFFFFFFC0)) - \
+                          (ChannelOffsetLong & U(0x0000FFFFFF800000))
+        # remove node ID (in case of processor interleaving)
+        Temp = ChannelAddrLong & U(0xFC0)
+        ChannelAddrLong = ((ChannelAddrLong >> U(plan['Ilog'])) & 
+                           U(0xFFFFFFFFF000)) | Temp
+        # remove channel interleave and hash
+        if (DctSelIntLvEn != 0) and (DctGangEn == 0):
+            if ((DctSelIntLvAddr & 1) != 1):
+                Removed = (ChannelAddrLong >> U(1)) & U(0xFFFFFFFFFFFFFFC0)
+            elif (DctSelIntLvAddr == 1):
+                Temp = ChannelAddrLong & U(0xFC0)
+                Removed = ((ChannelAddrLong & U(0xFFFFFFFFFFFFE000)) >> U(1)) | Temp
+            else: #ChannelAddrLong == 0b11
+                Temp = ChannelAddrLong & U(0x1C0)
+                Removed = ((ChannelAddrLong & U(0xFFFFFFFFFFFFFC00)) >> U(1)) | Temp
+            ChannelAddrLong = numpy.where(HiRangeSelected, ChannelAddrLong, 
+                                          Removed)
+        ramaddrs['channel'] = ChannelSelect
+
+        # select the chip(rank), for each channel
+        InputAddr = ChannelAddrLong >> U(8)
+        rankFound = numpy.zeros(phyaddr.shape, dtype=bool)
+        for ch in range(2):
+            chsel = ChannelSelect == U(ch)
+            for (CS, NotCSMask, CSBaseMasked, segments) in plan['CS'][ch]:
+                sel = chsel & (~rankFound) & \
+                      ((InputAddr & U(NotCSMask & 0xFFFFFFFFFFFFFFFF)) == 
+                       U(CSBaseMasked))
+                if not sel.any():
+                    continue
+                rankFound |= sel
+
+                if (plan['SwapDone'][ch] != 0) and (CS == plan['BadDramCS'][ch]):
+                    print "Need channel", ch, "(DCT" + str(ch) + ") online spare chip/rank"
+
+                ramaddrs['rank'][sel] = CS
+                if plan['DramAddrMap'][ch] == 0b111:
+                    rankaddr = gatherBitsArray(ChannelAddrLong[sel], segments)
+                    ramaddrs['bank'][sel] = (rankaddr >> U(13)) & U(0b111)
+                    ramaddrs['row'][sel] = (((rankaddr >> U(16)) & U(0b11)) << U(13)) | ((rankaddr >> U(18)) & U(0x1FFF))
+                    ramaddrs['col'][sel] = (rankaddr >> U(3)) & U(0x3FF)
+                else:
+                    print "Other Dram Address Map is not implemented yet."
+
+        if not rankFound.all():
+            print "Strange,", (~rankFound).sum(), "physical addresses belong to no rank!"
+        return ramaddrs
+
+# The decode plans built by physical2dram, one for each list of nodes
+plans = dict()
+
+# This function translates physical address into dram address as node, channel, rank,
+# bank, row and column.
+# Parameters:
+#     int phyaddr: the physical address to translate
+#     int nodes: the PCI address for each nodes
+#     bool cache_pci: whether to cache PCI configuration registers; if so,
+#                     the decode plan is also kept and reused
+# Return value:
+#     A dictionary with the follwing fields:
+#          Node, Channel, Rank, Bank, Row, and Col
+# Note this is for AMD family 10h processors, only tested on Opteron 6174
+# To translate many addresses, build a decodePlan once and use its translate.
+def physical2dram( phyaddr, nodes, cache_pci):
+    if debug is True:
+        print "Translating physcial address: ", hex(phyaddr)
+
+    if nodes == None:
+        nodes = findNodes()
+
+    key = tuple(nodes)
+    if plans.has_key(key) and cache_pci:
+        plan = plans[key]
+    else:
+        plan = decodePlan(nodes, cache_pci)
+        plans[key] = plan
 
+    return plan.translate(phyaddr)
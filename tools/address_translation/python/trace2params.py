@@ -0,0 +1,468 @@
+#!/usr/bin/python
+
+# This file extracts the parameter file of the hit/miss/conflict ratio model
+# (python_impl/ratio_model/parameters.txt) from a trace of the memory accesses
+# of one thread. The trace is read in chunks of numpy arrays (memory-mapped
+# for the binary formats), every chunk is decoded to DRAM addresses at once
+# with physical2dram.decodePlan.translateArray, and only counters are kept
+# between chunks, so traces of any size can be processed.
+#
+# Trace formats:
+#     text: one physical address (hex) per line; lines starting with "#" are
+#           skipped
+#     binary: physical addresses as little-endian uint64, nothing else
+#     npy: a .npy file with a 1-D array of physical addresses, or the records
+#          written by "virtual2dram.py --binary" (without --rle), whose DRAM
+#          fields are used as they are
+#
+# For every channel in the trace (the target channel), the extracted
+# parameters are:
+#     t: the fraction of the accesses to the channel; the probability that
+#        two accesses to the channel go to the same bank, and the probability
+#        that two accesses to the same bank go to the same row (see
+#        occupancy.py); the shortest complete runs of consecutive accesses to
+#        the channel and to other channels (also the "mt" and "mn" lines)
+#     a: the channel reuse distances, i.e., the number of accesses from one
+#        access to the channel to the next one (1 for back-to-back accesses),
+#        distances larger than --max_dist are counted as --max_dist; for each
+#        distance, its probability and the fractions of the second accesses
+#        that are row buffer hits, misses and conflicts when the thread runs
+#        alone
+#     ca, cn: item n is the fraction of the accesses that follow n accesses
+#        to the channel (other channels for "cn") and also go to the channel
+#        (other channels), counted over the runs of the trace; item 0 is the
+#        fraction of all accesses
+#
+# The row buffer outcome of an access depends on the last access to its bank:
+# no access or a closed row is a miss, the same row is a hit, and another row
+# is a conflict. With the "open" policy, rows stay open; with "closed", every
+# row is closed after the access; with "timeout", a row is closed when its
+# bank has not been accessed for TIMEOUT / EST_TIME accesses of the thread,
+# the auto-close frame of the ratio model.
+
+import os
+import itertools
+from fractions import Fraction
+from optparse import OptionParser
+
+# numpy is required
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import physical2dram
+import pciconfig
+import occupancy
+
+# row buffer outcomes
+HIT = 0
+MISS = 1
+CONF = 2
+
+# This function reads a text trace in chunks
+# Parameters:
+#     str filename: path to the trace
+#     int chunk: number of addresses per chunk
+# Return value:
+#     A generator of numpy uint64 arrays of physical addresses
+def readTextChunks(filename, chunk):
+    f = open(filename, "r")
+    lines = (line for line in f
+             if not (line.isspace() or line.startswith("#")))
+    while True:
+        addrs = [int(line.split()[0], 16)
+                 for line in itertools.islice(lines, chunk)]
+        if len(addrs) == 0:
+            break
+        yield numpy.array(addrs, dtype=numpy.uint64)
+    f.close()
+
+# This function reads a binary or .npy trace in chunks, memory-mapped
+# Parameters:
+#     str filename: path to the trace
+#     str fmt: "binary" or "npy"
+#     int chunk: number of addresses per chunk
+# Return value:
+#     A generator of numpy arrays, physical addresses or the records of
+#     dramrecords.py
+def readMappedChunks(filename, fmt, chunk):
+    if fmt == "npy":
+        trace = numpy.load(filename, mmap_mode="r")
+    elif os.path.getsize(filename) == 0:
+        return
+    else:
+        trace = numpy.memmap(filename, dtype="<u8", mode="r")
+    for start in xrange(0, len(trace), chunk):
+        yield trace[start:start + chunk]
+
+class paramExtractor:
+    # Parameters:
+    #     int chnls_per_node: number of channels of each node, for the
+    #                         channel ids
+    #     str policy: "open", "closed" or "timeout"
+    #     int frame: with "timeout", the number of accesses after which an
+    #                idle row is closed
+    #     int max_dist: the largest channel reuse distance kept
+    def __init__(self, chnls_per_node, policy, frame, max_dist):
+        self.chnls_per_node = chnls_per_node
+        self.policy = policy
+        self.frame = frame
+        self.max_dist = max_dist
+        self.count = 0
+        self.counter = occupancy.occupancyCounter(1)
+        # channel id ==> (node, channel)
+        self.chnls = dict()
+        # bank key ==> (position of the last access, its row)
+        self.banks = dict()
+        # channel id ==> position of the last access
+        self.last_pos = dict()
+        # channel id ==> counts of (distance, outcome), a numpy array
+        self.dists = dict()
+        # channel id ==> the current run: (target channel or not, length,
+        # whether it started the trace)
+        self.runs = dict()
+        # channel id ==> run length ==> number of runs, of the channel and of
+        # the other channels
+        self.acc_runs = dict()
+        self.noacc_runs = dict()
+        # channel id ==> shortest complete runs
+        self.min_acc = dict()
+        self.min_noacc = dict()
+
+    # This function counts a chunk of decoded accesses, in trace order
+    # Parameters:
+    #     ramaddrs: numpy structured array with the fields node, channel,
+    #               rank, bank and row
+    def addChunk(self, ramaddrs):
+        n = len(ramaddrs)
+        if n == 0:
+            return
+        self.counter.addArray(ramaddrs, 1)
+        chnl = (ramaddrs['node'].astype(numpy.int64) * self.chnls_per_node +
+                ramaddrs['channel'])
+        bank = (chnl << 16) | (ramaddrs['rank'].astype(numpy.int64) << 8) | \
+               ramaddrs['bank']
+        row = ramaddrs['row'].astype(numpy.int64)
+        pos = numpy.arange(self.count, self.count + n, dtype=numpy.int64)
+
+        outcomes = self.rowOutcomes(bank, row, pos)
+
+        for c in numpy.unique(chnl).tolist():
+            if c not in self.chnls:
+                sel = numpy.flatnonzero(chnl == c)[0]
+                self.chnls[c] = (int(ramaddrs['node'][sel]),
+                                 int(ramaddrs['channel'][sel]))
+                self.dists[c] = numpy.zeros((self.max_dist + 1) * 3,
+                                            dtype=numpy.int64)
+                self.acc_runs[c] = dict()
+                self.noacc_runs[c] = dict()
+                # so far, the trace has only accessed other channels
+                self.runs[c] = (False, self.count, True)
+        for c in self.chnls:
+            target = (chnl == c)
+            self.countDists(c, pos[target], outcomes[target])
+            self.countRuns(c, target)
+
+        self.count += n
+
+    # This function gives the row buffer outcome of every access, see the
+    # beginning of this file
+    # Parameters:
+    #     bank, row, pos: numpy int64 arrays of the bank keys, rows and
+    #                     positions of the accesses
+    # Return value:
+    #     A numpy array of HIT, MISS or CONF
+    def rowOutcomes(self, bank, row, pos):
+        # the previous access to the same bank is the previous one in the
+        # accesses sorted by bank
+        order = numpy.argsort(bank, kind="mergesort")
+        sbank = bank[order]
+        srow = row[order]
+        spos = pos[order]
+        first = numpy.ones(len(order), dtype=bool)
+        first[1:] = sbank[1:] != sbank[:-1]
+        prev_pos = numpy.empty_like(spos)
+        prev_row = numpy.empty_like(srow)
+        prev_pos[1:] = spos[:-1]
+        prev_row[1:] = srow[:-1]
+        last = numpy.ones(len(order), dtype=bool)
+        last[:-1] = first[1:]
+        # the first accesses of every bank follow the previous chunks
+        for (i, b) in zip(numpy.flatnonzero(first).tolist(),
+                          sbank[first].tolist()):
+            (prev_pos[i], prev_row[i]) = self.banks.get(b, (-1, -1))
+        for (i, b) in zip(numpy.flatnonzero(last).tolist(),
+                          sbank[last].tolist()):
+            self.banks[b] = (int(spos[i]), int(srow[i]))
+
+        closed = prev_pos < 0
+        if self.policy == "closed":
+            closed[:] = True
+        elif self.policy == "timeout":
+            closed |= (spos - prev_pos) > self.frame
+        soutcomes = numpy.where(closed, MISS,
+                                numpy.where(prev_row == srow, HIT, CONF))
+        outcomes = numpy.empty_like(soutcomes)
+        outcomes[order] = soutcomes
+        return outcomes
+
+    # This function counts the channel reuse distances of a channel, and the
+    # outcomes of the second accesses
+    # Parameters:
+    #     int c: the channel id
+    #     pos, outcomes: numpy arrays of the positions and the row buffer
+    #                    outcomes of the accesses to the channel in a chunk
+    def countDists(self, c, pos, outcomes):
+        if len(pos) == 0:
+            return
+        prev = numpy.empty_like(pos)
+        prev[0] = self.last_pos.get(c, -1)
+        prev[1:] = pos[:-1]
+        self.last_pos[c] = int(pos[-1])
+        valid = prev >= 0
+        dists = numpy.minimum(pos[valid] - prev[valid], self.max_dist)
+        self.dists[c] += numpy.bincount(dists * 3 + outcomes[valid],
+                                        minlength=(self.max_dist + 1) * 3)
+
+    # This function counts the runs of consecutive accesses to a channel and
+    # to the other channels
+    # Parameters:
+    #     int c: the channel id
+    #     target: numpy bool array, whether the accesses of a chunk go to the
+    #             channel
+    def countRuns(self, c, target):
+        n = len(target)
+        starts = numpy.concatenate(([0], numpy.flatnonzero(target[1:] !=
+                                                           target[:-1]) + 1))
+        lens = numpy.diff(numpy.append(starts, n))
+        vals = target[starts]
+
+        (cur_val, cur_len, cur_first) = self.runs[c]
+        if cur_len > 0 and cur_val == vals[0]:
+            # the current run goes on
+            lens[0] += cur_len
+            first = cur_first
+        else:
+            if cur_len > 0:
+                self.addRuns(c, cur_val, numpy.array([cur_len]),
+                             numpy.array([not cur_first]))
+            first = (self.count == 0)
+
+        # every run but the last one of the chunk is complete, except the
+        # first run of the trace
+        complete = numpy.ones(len(lens) - 1, dtype=bool)
+        if first and len(complete) > 0:
+            complete[0] = False
+        for val in (True, False):
+            sel = vals[:-1] == val
+            self.addRuns(c, val, lens[:-1][sel], complete[sel])
+        if len(lens) > 1:
+            first = False
+        self.runs[c] = (bool(vals[-1]), int(lens[-1]), first)
+
+    # This function adds runs to the counts of a channel
+    # Parameters:
+    #     int c: the channel id
+    #     bool val: whether the runs are of the channel or of other channels
+    #     lens: numpy array of the run lengths
+    #     complete: numpy bool array, whether the runs are complete
+    def addRuns(self, c, val, lens, complete):
+        if len(lens) == 0:
+            return
+        if val:
+            (runs, mins) = (self.acc_runs[c], self.min_acc)
+        else:
+            (runs, mins) = (self.noacc_runs[c], self.min_noacc)
+        (lens_u, counts) = numpy.unique(lens, return_counts=True)
+        for (length, count) in zip(lens_u.tolist(), counts.tolist()):
+            runs[length] = runs.get(length, 0) + count
+        if complete.any():
+            length = int(lens[complete].min())
+            if (c not in mins) or (length < mins[c]):
+                mins[c] = length
+
+    # This function counts the runs that are still going on at the end of
+    # the trace; they are not complete
+    def finish(self):
+        for c in self.runs:
+            (cur_val, cur_len, cur_first) = self.runs[c]
+            if cur_len > 0:
+                self.addRuns(c, cur_val, numpy.array([cur_len]),
+                             numpy.array([False]))
+            self.runs[c] = (False, 0, False)
+
+    # This function gives the "ca" or "cn" table of a channel
+    # Parameters:
+    #     dict runs: run length ==> number of runs
+    #     int count: number of the accesses in these runs
+    # Return value:
+    #     A list of Fractions, items 0 to max_dist
+    def runTable(self, runs, count):
+        table = [Fraction(count, max(self.count, 1))]
+        lens = numpy.array(runs.keys(), dtype=numpy.int64)
+        cnts = numpy.array(runs.values(), dtype=numpy.int64)
+        for k in range(1, self.max_dist + 1):
+            # the accesses after k accesses of a run, and those of them
+            # that are still in the run
+            total = int((cnts * numpy.maximum(lens - k + 1, 0)).sum())
+            more = int((cnts * numpy.maximum(lens - k, 0)).sum())
+            table.append(Fraction(more, max(total, 1)))
+        return table
+
+    # This function writes the parameter file
+    # Parameters:
+    #     file f: the output file
+    #     list chnls: the channel ids to write, or None for all channels
+    def writeParams(self, f, chnls):
+        f.write("# extracted from a trace of " + str(self.count) +
+                " accesses, see trace2params.py\n")
+        if self.policy == "timeout":
+            f.write("# row buffer policy: timeout after " + str(self.frame) +
+                    " accesses\n")
+        else:
+            f.write("# row buffer policy: " + self.policy + "\n")
+        for c in sorted(self.chnls):
+            if chnls is not None and c not in chnls:
+                continue
+            counts = self.dists[c].reshape(-1, 3)
+            dist_total = counts.sum()
+            if dist_total == 0:
+                print "Channel", c, "is accessed only once, skipped"
+                continue
+            (chnl_prob, bank_prob, row_prob, min_acc, min_noacc) = \
+                self.counter.estimateThread(self.chnls[c])
+            min_acc = self.min_acc.get(c, 1)
+            min_noacc = self.min_noacc.get(c, 1)
+
+            f.write("\nc: %d\n" % c)
+            f.write("# channel_acc_prob, other_thread_hit_same_bank_prob, " +
+                    "other_thread_hit_same_row_prob, min_con_acc, " +
+                    "min_con_noacc\n")
+            f.write("t: %f, %f, %f, %d, %d\n" % (chnl_prob, bank_prob,
+                                                  row_prob, min_acc,
+                                                  min_noacc))
+            f.write("# channel_reuse_distance, dist_prob, hit_prob, " +
+                    "miss_prob, conf_prob\n")
+            for dist in numpy.flatnonzero(counts.sum(axis=1)).tolist():
+                n = float(counts[dist].sum())
+                f.write("a: %d, %f, %f, %f, %f\n" %
+                        (dist, n / dist_total, counts[dist][HIT] / n,
+                         counts[dist][MISS] / n, counts[dist][CONF] / n))
+
+            acc_cnt = sum([l * n for (l, n) in self.acc_runs[c].iteritems()])
+            for (name, runs, count) in (("ca", self.acc_runs[c], acc_cnt),
+                                        ("cn", self.noacc_runs[c],
+                                         self.count - acc_cnt)):
+                table = self.runTable(runs, count)
+                f.write(name + ":" + ",".join(["%d/%d" % (p.numerator,
+                                                          p.denominator)
+                                               for p in table]) + "\n")
+            f.write("mt: %d\n" % min_acc)
+            f.write("mn: %d\n" % min_noacc)
+
+# Here comes the real program
+
+parser = OptionParser()
+parser.add_option("-i", "--input", dest="trace", help="Path to the trace " +
+                  "of physical addresses", metavar="TRACE")
+parser.add_option("--format", dest="format", help="Format of the trace: " +
+                  "text, binary or npy; default text", metavar="FORMAT",
+                  type="choice", choices=["text", "binary", "npy"],
+                  default="text")
+parser.add_option("-o", "--output", dest="output", help="Path to the " +
+                  "parameter file to write", metavar="FILE")
+parser.add_option("-c", "--channels", dest="channels", help="Comma " +
+                  "separated ids of the channels to write; default all",
+                  metavar="IDS")
+parser.add_option("--chnls_per_node", dest="chnls_per_node", help="Number " +
+                  "of channels of a node, for the channel ids; default 2",
+                  metavar="CHANNELS", type="int", default=2)
+parser.add_option("--policy", dest="policy", help="Row buffer policy: " +
+                  "open, closed or timeout; default open", metavar="POLICY",
+                  type="choice", choices=["open", "closed", "timeout"],
+                  default="open")
+parser.add_option("--timeout", dest="timeout", help="Time in nanoseconds " +
+                  "before an idle row is closed, with the timeout policy; " +
+                  "default 40", metavar="TIMEOUT", type="float", default=40.0)
+parser.add_option("--esttime", dest="est_serv_time", help="Estimated time " +
+                  "in nanoseconds between two accesses of the thread; " +
+                  "default 10", metavar="EST_TIME", type="float", default=10.0)
+parser.add_option("--max_dist", dest="max_dist", help="Largest channel " +
+                  "reuse distance, and length of the ca/cn tables; default " +
+                  "64", metavar="DIST", type="int", default=64)
+parser.add_option("--chunk", dest="chunk", help="Number of accesses " +
+                  "processed at once; default 1048576", metavar="ACCESSES",
+                  type="int", default=1 << 20)
+parser.add_option("--pci_snapshot", dest="pci_snapshot", help="Read the " +
+                  "DRAM configuration from a PCI snapshot file instead of " +
+                  "sysfs; does not need root", metavar="FILE")
+parser.add_option("--cache_pci", action="store_true", dest="cache_pci",
+                  default=False, help="Whether to cache PCI configuartion" +
+                  "registers; relatively a safe optimization")
+parser.add_option("-d", "--debug", action="store_true", dest="debug",
+                  default=False, help="Enable debug output")
+
+if __name__ == "__main__":
+    (options, args) = parser.parse_args()
+
+    if options.debug is True:
+        physical2dram.debug = True
+
+    if numpy is None:
+        print "numpy is required for extracting the parameters"
+        exit(2)
+
+    if options.trace is None or options.output is None:
+        print "Please specify the trace and the parameter file\n"
+        parser.print_help()
+        exit(-1)
+
+    if options.max_dist < 1 or options.chunk < 1:
+        print "The largest distance and the chunk size must be at least 1"
+        exit(-1)
+
+    chnls = None
+    if options.channels is not None:
+        chnls = [int(c) for c in options.channels.split(",")]
+
+    frame = 0
+    if options.policy == "timeout":
+        if options.est_serv_time <= 0:
+            print "The estimated time between accesses must be positive"
+            exit(-1)
+        frame = int(options.timeout / options.est_serv_time)
+
+    if options.pci_snapshot is not None:
+        snap = pciconfig.pciSnapshot()
+        snap.load(options.pci_snapshot)
+        pciconfig.useSnapshot(snap)
+
+    if options.format == "text":
+        chunks = readTextChunks(options.trace, options.chunk)
+    else:
+        chunks = readMappedChunks(options.trace, options.format,
+                                  options.chunk)
+
+    # the DRAM address map is only read if the trace has physical addresses
+    plan = None
+    extractor = paramExtractor(options.chnls_per_node, options.policy, frame,
+                               options.max_dist)
+    for addrs in chunks:
+        if addrs.dtype.names is None:
+            if plan is None:
+                plan = physical2dram.decodePlan(physical2dram.findNodes(),
+                                                options.cache_pci)
+            addrs = plan.translateArray(addrs)
+        extractor.addChunk(addrs)
+        if options.debug is True:
+            print "Processed", extractor.count, "accesses"
+    extractor.finish()
+
+    if extractor.count == 0:
+        print "The trace is empty"
+        exit(-1)
+
+    f = open(options.output, "w")
+    extractor.writeParams(f, chnls)
+    f.close()
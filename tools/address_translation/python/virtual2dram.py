@@ -10,10 +10,12 @@
 
 from optparse import OptionParser
 import resource
-import subprocess
 
 import virtual2physical
 import physical2dram
+import pciconfig
+import dramrecords
+import occupancy
 
 # This function parse a string which represents memory
 # size such as "xxB", "xxK", "xxKB" ... "xxGB"
@@ -47,6 +49,242 @@ def parseMemSize( memsize):
     except ValueError:
         return -1
 
+# This function computes the last address of a memory region that is gone
+# over with a step
+# Parameters:
+#     int startAddr: the first address of the region
+#     int memsize: the size of the region in bytes
+#     int step: the step in bytes
+# Return:
+#     int addr: the last address
+def lastAddress(startAddr, memsize, step):
+    return startAddr + (max(memsize, 1) - 1) // step * step
+
+# This function translates the virtual addresses of a memory region to
+# physical addresses, as a generator, so that the memory used does not grow
+# with the region. The page map is read for chunkPages pages at once, and 
+# each page is translated only once: the physical addresses inside a page are
+# its page frame plus the offsets. The pages that are not present are
+# translated to page frame 0, as virtual2physical does, or skipped.
+# Parameters:
+#     int pid: the process id
+#     int startAddr: the first virtual address of the region
+#     int memsize: the size of the region in bytes
+#     int step: the step in bytes
+#     int chunkPages: number of pages whose page map is read at once
+#     bool presentOnly: whether to skip the pages that are not present
+# Return:
+#     A generator of (virtual address, physical address)
+def translateRegion(pid, startAddr, memsize, step, chunkPages, 
+                    presentOnly=False):
+    ospagesize = resource.getpagesize()
+    lastAddr = lastAddress(startAddr, memsize, step)
+    addr = startAddr
+    while addr <= lastAddr:
+        chunkEnd = min((addr // ospagesize + chunkPages) * ospagesize, 
+                       lastAddr + 1)
+        firstpage, pfns = virtual2physical.virtual2physicalRange(pid, addr,
+                                                                 chunkEnd - 
+                                                                 addr)
+        while addr < chunkEnd:
+            pageindex = addr // ospagesize
+            pageStart = pageindex * ospagesize
+            pageEnd = min(pageStart + ospagesize, chunkEnd)
+            pfn = long(pfns[pageindex - firstpage])
+            if pfn >= 0 or presentOnly is False:
+                frameStart = max(pfn, 0) * ospagesize
+                for a in xrange(addr, pageEnd, step):
+                    yield (a, frameStart + (a - pageStart))
+            addr += (pageEnd - addr + step - 1) // step * step
+
+# This function goes over a region of physical addresses, for "--p2d"
+# Parameters:
+#     int startAddr, memsize, step: see translateRegion
+# Return:
+#     A generator of (physical address, physical address)
+def physicalRegion(startAddr, memsize, step):
+    for a in xrange(startAddr, lastAddress(startAddr, memsize, step) + 1, 
+                    step):
+        yield (a, a)
+
+# This function translates the physical addresses to dram addresses.
+# Parameters:
+#     addrpairs: generator of (virtual address, physical address)
+#     plan: the physical2dram.decodePlan of the machine, or None to only
+#           translate virtual addresses
+# Return:
+#     A generator of (virtual address, physical address, dram address); the
+#     dram address is the dictionary returned by physical2dram, or None
+def translateDram(addrpairs, plan):
+    for (vaddr, paddr) in addrpairs:
+        if plan is None:
+            yield (vaddr, paddr, None)
+        else:
+            yield (vaddr, paddr, plan.translate(paddr))
+
+# This function groups the translated addresses into runs: consecutive
+# addresses that are contiguous in both virtual and physical memory, and are
+# in the same node, channel, rank, bank and row.
+# Parameters:
+#     records: generator of (virtual address, physical address, dram address)
+#     int step: the step between the addresses
+#     bool rle: whether to group the addresses; if not, every address is a 
+#               run by itself
+# Return:
+#     A generator of (virtual address, physical address, size, dram address)
+#     of the first address of every run
+def runLengths(records, step, rle):
+    run = None
+    for (vaddr, paddr, ramaddr) in records:
+        if run is not None:
+            if rle and vaddr - run[0] == run[2] and paddr - run[1] == run[2] \
+               and sameRow(run[3], ramaddr):
+                run[2] += step
+                continue
+            yield tuple(run)
+        run = [vaddr, paddr, step, ramaddr]
+    if run is not None:
+        yield tuple(run)
+
+# This function checks if two dram addresses are in the same row of the same
+# bank
+# Parameters:
+#     dict ramaddr1, ramaddr2: the dram addresses, or None
+# Return:
+#     bool same: whether they are in the same row, True if both are None
+def sameRow(ramaddr1, ramaddr2):
+    if ramaddr1 is None or ramaddr2 is None:
+        return ramaddr1 is ramaddr2
+    return ramaddr1['Node'] == ramaddr2['Node'] and \
+        ramaddr1['Channel'] == ramaddr2['Channel'] and \
+        ramaddr1['Rank'] == ramaddr2['Rank'] and \
+        ramaddr1['Bank'] == ramaddr2['Bank'] and \
+        ramaddr1['Row'] == ramaddr2['Row']
+
+# This function prints the translated addresses as text
+# Parameters:
+#     runs: generator returned by runLengths
+#     bool v2ponly, p2donly, rle: the commandline options
+#     bool printHeader: whether to print the line of column names
+def printRuns(runs, v2ponly, p2donly, rle, printHeader=True):
+    dramfmt = "%d,%d,%d,%d,%d,%d"
+    if v2ponly is True and rle is True:
+        for (vaddr, paddr, size, ramaddr) in runs:
+            print "%#x %#x %d" % (vaddr, paddr, size)
+        return
+    if v2ponly is True:
+        prev = None
+        for (vaddr, paddr, size, ramaddr) in runs:
+            if prev is not None:
+                vdist = vaddr - prev[0]
+                pdist = paddr - prev[1]
+            else:
+                vdist = 0
+                pdist = 0
+            print "%#x %#x %d %d %#x" % (vaddr, paddr, vdist, pdist, pdist)
+            prev = (vaddr, paddr)
+        return
+
+    if p2donly is True:
+        header = "#PhysicalAddr"
+        fmt = "%#x,"
+    else:
+        header = "#VirtualAddr ,PhysicalAddr"
+        fmt = "%#x,%#x,"
+    if rle is True:
+        header += " ,Size"
+        fmt += "%d,"
+    if printHeader is True:
+        print header + " ,Node ,Channel ,Rank ,Bank ,Row ,Col"
+    fmt += dramfmt
+    for (vaddr, paddr, size, ramaddr) in runs:
+        fields = (ramaddr['Node'], ramaddr['Channel'], ramaddr['Rank'], 
+                  ramaddr['Bank'], ramaddr['Row'], ramaddr['Col'])
+        if rle is True:
+            fields = (size,) + fields
+        if p2donly is False:
+            fields = (vaddr, paddr) + fields
+        else:
+            fields = (paddr,) + fields
+        print fmt % fields
+
+# This function translates all the mapped memory of a process, one mapping
+# (VMA) after another; only the pages that are present are translated. The
+# output is grouped by mapping: each mapping starts with a line of its 
+# address range, permissions, kind (see virtual2physical.mappingKind) and 
+# path; with the binary output, these lines are printed with the index of 
+# the first record of the mapping and the number of records.
+# Parameters:
+#     int pid: the process id
+#     plan: the physical2dram.decodePlan, or None to only translate virtual
+#           addresses
+#     int step: the step in bytes
+#     options: the commandline options
+#     counter: an occupancy.occupancyCounter to count the translated 
+#              addresses instead of writing them, or None
+def translateProcess(pid, plan, step, options, counter):
+    mappings = virtual2physical.readMaps(pid)
+    smaps = None
+    if options.smaps is True:
+        smaps = virtual2physical.readSmaps(pid)
+
+    writer = None
+    count = 0
+    if counter is not None:
+        pass
+    elif options.binary is not None:
+        writer = dramrecords.npyRecordWriter(options.binary)
+    elif options.v2ponly is False:
+        # print the column names once
+        printRuns([], options.v2ponly, False, options.rle)
+
+    for mapping in mappings:
+        # the page map of [vsyscall] can not be read
+        if mapping['Kind'] == "vsyscall":
+            continue
+
+        line = "#Mapping %#x-%#x %s %s %s" % (mapping['Start'], 
+                                              mapping['End'], 
+                                              mapping['Perms'], 
+                                              mapping['Kind'], mapping['Path'])
+        if smaps is not None and smaps.has_key(mapping['Start']):
+            sizes = smaps[mapping['Start']]
+            line += " KernelPageSize %d kB Rss %d kB AnonHugePages %d kB" % \
+                    (sizes.get('KernelPageSize', 0), sizes.get('Rss', 0), 
+                     sizes.get('AnonHugePages', 0))
+
+        addrpairs = translateRegion(pid, mapping['Start'], 
+                                    mapping['End'] - mapping['Start'], step,
+                                    options.chunk, True)
+        runs = runLengths(translateDram(addrpairs, plan), step, options.rle)
+        if counter is not None:
+            for (vaddr, paddr, size, ramaddr) in runs:
+                counter.add(vaddr, size, ramaddr)
+        elif writer is not None:
+            first = count
+            for (vaddr, paddr, size, ramaddr) in runs:
+                writer.write(vaddr, paddr, size, ramaddr)
+                count += 1
+            print line, "records", first, count - first
+        else:
+            print line
+            printRuns(runs, options.v2ponly, False, options.rle, False)
+
+    if writer is not None:
+        writer.close()
+        if options.debug is True:
+            print "Wrote", count, "records to", options.binary
+
+# This function prints the placement counted by an occupancy counter, and
+# writes the estimated "t:" lines, as asked by the commandline options
+def reportOccupancy(counter, options):
+    if options.histogram is True:
+        counter.printHistogram()
+    if options.tlines is not None:
+        f = open(options.tlines, "w")
+        counter.writeThreadLines(f, options.chnls_per_node)
+        f.close()
+
 # Here comes the real program
 
 # define commandline parameters
@@ -59,17 +297,82 @@ parser.add_option("--v2p", action="store_true", dest="v2ponly", default=False, h
 parser.add_option("--p2d", action="store_true", dest="p2donly", default=False, help="Only translate physical address to dram address")
 parser.add_option("-m", "--memsize", dest="memsize", help="translate the whole memory region of with size MemSize, value in B, KB, MB or GB", metavar="MemSize")
 parser.add_option("--step", dest="step", help="go over the memory region with setp STEP, value in B, KB, MB or GB; default 64B", metavar="STEP")
+parser.add_option("--rle", action="store_true", dest="rle", default=False,
+                  help="Run-length output: one line for every run of " +
+                  "addresses that are contiguous in virtual and physical " +
+                  "memory and in the same node, channel, rank, bank and " +
+                  "row; the line has the first address, the size of the " +
+                  "run (number of addresses times STEP) and the column of " +
+                  "the first address")
+parser.add_option("--binary", dest="binary", help="Write the translated " +
+                  "addresses to FILE as a binary record array in the .npy " +
+                  "format (see dramrecords.py) instead of printing them",
+                  metavar="FILE")
+parser.add_option("--chunk", dest="chunk", help="Number of pages whose " +
+                  "page map is read at once; default 1024", metavar="PAGES",
+                  type="int", default=1024)
+parser.add_option("--pci_snapshot", dest="pci_snapshot", help="Read the " +
+                  "DRAM configuration from a PCI snapshot file instead of " +
+                  "sysfs; does not need root", metavar="FILE")
+parser.add_option("--save_pci_snapshot", dest="save_pci_snapshot", 
+                  help="Save the PCI configuration spaces of the memory " +
+                  "controllers to a snapshot file (needs root), and exit",
+                  metavar="FILE")
+parser.add_option("--process", action="store_true", dest="process", 
+                  default=False, help="Translate all the mapped memory of " +
+                  "the process (from /proc/<pid>/maps) instead of the " +
+                  "region of -a and -m, grouped by mapping; only the pages " +
+                  "that are present are translated")
+parser.add_option("--smaps", action="store_true", dest="smaps", 
+                  default=False, help="With --process, also print the page " +
+                  "size and huge pages of each mapping from " +
+                  "/proc/<pid>/smaps")
+parser.add_option("--histogram", action="store_true", dest="histogram", 
+                  default=False, help="Instead of the translated addresses, " +
+                  "print the bytes on every node, channel, rank and bank")
+parser.add_option("--tlines", dest="tlines", help="Instead of the " +
+                  "translated addresses, write the \"t:\" lines of the " +
+                  "ratio model estimated from the placement of the memory " +
+                  "to FILE, one section for every channel (see occupancy.py)",
+                  metavar="FILE")
+parser.add_option("--chnls_per_node", dest="chnls_per_node", help="Number " +
+                  "of channels of a node, for the channel ids of --tlines; " +
+                  "default 2", metavar="CHANNELS", type="int", default=2)
 parser.add_option("--cache_pci", action="store_true", dest="cache_pci", 
                   default=False, help="Whether to cache PCI configuartion" + 
                   "registers; relatively a safe optimization")
 parser.add_option("--cache_pagemap", action="store_true", dest="cache_pagemap", 
                   default=False, help="Whether to cache page map; relatviely" +
-                  "a safe optimiation; maybe unsafe if a page gets swapped out")
+                  "a safe optimiation; maybe unsafe if a page gets swapped out;" +
+                  " not used any more, the page map of the whole region is " +
+                  "read at once")
 
 (options, args) = parser.parse_args()
 
+if options.debug is True:
+    virtual2physical.debug = True
+    physical2dram.debug = True;
+
+if options.save_pci_snapshot is not None:
+    snap = pciconfig.pciSnapshot()
+    snap.readNodes(physical2dram.findNodes())
+    snap.save(options.save_pci_snapshot)
+    print "Saved the PCI configuration of", len(snap.nodes), "nodes to", options.save_pci_snapshot
+    exit(0)
+
+if options.pci_snapshot is not None:
+    snap = pciconfig.pciSnapshot()
+    snap.load(options.pci_snapshot)
+    pciconfig.useSnapshot(snap)
+
 # parse commandline parameters
-if options.addr is None:
+if options.process is True:
+    if options.p2donly is True:
+        print "--process translates virtual addresses, it can not be used with --p2d\n"
+        parser.print_help()
+        exit(-1)
+    startAddr = 0
+elif options.addr is None:
     print "No address to translate\n"
     parser.print_help()
     exit(-1)
@@ -86,10 +389,6 @@ if options.p2donly is False:
 else:
     pid = 0
 
-if options.debug is True:
-    virtual2physical.debug = True
-    physical2dram.debug = True;
-
 if options.pagesize is None:
     pagesize = 0
 else:
@@ -117,61 +416,47 @@ else:
 if options.debug is True:
     print "Commandline parameters: addr:", hex(startAddr), ", pid:", pid, ", pagesize:", pagesize, ", memsize:", memsize, ", step:", step, ", v2p:", options.v2ponly, ", p2d:", options.p2donly
 
-# generate the array of addresses to parse
-addrs = [startAddr]
-EndAddr = startAddr + memsize
-p = startAddr + step
-while p < EndAddr:
-    addrs.append(p)
-    p += step
+# the DRAM address map is read once, before translating the addresses
+plan = None
+if options.v2ponly is False:
+    plan = physical2dram.decodePlan(physical2dram.findNodes(), 
+                                    options.cache_pci)
+
+# count the placement of the translated addresses instead of writing them
+counter = None
+if options.histogram is True or options.tlines is not None:
+    if options.v2ponly is True:
+        print "The placement on the DRAM can not be counted with --v2p\n"
+        parser.print_help()
+        exit(-1)
+    counter = occupancy.occupancyCounter(step)
 
+if options.process is True:
+    translateProcess(pid, plan, step, options, counter)
+    if counter is not None:
+        reportOccupancy(counter, options)
+    exit(0)
+
+# the addresses go through the pipeline one by one: virtual to physical,
+# physical to dram, run lengths, and output
 if options.p2donly is False:
-    phyaddrs = []
-    for addr in addrs:
-        phyaddr = virtual2physical.virtual2physical(pid, addr, pagesize, 
-                                                    options.cache_pagemap)
-        phyaddrs.append(phyaddr)
+    addrpairs = translateRegion(pid, startAddr, memsize, step, options.chunk)
 else:
-    phyaddrs = addrs
+    addrpairs = physicalRegion(startAddr, memsize, step)
 
-if options.v2ponly is False:
-    ramaddrs = []
-    # lspci, and find the right PCI domains, buses, slots and functions for address map and dram controller
-    lspcicmd = subprocess.Popen("lspci", stdout=subprocess.PIPE)
-    lspciout, lspcierr = lspcicmd.communicate()
-    
-    lspciouts = lspciout.split('\n')
-    nodes = [] # a list of all MCTs/nodes
-    
-    # process the output of "lspci", and collect the PCI for each node
-    for line in lspciouts:
-        if "DRAM Controller" in line:
-            pciaddr = line.split(' ')[0]
-            bus = int(pciaddr.split(':')[0], 16)
-            slot = int(pciaddr.split(':')[1].split('.')[0], 16)
-            node = (bus, slot)
-            nodes.append(node)
-            if options.debug is True:
-                print "Find one memory controller/node at PCI address: 0000:" + hex(bus)[2:].zfill(2) + ":" + hex(slot)[2:].zfill(2)
-
-    for phyaddr in phyaddrs:
-        ramaddr = physical2dram.physical2dram(phyaddr, nodes, options.cache_pci)
-        ramaddrs.append(ramaddr)
-
-if options.v2ponly is True:
-    for i in range(len(addrs)):
-        if i != 0:
-            vdist = addrs[i] - addrs[i-1]
-            pdist = phyaddrs[i] - phyaddrs[i-1]
-        else:
-            vdist = 0
-            pdist = 0
-        print hex(addrs[i]), hex(phyaddrs[i]), vdist, pdist, hex(pdist)
-elif options.p2donly is True:
-    print "#PhysicalAddr", ",Node", ",Channel", ",Rank", ",Bank", ",Row", ",Col"
-    for i in range(len(phyaddrs)):
-        print hex(phyaddrs[i]) + "," + str(ramaddrs[i]['Node']) + "," + str(ramaddrs[i]['Channel']) + "," + str(ramaddrs[i]['Rank']) + "," + str(ramaddrs[i]['Bank']) + "," + str(ramaddrs[i]['Row']) + "," + str(ramaddrs[i]['Col'])
+records = translateDram(addrpairs, plan)
+runs = runLengths(records, step, options.rle)
+
+if counter is not None:
+    for (vaddr, paddr, size, ramaddr) in runs:
+        counter.add(vaddr, size, ramaddr)
+    reportOccupancy(counter, options)
+elif options.binary is not None:
+    writer = dramrecords.npyRecordWriter(options.binary)
+    for (vaddr, paddr, size, ramaddr) in runs:
+        writer.write(vaddr, paddr, size, ramaddr)
+    count = writer.close()
+    if options.debug is True:
+        print "Wrote", count, "records to", options.binary
 else:
-    print "#VirtualAddr", ",PhysicalAddr", ",Node", ",Channel", ",Rank", ",Bank", ",Row", ",Col"
-    for i in range(len(phyaddrs)):
-        print hex(addrs[i]) + "," + hex(phyaddrs[i]) + "," + str(ramaddrs[i]['Node']) + "," + str(ramaddrs[i]['Channel']) + "," + str(ramaddrs[i]['Rank']) + "," + str(ramaddrs[i]['Bank']) + "," + str(ramaddrs[i]['Row']) + "," + str(ramaddrs[i]['Col'])
+    printRuns(runs, options.v2ponly, options.p2donly, options.rle)
@@ -5,14 +5,44 @@
 # Author: Wei Wang <wwang@virginia.edu>
 #
 
+import os
+import array
+import struct
 import resource
 
+# numpy is optional; it only speeds up decoding pagemap ranges
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 version = '0.1'
 debug = False
 
 # Keep a cache of read values to improve performance
 pagemap_cache = dict()
 
+# Opened /proc/[pid]/pagemap files, one file descriptor per pid
+pagemap_fds = dict()
+
+# Here is the document for /proc/[pid]/pagemap
+# http://www.kernel.org/doc/Documentation/vm/pagemap.txt
+# I quote it here:
+# Bits 0-54  page frame number (PFN) if present
+# Bits 0-4   swap type if swapped
+# Bits 5-54  swap offset if swapped
+# Bit  55    pte is soft-dirty (see Documentation/vm/soft-dirty.txt)
+# Bit  56    page exclusively mapped (since 4.2)
+# Bits 57-60 zero
+# Bit  61    page is file-page or shared-anon (since 3.5)
+# Bit  62    page swapped
+# Bit  63    page present
+PFN_MASK = 0x7fffffffffffff
+PAGE_SWAPPED = 1 << 62
+PAGE_PRESENT = 1 << 63
+# Each page has 64 bits or 8 bytes in pagemap
+PAGEMAP_ENTRY_SIZE = 8
+
 
 # This function translates a virtual address into physical address
 # Parameters:
@@ -36,49 +66,24 @@ def virtual2physical(pid, vaddr, pagesize, cache_pagemap):
     inpageaddr = vaddr % pagesize
     
     # check the cache
-    key = str(pid) + ":" + str(vpageindex)
+    key = (pid, vpageindex)
     if pagemap_cache.has_key(key) and cache_pagemap:
         phypagedesp = pagemap_cache[key];
     else:
         # Use the /proc/[pid]/pagemap file, this file has the virtual to physical address mapping
-        mapfilepath = "/proc/" + str(pid) + "/pagemap"
-        
-        mapfile = open(mapfilepath, "r")
-        
-        # Here is the document for /proc/[pid]/pagemap
-        # http://www.kernel.org/doc/Documentation/vm/pagemap.txt
-        # I quote it here:
-        # Bits 0-54  page frame number (PFN) if present
-        # Bits 0-4   swap type if swapped
-        # Bits 5-54  swap offset if swapped
-        # Bit  55    pte is soft-dirty (see Documentation/vm/soft-dirty.txt)
-        # Bit  56    page exclusively mapped (since 4.2)
-        # Bits 57-60 zero
-        # Bit  61    page is file-page or shared-anon (since 3.5)
-        # Bit  62    page swapped
-        # Bit  63    page present
+        # (see the bits of each entry at the beginning of this file)
 
         # Note that originally, Bits 55-60 indicate page shift (i.e., page size)
         # However after kernel 3.11, these bits are used for other purposes.
         # For all machines I have, in /proc/[pid]/pagemap, page size is fixed to
         # be 4KB (even for 2MB huge pages). There seems to be no need to keep
         # the page shift bits.
-                                            
-    
-        # This is the actually offset for this page is vpageindex * 8, size each page has 64 bits or 8 bytes
-        offset = vpageindex * 8
-        if debug is True:
-            print "File pointer offset is ", offset
-        # Move the file pointer to the offset
-        mapfile.seek(offset)
-        phypagedesp = mapfile.read(8)
+        phypagedesp = readPagemap(pid, vpageindex, 1)
         pagemap_cache[key] = phypagedesp;
-        # close the file
-        mapfile.close()
 
 
-    phypagedesp_i = int(phypagedesp[::-1].encode('hex'), 16)
-    phypageaddr =  phypagedesp_i & 0x7fffffffffffff
+    phypagedesp_i = struct.unpack("<Q", phypagedesp)[0]
+    phypageaddr =  phypagedesp_i & PFN_MASK
     pagepresent = phypagedesp_i >> 63
     pageshift = 0
     pagesize2 = pagesize
@@ -102,5 +107,171 @@ def virtual2physical(pid, vaddr, pagesize, cache_pagemap):
     return phyaddr
 
 
+# This function returns the file descriptor of /proc/[pid]/pagemap. The file is
+# opened on the first call for a pid, and kept open for the following calls.
+# Parameters:
+#     int pid: process id
+# Return value:
+#     int fd: the file descriptor
+def getPagemapFd(pid):
+    if pid not in pagemap_fds:
+        mapfilepath = "/proc/" + str(pid) + "/pagemap"
+        pagemap_fds[pid] = os.open(mapfilepath, os.O_RDONLY)
+    return pagemap_fds[pid]
 
+# This function closes all the pagemap files opened by getPagemapFd, e.g., 
+# when the processes have exited.
+def closePagemapFds():
+    for fd in pagemap_fds.itervalues():
+        os.close(fd)
+    pagemap_fds.clear()
+
+# This function reads the raw pagemap entries of a range of virtual pages,
+# with one seek and one read (os.pread is not available in Python 2).
+# Parameters:
+#     int pid: process id
+#     int firstpage: index of the first virtual page
+#     int pagecnt: number of virtual pages
+# Return value:
+#     str entries: the entries, 8 bytes for each page
+def readPagemap(pid, firstpage, pagecnt):
+    fd = getPagemapFd(pid)
+    offset = firstpage * PAGEMAP_ENTRY_SIZE
+    size = pagecnt * PAGEMAP_ENTRY_SIZE
+    if debug is True:
+        print "Reading", size, "bytes of pagemap at offset", offset
+
+    os.lseek(fd, offset, os.SEEK_SET)
+    chunks = []
+    while size > 0:
+        chunk = os.read(fd, size)
+        if len(chunk) == 0:
+            print "Pagemap of process", pid, "is shorter than expected"
+            exit(-1)
+        chunks.append(chunk)
+        size -= len(chunk)
+    return "".join(chunks)
+
+# This function decodes raw pagemap entries.
+# Parameters:
+#     str entries: the entries returned by readPagemap
+# Return value:
+#     (pfns, present, swapped): three arrays with one element for each page:
+#     the page frame numbers (-1 if the page is not present), whether the 
+#     page is present, and whether the page is swapped. The arrays are numpy
+#     arrays if numpy is available, otherwise array.array objects.
+def decodePagemap(entries):
+    if numpy is not None:
+        raw = numpy.frombuffer(entries, dtype="<u8")
+        present = (raw & numpy.uint64(PAGE_PRESENT)) != 0
+        swapped = (raw & numpy.uint64(PAGE_SWAPPED)) != 0
+        pfns = numpy.where(present, (raw & numpy.uint64(PFN_MASK)), 0)
+        pfns = pfns.astype(numpy.int64)
+        pfns[~present] = -1
+        return (pfns, present, swapped)
+
+    raw = struct.unpack("<" + str(len(entries) // PAGEMAP_ENTRY_SIZE) + "Q",
+                        entries)
+    pfns = array.array("l", [(e & PFN_MASK) if (e & PAGE_PRESENT) else -1
+                             for e in raw])
+    present = array.array("B", [(e >> 63) & 0x1 for e in raw])
+    swapped = array.array("B", [(e >> 62) & 0x1 for e in raw])
+    return (pfns, present, swapped)
+
+# This function translates a whole range of virtual addresses at once: the
+# pagemap entries of all pages in the range are read with one read and 
+# decoded together.
+# Parameters:
+#     int pid: process id of the process the owns the virtual addresses
+#     int vaddr: the first virtual address of the range
+#     int size: size of the range in bytes
+# Return value:
+#     (firstpage, pfns): the index of the virtual page of vaddr, and the
+#     physical page frame numbers of the pages from firstpage on (see 
+#     decodePagemap); the physical address of a virtual address "a" in the
+#     range is (pfns[a // pagesize - firstpage] * pagesize) | (a % pagesize)
+def virtual2physicalRange(pid, vaddr, size):
+    pagesize = resource.getpagesize()
+    firstpage = vaddr // pagesize
+    lastpage = (vaddr + max(size, 1) - 1) // pagesize
+
+    entries = readPagemap(pid, firstpage, lastpage - firstpage + 1)
+    (pfns, present, swapped) = decodePagemap(entries)
+
+    if debug is True:
+        print "Translated", len(pfns), "pages from virtual page", firstpage
+
+    return (firstpage, pfns)
+
+# This function gives the kind of a memory mapping from its path name in
+# /proc/[pid]/maps
+# Parameters:
+#     str path: the path name, "" for anonymous mappings
+# Return value:
+#     str kind: "heap", "stack", "anon", "file", or the name of a special 
+#               mapping, e.g., "vdso"
+def mappingKind(path):
+    if path == "":
+        return "anon"
+    if path == "[heap]":
+        return "heap"
+    if path.startswith("[stack"):
+        return "stack"
+    if path.startswith("["):
+        return path[1:-1]
+    return "file"
+
+# This function reads the memory mappings (VMAs) of a process from 
+# /proc/[pid]/maps
+# Parameters:
+#     int pid: process id
+# Return value:
+#     A list of mappings, each a dictionary with the following fields:
+#          Start, End (virtual addresses, End excluded), Perms, Offset, Path
+#          and Kind (see mappingKind)
+def readMaps(pid):
+    mappings = []
+    mapsfile = open("/proc/" + str(pid) + "/maps", "r")
+    for line in mapsfile:
+        fields = line.split(None, 5)
+        if len(fields) < 5:
+            continue
+        (start, end) = fields[0].split("-")
+        if len(fields) == 6:
+            path = fields[5].strip()
+        else:
+            path = ""
+        mappings.append({'Start': int(start, 16), 'End': int(end, 16),
+                         'Perms': fields[1], 'Offset': int(fields[2], 16),
+                         'Path': path, 'Kind': mappingKind(path)})
+    mapsfile.close()
+
+    if debug is True:
+        print "Read", len(mappings), "mappings of process", pid
+
+    return mappings
+
+# This function reads the page size and huge page information of the memory
+# mappings of a process from /proc/[pid]/smaps
+# Parameters:
+#     int pid: process id
+# Return value:
+#     A dictionary: start address of a mapping ==> dictionary of its sizes
+#     in kB, with the fields KernelPageSize, Rss, AnonHugePages, ... (all
+#     "xx kB" fields of smaps)
+def readSmaps(pid):
+    smaps = dict()
+    sizes = None
+    smapsfile = open("/proc/" + str(pid) + "/smaps", "r")
+    for line in smapsfile:
+        fields = line.split()
+        if len(fields) == 3 and fields[0].endswith(":") and fields[2] == "kB":
+            if sizes is not None:
+                sizes[fields[0][:-1]] = int(fields[1])
+        elif len(fields) >= 5 and "-" in fields[0]:
+            # the first line of a mapping, same as in maps
+            sizes = dict()
+            smaps[int(fields[0].split("-")[0], 16)] = sizes
+    smapsfile.close()
 
+    return smaps